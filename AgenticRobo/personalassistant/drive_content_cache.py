@@ -0,0 +1,185 @@
+"""
+Parsed Google Drive file content cache for RoboSynthesis.
+
+Reading a Drive file means downloading and parsing it again, even if it has
+not changed since the last read. This cache stores the parsed result (extracted
+text and tabular records) keyed on the file id plus its md5Checksum or
+modifiedTime, so any change to the file naturally invalidates the entry.
+
+Entries live in a size-bounded in-memory LRU, with an optional on-disk tier
+shared by worker processes. Disk entries are stored as JSON (values that are
+not JSON types, such as dates, are stored as strings) in a directory only the
+server's user can access.
+
+Configuration (environment variables):
+- DRIVE_CONTENT_CACHE_MAX_BYTES: In-memory budget (default: 64 MB)
+- DRIVE_CONTENT_CACHE_DIR: Directory for the on-disk tier (default: disabled)
+- DRIVE_CONTENT_CACHE_DISK_MAX_BYTES: On-disk budget (default: 512 MB)
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DRIVE_CONTENT_CACHE_MAX_BYTES = int(os.getenv('DRIVE_CONTENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+DRIVE_CONTENT_CACHE_DIR = os.getenv('DRIVE_CONTENT_CACHE_DIR')
+DRIVE_CONTENT_CACHE_DISK_MAX_BYTES = int(os.getenv('DRIVE_CONTENT_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+
+
+def _make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # makedirs' mode is ignored for existing directories and masked by the umask
+    os.chmod(path, 0o700)
+
+
+def content_cache_key(file_id, metadata):
+    """
+    Build the cache key for a file version, or None if the version is unknown.
+
+    Binary files carry an md5Checksum; Google Workspace files only have a
+    modifiedTime.
+    """
+    version = metadata.get('md5Checksum') or metadata.get('modifiedTime')
+    if not version:
+        return None
+    return f"{file_id}:{version}"
+
+
+class DriveContentCache:
+    """Two-tier (memory LRU + optional disk) cache of parsed Drive file contents"""
+
+    def __init__(self, max_bytes=DRIVE_CONTENT_CACHE_MAX_BYTES, disk_dir=DRIVE_CONTENT_CACHE_DIR,
+                 disk_max_bytes=DRIVE_CONTENT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, size_bytes), least recently used first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        if disk_dir:
+            _make_private_dir(disk_dir)
+
+    def get(self, key):
+        """Get a cached value, or None"""
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+
+        data = self._read_disk(key)
+        if data is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        try:
+            value = json.loads(data)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable Drive content cache entry: {str(e)}")
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['disk_hits'] += 1
+            self._store(key, value, len(data))
+        return value
+
+    def put(self, key, value):
+        """Cache a value in memory and, if configured, on disk"""
+        if key is None:
+            return
+        data = json.dumps(value, default=str).encode('utf-8')
+        with self._lock:
+            self._store(key, value, len(data))
+        self._write_disk(key, data)
+
+    def stats(self):
+        """Get cache size and hit/miss counters"""
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'bytes': self._total_bytes}
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._total_bytes -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Error reading Drive content cache entry: {str(e)}")
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        try:
+            # Write to a temporary file first so readers never see partial entries
+            fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._disk_path(key))
+            self._trim_disk()
+        except Exception as e:
+            logger.warning(f"Error writing Drive content cache entry: {str(e)}")
+
+    def _trim_disk(self):
+        entries = []
+        total = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        # Remove the oldest entries until the disk tier fits its budget
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_content_cache():
+    """Get the process-wide Drive content cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DriveContentCache()
+        return _cache
@@ -11,12 +11,20 @@ logger = logging.getLogger(__name__)
 # Import Google Drive utilities
 from .google_drive_utils import (
     list_files, list_files_by_type, read_file_content,
-    create_file, create_excel_file
+    create_file, create_excel_file, DRIVE_CHAT_LIST_LIMIT
 )
+from .drive_index import get_drive_name_index
+from .drive_resolver import resolve_file, forget_resolution
+from .table_renderer import render_table
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def count_label(files, shown=0):
+    """Describe how many files a chat listing found beyond those shown, e.g. "90+" when the listing was capped"""
+    count = len(files) - shown
+    return f"{count}+" if len(files) >= DRIVE_CHAT_LIST_LIMIT else str(count)
+
 def detect_drive_intent(query):
     """
     Detect if the user query contains an intent to interact with Google Drive.
@@ -42,18 +50,18 @@ def detect_drive_intent(query):
     drive_keywords = ['drive', 'google drive', 'gdrive', 'g-drive', 'google docs']
     file_keywords = ['files', 'documents', 'spreadsheets', 'file']
     
-    # Get list of files to check if query mentions a specific file name
+    # Find file names from the user's Drive mentioned in the query (cached index, no API call)
     try:
-        all_files = list_files()
-        file_names = [f['name'].lower() for f in all_files]
-    except:
-        file_names = []
+        mentioned_files = get_drive_name_index().find_names(query_lower)
+    except Exception as e:
+        logger.error(f"Error matching Drive file names: {str(e)}")
+        mentioned_files = []
     
     has_drive_mention = any(keyword in query_lower for keyword in drive_keywords)
     has_file_mention = any(keyword in query_lower for keyword in file_keywords)
     
     # Check if query mentions a specific file name from the user's Drive
-    has_specific_file_mention = any(file_name in query_lower for file_name in file_names)
+    has_specific_file_mention = bool(mentioned_files)
     
     # Special case: if the query is very clearly about files, consider it a drive query
     if any(phrase in query_lower for phrase in ['list all my files', 'show me my files', 'what files do i have']):
@@ -111,12 +119,10 @@ def detect_drive_intent(query):
         print("Drive read intent detected")
         # If we don't have a file name yet, try to extract it from the query
         if not parameters.get('file_name') and has_specific_file_mention:
-            # Find which file name from our list is in the query
-            for file_name in file_names:
-                if file_name in query_lower:
-                    parameters['file_name'] = file_name
-                    print(f"Extracted file name from Drive files: {file_name}")
-                    break
+            # Use the first Drive file name mentioned in the query
+            file_name = mentioned_files[0]
+            parameters['file_name'] = file_name
+            print(f"Extracted file name from Drive files: {file_name}")
         return True, 'read', parameters
     
     # Create file intent
@@ -133,15 +139,14 @@ def detect_drive_intent(query):
     # Special case for when the query is just a file name or very close to it
     # This handles cases like "read heroes" where the query is just the action + filename
     if has_specific_file_mention and len(query_lower.split()) <= 3:
-        for file_name in file_names:
-            if file_name in query_lower:
-                print(f"Direct file reference detected: {file_name}")
-                parameters['file_name'] = file_name
-                # If there's a read-like word, it's a read intent
-                if any(keyword in query_lower for keyword in ['read', 'open', 'show', 'view', 'get']):
-                    return True, 'read', parameters
-                # Otherwise default to read intent for simple file mentions
-                return True, 'read', parameters
+        file_name = mentioned_files[0]
+        print(f"Direct file reference detected: {file_name}")
+        parameters['file_name'] = file_name
+        # If there's a read-like word, it's a read intent
+        if any(keyword in query_lower for keyword in ['read', 'open', 'show', 'view', 'get']):
+            return True, 'read', parameters
+        # Otherwise default to read intent for simple file mentions
+        return True, 'read', parameters
     
     # If we have a drive or file mention but no specific intent detected,
     # default to list files as the most common operation
@@ -171,8 +176,8 @@ def process_drive_request(intent_type, query, parameters=None):
         query_lower = query.lower()
         
         if intent_type == 'list':
-            # List all files in Google Drive
-            files = list_files()
+            # One page of files is enough for the reply; don't page through the whole Drive
+            files = list_files(limit=DRIVE_CHAT_LIST_LIMIT)
             
             if not files:
                 return {
@@ -183,7 +188,7 @@ def process_drive_request(intent_type, query, parameters=None):
             
             return {
                 'success': True,
-                'message': f'Found {len(files)} files in your Google Drive.',
+                'message': f'Found {count_label(files)} files in your Google Drive.',
                 'files': files
             }
             
@@ -206,8 +211,8 @@ def process_drive_request(intent_type, query, parameters=None):
                     'message': 'Could not determine which file type you want to list.'
                 }
             
-            # List files of the specified type
-            files = list_files_by_type(file_type)
+            # One page of files of the specified type
+            files = list_files_by_type(file_type, limit=DRIVE_CHAT_LIST_LIMIT)
             
             if not files:
                 return {
@@ -218,7 +223,7 @@ def process_drive_request(intent_type, query, parameters=None):
             
             return {
                 'success': True,
-                'message': f'Found {len(files)} {file_type} files in your Google Drive.',
+                'message': f'Found {count_label(files)} {file_type} files in your Google Drive.',
                 'files': files
             }
             
@@ -263,45 +268,13 @@ def process_drive_request(intent_type, query, parameters=None):
             # Log the extracted file name for debugging
             logger.info(f"Looking for file: {file_name}")
             
-            # Try multiple search strategies
-            files = []
-            
-            # Strategy 1: Exact match
-            files = list_files(query=f"name = '{file_name}'")
+            # Resolve the name with at most one Drive API call
+            resolution = resolve_file(file_name)
+            logger.info(f"File resolution used {resolution['api_calls']} API calls (source: {resolution['source']})")
             
-            # Strategy 2: Contains match
-            if not files:
-                files = list_files(query=f"name contains '{file_name}'")
-                logger.info(f"Contains search found {len(files)} files")
-            
-            # Strategy 3: Case-insensitive search through all files
-            if not files:
-                logger.info("Trying case-insensitive search")
-                all_files = list_files()
-                matched_files = []
-                
-                for f in all_files:
-                    if file_name.lower() in f['name'].lower():
-                        matched_files.append(f)
-                        logger.info(f"Found matching file: {f['name']}")
-                
-                files = matched_files
-            
-            if files:
-                # If multiple files match, pick the most relevant one
-                if len(files) > 1:
-                    # Try to find exact match first
-                    exact_matches = [f for f in files if f['name'].lower() == file_name.lower()]
-                    if exact_matches:
-                        file_id = exact_matches[0]['id']
-                        logger.info(f"Selected exact match: {exact_matches[0]['name']}")
-                    else:
-                        # Otherwise pick the first match
-                        file_id = files[0]['id']
-                        logger.info(f"Selected first match: {files[0]['name']}")
-                else:
-                    file_id = files[0]['id']
-                    logger.info(f"Selected only match: {files[0]['name']}")
+            if resolution['file']:
+                file_id = resolution['file']['id']
+                logger.info(f"Selected best match: {resolution['file']['name']}")
             else:
                 return {
                     'success': False,
@@ -322,24 +295,10 @@ def process_drive_request(intent_type, query, parameters=None):
                     else:
                         # If we got raw data, convert it to a readable format
                         if isinstance(content, list):
-                            # Format the Excel data for display
-                            display_content = "Excel File Contents:\n\n"
-                            
-                            if content and len(content) > 0:
-                                # Get column headers from first row
-                                headers = list(content[0].keys())
-                                display_content += "Columns: " + ", ".join(headers) + "\n\n"
-                                
-                                # Add rows (up to 10)
-                                max_rows = min(10, len(content))
-                                display_content += f"Showing first {max_rows} rows (total rows: {len(content)}):\n\n"
-                                
-                                for i in range(max_rows):
-                                    row = content[i]
-                                    row_str = f"Row {i+1}: " + ", ".join([f"{h}: {row.get(h, '')}" for h in headers])
-                                    display_content += row_str + "\n"
+                            if content:
+                                display_content = render_table(content)
                             else:
-                                display_content += "Excel file appears to be empty."
+                                display_content = "Excel File Contents:\n\nExcel file appears to be empty."
                         else:
                             display_content = str(content)
                             
@@ -361,6 +320,8 @@ def process_drive_request(intent_type, query, parameters=None):
                     }
             except Exception as e:
                 logger.error(f"Error reading file content: {str(e)}")
+                # The cached resolution may point at a deleted file
+                forget_resolution(file_name)
                 return {
                     'success': False,
                     'message': f'Error reading file content: {str(e)}',
@@ -636,7 +597,7 @@ def generate_drive_response(model, prompt, original_query, intent_type, session_
         if intent_type == 'list' or intent_type == 'list_type':
             files_info = "\n".join([f"- {f['name']} ({f['mimeType']})" for f in drive_result.get('files', [])[:10]])
             if len(drive_result.get('files', [])) > 10:
-                files_info += f"\n- ... and {len(drive_result.get('files', [])) - 10} more files"
+                files_info += f"\n- ... and {count_label(drive_result['files'], shown=10)} more files"
                 
             enhanced_prompt = (
                 f"{prompt}\n\n"
@@ -0,0 +1,214 @@
+"""
+Cached Google Drive file-name index for RoboSynthesis.
+
+Drive intent detection needs to know whether a chat message mentions one of
+the user's file names. Rather than listing the whole Drive on every message,
+this module keeps an in-memory index of file names per Drive account and
+matches queries against it with an Aho-Corasick automaton, so detection does
+no network I/O.
+
+The index is built in the background on first use and kept fresh through the
+Drive changes feed once its TTL expires.
+
+Configuration (environment variables):
+- DRIVE_INDEX_TTL: Seconds before the index is refreshed from the changes feed (default: 60)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from . import google_drive_utils
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DRIVE_INDEX_TTL = float(os.getenv('DRIVE_INDEX_TTL', 60))
+
+CHANGE_FIELDS = "nextPageToken, newStartPageToken, changes(fileId, removed, file(name, trashed))"
+
+
+class NameMatcher:
+    """Aho-Corasick automaton that finds which names occur in a piece of text"""
+
+    def __init__(self, names):
+        self.names = names
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for idx, name in enumerate(names):
+            if not name:
+                continue
+            node = 0
+            for ch in name:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = child
+                node = child
+            self._out[node].append(idx)
+
+        # Breadth-first pass to compute failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """
+        Find the names that occur as substrings of the text.
+
+        Returns:
+            list: Matching names, in the order they were given to the matcher
+        """
+        node = 0
+        found = set()
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found.update(self._out[node])
+        return [self.names[idx] for idx in sorted(found)]
+
+
+class DriveNameIndex:
+    """File-name index for one Drive account, refreshed in the background"""
+
+    def __init__(self, ttl=DRIVE_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # file id -> file name, in listing order
+        self._files = {}
+        self._matcher = NameMatcher([])
+        self._page_token = None
+        self._refreshed_at = None
+        self._refreshing = False
+
+    def find_names(self, text):
+        """
+        Find the (lowercased) Drive file names mentioned in the text.
+
+        Never blocks on the network: a stale or missing index triggers a
+        background refresh and the current index is used in the meantime.
+        """
+        self._refresh_if_stale()
+        return self._matcher.find(text)
+
+    def search(self, fragment):
+        """
+        Find indexed files whose name contains the fragment (case-insensitive).
+
+        Returns:
+            list: File dicts with id and name, in listing order
+        """
+        self._refresh_if_stale()
+        fragment = fragment.lower()
+        return [
+            {'id': file_id, 'name': name}
+            for file_id, name in self._files.items()
+            if fragment in name.lower()
+        ]
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            if self._refreshed_at is not None and time.time() - self._refreshed_at < self.ttl:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='drive-index-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            service = google_drive_utils.get_drive_service()
+            if not service:
+                return
+
+            if self._page_token:
+                files = self._apply_changes(service)
+            else:
+                files = self._full_listing(service)
+
+            matcher = NameMatcher([name.lower() for name in files.values()])
+            self._files = files
+            self._matcher = matcher
+            logger.info(f"Drive name index refreshed ({len(files)} files)")
+        except Exception as e:
+            logger.error(f"Error refreshing Drive name index: {str(e)}")
+            # Fall back to a full listing on the next refresh
+            self._page_token = None
+        finally:
+            with self._lock:
+                self._refreshed_at = time.time()
+                self._refreshing = False
+
+    def _full_listing(self, service):
+        # Take the change token first so changes made during the listing are replayed
+        self._page_token = service.changes().getStartPageToken().execute().get('startPageToken')
+
+        return {
+            f['id']: f['name']
+            for f in google_drive_utils.iter_files(query="trashed = false", fields="id, name")
+        }
+
+    def _apply_changes(self, service):
+        files = dict(self._files)
+        page_token = self._page_token
+        while page_token:
+            results = service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                pageSize=1000,
+                fields=CHANGE_FIELDS
+            ).execute()
+            for change in results.get('changes', []):
+                file = change.get('file') or {}
+                if change.get('removed') or file.get('trashed'):
+                    files.pop(change['fileId'], None)
+                elif 'name' in file:
+                    files[change['fileId']] = file['name']
+            if 'newStartPageToken' in results:
+                self._page_token = results['newStartPageToken']
+            page_token = results.get('nextPageToken')
+        return files
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_drive_name_index(account=None):
+    """
+    Get the file-name index for a Drive account.
+
+    Drive credentials are configured once per deployment, so the account
+    defaults to the Drive token file.
+
+    Args:
+        account (str, optional): Key identifying the Drive account
+
+    Returns:
+        DriveNameIndex: The shared index for the account
+    """
+    if account is None:
+        account = google_drive_utils.TOKEN_PATH
+    with _indexes_lock:
+        index = _indexes.get(account)
+        if index is None:
+            index = DriveNameIndex()
+            _indexes[account] = index
+        return index
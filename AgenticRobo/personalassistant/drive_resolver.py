@@ -0,0 +1,125 @@
+"""
+Google Drive file resolution for RoboSynthesis.
+
+Resolves a file name from a chat request to a Drive file with at most one API
+call: recent resolutions are cached, the cached file-name index is consulted
+first, and otherwise a single combined exact/contains query is issued. The
+candidates are ranked locally with fuzzy scoring.
+
+Configuration (environment variables):
+- DRIVE_RESOLVER_TTL: Seconds a name -> file resolution is cached (default: 300)
+"""
+
+import os
+import time
+import logging
+import threading
+from difflib import SequenceMatcher
+
+from . import google_drive_utils
+from .drive_index import get_drive_name_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DRIVE_RESOLVER_TTL = float(os.getenv('DRIVE_RESOLVER_TTL', 300))
+
+# Maximum number of cached resolutions
+MAX_RESOLUTIONS = 1000
+
+_lock = threading.Lock()
+# (account, lowercased name) -> (file, resolved_at)
+_resolutions = {}
+
+
+def _escape_query_value(value):
+    """Escape a value for use inside a quoted Drive search query string"""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def score_candidate(file_name, candidate_name):
+    """
+    Score how well a Drive file name matches the requested name.
+
+    Returns:
+        float: 2.0 for an exact (case-insensitive) match, 1.5 for a match
+               without the extension, otherwise a fuzzy similarity with a
+               bonus for substring matches (always below 1.5)
+    """
+    wanted = file_name.lower()
+    name = candidate_name.lower()
+    if name == wanted:
+        return 2.0
+    # Names often differ only by extension ("heroes" vs "heroes.xlsx")
+    if os.path.splitext(name)[0] == wanted:
+        return 1.5
+    score = SequenceMatcher(None, wanted, name).ratio()
+    if wanted in name:
+        score += 0.5
+    return min(score, 1.49)
+
+
+def rank_candidates(file_name, candidates):
+    """Sort candidate files by match score, best first, keeping listing order on ties"""
+    return sorted(candidates, key=lambda f: score_candidate(file_name, f['name']), reverse=True)
+
+
+def forget_resolution(file_name, account=None):
+    """Drop a cached resolution, e.g. after the resolved file could not be read"""
+    account = account or google_drive_utils.TOKEN_PATH
+    with _lock:
+        _resolutions.pop((account, file_name.lower()), None)
+
+
+def resolve_file(file_name, account=None):
+    """
+    Resolve a file name to the best matching Drive file.
+
+    Args:
+        file_name (str): The file name requested by the user
+        account (str, optional): Key identifying the Drive account
+
+    Returns:
+        dict: 'file' (dict with id and name, or None), 'candidates' (ranked list),
+              'source' ('cache', 'index' or 'query') and 'api_calls' used
+    """
+    account = account or google_drive_utils.TOKEN_PATH
+    key = (account, file_name.lower())
+
+    # 1. Recently resolved names cost no API calls
+    with _lock:
+        cached = _resolutions.get(key)
+    if cached and time.time() - cached[1] < DRIVE_RESOLVER_TTL:
+        logger.info(f"Resolved '{file_name}' from cache: {cached[0]['name']}")
+        return {'file': cached[0], 'candidates': [cached[0]], 'source': 'cache', 'api_calls': 0}
+
+    # 2. Substring matches from the cached name index, also free
+    candidates = rank_candidates(file_name, get_drive_name_index(account).search(file_name))
+    source = 'index'
+    api_calls = 0
+
+    # 3. Otherwise one combined exact/contains query on the server
+    if not candidates or score_candidate(file_name, candidates[0]['name']) < 1.5:
+        value = _escape_query_value(file_name)
+        server_files = google_drive_utils.list_files(
+            limit=100,
+            query=f"(name = '{value}' or name contains '{value}') and trashed = false"
+        )
+        api_calls = 1
+        seen = {f['id'] for f in candidates}
+        candidates = rank_candidates(file_name, candidates + [f for f in server_files if f['id'] not in seen])
+        source = 'query'
+
+    result = {'file': None, 'candidates': candidates, 'source': source, 'api_calls': api_calls}
+    if candidates:
+        best = candidates[0]
+        result['file'] = best
+        with _lock:
+            _resolutions.pop(key, None)
+            _resolutions[key] = (best, time.time())
+            while len(_resolutions) > MAX_RESOLUTIONS:
+                _resolutions.pop(next(iter(_resolutions)))
+        logger.info(f"Resolved '{file_name}' to '{best['name']}' via {source} ({api_calls} API calls)")
+    else:
+        logger.info(f"Could not resolve '{file_name}' ({api_calls} API calls)")
+    return result
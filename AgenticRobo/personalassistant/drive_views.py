@@ -1,7 +1,7 @@
 """
 Google Drive API views for RoboSynthesis
 This module provides API endpoints to interact with Google Drive:
-- List all files
+- List all files (cursor-paginated or streamed as NDJSON)
 - List specific file types (e.g., Excel files)
 - Read file contents
 - Create files with content
@@ -9,7 +9,7 @@ This module provides API endpoints to interact with Google Drive:
 
 import json
 import logging
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
 from django.views.decorators.http import require_http_methods, require_POST, require_GET
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
@@ -18,6 +18,31 @@ from . import google_drive_utils
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# File fields callers may request through the 'fields' parameter
+ALLOWED_FILE_FIELDS = {
+    'id', 'name', 'mimeType', 'createdTime', 'modifiedTime', 'size',
+    'md5Checksum', 'parents', 'webViewLink', 'iconLink', 'starred', 'trashed'
+}
+
+def parse_file_fields(fields_param):
+    """Validate a comma-separated field projection against ALLOWED_FILE_FIELDS"""
+    if not fields_param:
+        return google_drive_utils.DEFAULT_FILE_FIELDS
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    invalid = [f for f in fields if f not in ALLOWED_FILE_FIELDS]
+    if invalid:
+        raise ValueError(f"Unsupported file fields: {', '.join(invalid)}")
+    return ', '.join(fields)
+
+def stream_files_ndjson(query, fields, page_size):
+    """Yield every matching file as one JSON line, page by page"""
+    try:
+        for f in google_drive_utils.iter_files(query=query, fields=fields, page_size=page_size):
+            yield json.dumps(f) + "\n"
+    except Exception as e:
+        logger.error(f"Error streaming Drive files: {str(e)}")
+        yield json.dumps({'error': str(e)}) + "\n"
+
 @login_required
 @require_GET
 def list_drive_files(request):
@@ -25,18 +50,42 @@ def list_drive_files(request):
     API endpoint to list files in Google Drive
     
     Query parameters:
-    - page_size: Maximum number of files to return (default: 100)
+    - page_size: Maximum number of files per page (default: 100, max: 1000)
     - query: Search query (optional)
+    - fields: Comma-separated file fields to return (optional)
+    - cursor: Cursor of the page to return, from a previous 'next_cursor' (optional)
+    - format: 'json' for one page (default) or 'ndjson' to stream every file
     """
     try:
         page_size = int(request.GET.get('page_size', 100))
         query = request.GET.get('query')
+        cursor = request.GET.get('cursor')
+        format_type = request.GET.get('format', 'json')
         
-        files = google_drive_utils.list_files(page_size=page_size, query=query)
+        try:
+            fields = parse_file_fields(request.GET.get('fields'))
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        
+        if format_type == 'ndjson':
+            # Stream the whole listing without holding it in memory
+            return StreamingHttpResponse(
+                stream_files_ndjson(query, fields, google_drive_utils.MAX_PAGE_SIZE),
+                content_type='application/x-ndjson'
+            )
+        
+        pages = google_drive_utils.iter_file_pages(
+            query=query, fields=fields, page_size=page_size, page_token=cursor
+        )
+        files, next_cursor = next(pages)
         
         return JsonResponse({
             'success': True,
-            'files': files
+            'files': files,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logger.error(f"Error listing Drive files: {str(e)}")
@@ -60,7 +109,7 @@ def list_drive_files_by_type(request, file_type):
     try:
         page_size = int(request.GET.get('page_size', 100))
         
-        files = google_drive_utils.list_files_by_type(file_type=file_type, page_size=page_size)
+        files = google_drive_utils.list_files_by_type(file_type=file_type, limit=page_size)
         
         return JsonResponse({
             'success': True,
@@ -84,22 +133,27 @@ def read_drive_file(request, file_id):
     - file_id: ID of the file to read
     
     Query parameters:
-    - format: Format to return the content in (default: 'json')
+    - format: Format to return the content in: 'json' (default) or 'raw' to download the file
+    - sheet: Spreadsheet sheet to read (optional, default: the first sheet)
+    - columns: Comma-separated spreadsheet columns to read (optional, default: all columns)
     """
     try:
         format_type = request.GET.get('format', 'json')
+        sheet = request.GET.get('sheet') or None
+        columns = [c.strip() for c in request.GET.get('columns', '').split(',') if c.strip()] or None
         
-        file_data = google_drive_utils.read_file_content(file_id=file_id)
-        
-        if format_type == 'raw' and isinstance(file_data['content'], bytes):
-            # Return raw file content
-            response = HttpResponse(
-                file_data['content'],
-                content_type=file_data['mime_type']
+        if format_type == 'raw':
+            # Stream the raw file from its spooled download; FileResponse closes it
+            download = google_drive_utils.download_file(file_id=file_id)
+            return FileResponse(
+                download['stream'],
+                content_type=download['mime_type'],
+                as_attachment=True,
+                filename=download['name']
             )
-            response['Content-Disposition'] = f'attachment; filename="{file_data["name"]}"'
-            return response
         else:
+            file_data = google_drive_utils.read_file_content(file_id=file_id, sheet=sheet, columns=columns)
+            
             # Return JSON response
             return JsonResponse({
                 'success': True,
@@ -109,6 +163,11 @@ def read_drive_file(request, file_id):
                     'content': file_data['content'] if not isinstance(file_data['content'], bytes) else '[Binary content]'
                 }
             })
+    except google_drive_utils.DownloadTooLargeError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=413)
     except Exception as e:
         logger.error(f"Error reading Drive file: {str(e)}")
         return JsonResponse({
@@ -0,0 +1,421 @@
+"""
+Document text extraction engine for RoboSynthesis.
+
+One registry of extractors serves chat uploads, subject contexts and Google
+Drive reads. The format of a document is detected from its magic bytes first,
+then its file extension, then its MIME type (browsers often send generic or
+wrong types, e.g. application/vnd.ms-excel for .csv on Windows), and
+extractors read directly from file-like objects, so no temporary files are
+written.
+
+Large PDFs are split into page ranges and extracted on a bounded process
+pool, and whole documents can be extracted there with submit_extraction().
+CSV and Excel files are ingested into queryable datasets (see tabular_store)
+and extracted as a token-bounded summary rather than every row.
+Per-format timing metrics are available from get_extraction_metrics().
+
+Configuration (environment variables):
+- PDF_PARALLEL_MIN_PAGES: Pages needed before a PDF is extracted in parallel (default: 40)
+- PDF_PARALLEL_WORKERS: Size of the document extraction process pool (default: CPU count, at most 4)
+"""
+
+import io
+import os
+import time
+import logging
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF for PDF processing
+import docx  # python-docx for DOCX processing
+
+from .tabular_store import ingest_table, render_dataset_summary
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 40))
+PDF_PARALLEL_WORKERS = int(os.getenv('PDF_PARALLEL_WORKERS', min(4, os.cpu_count() or 1)))
+
+
+class ExtractionError(Exception):
+    """Raised when text cannot be extracted from a document"""
+
+
+# format name -> extractor(stream, **options) -> str
+_extractors = {}
+_mime_types = {}
+_extensions = {}
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+_process_executor = None
+_process_executor_lock = threading.Lock()
+# True inside document pool workers, which must not start a pool of their own
+_in_pool_worker = False
+
+
+def register_extractor(name, mime_types=(), extensions=()):
+    """
+    Register a text extractor for a document format.
+
+    Args:
+        name (str): Format name, e.g. 'pdf'
+        mime_types (tuple): MIME types handled by the extractor
+        extensions (tuple): File extensions (without the dot) handled by the extractor
+
+    Returns:
+        A decorator registering a function that takes a binary file-like object
+        (plus keyword options) and returns the extracted text
+    """
+    def decorator(func):
+        _extractors[name] = func
+        for mime_type in mime_types:
+            _mime_types[mime_type] = name
+        for extension in extensions:
+            _extensions[extension] = name
+        return func
+    return decorator
+
+
+def _sniff(stream):
+    """Detect a format from the leading bytes of a stream, or None"""
+    head = stream.read(8)
+    stream.seek(0)
+
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK'):
+        # DOCX and XLSX are both zip archives; tell them apart by their parts
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                names = archive.namelist()
+        except zipfile.BadZipFile:
+            return None
+        finally:
+            stream.seek(0)
+        if any(n.startswith('word/') for n in names):
+            return 'docx'
+        if any(n.startswith('xl/') for n in names):
+            return 'excel'
+    return None
+
+
+def detect_format(stream, file_name=None, mime_type=None):
+    """
+    Detect the registered format of a document.
+
+    Args:
+        stream: Seekable binary file-like object
+        file_name (str, optional): Original file name
+        mime_type (str, optional): Declared MIME type
+
+    Returns:
+        str: The format name, or None if no extractor handles the document
+    """
+    fmt = _sniff(stream)
+    # A known extension beats the declared MIME type, which browsers often get wrong
+    if fmt is None and file_name and '.' in file_name:
+        fmt = _extensions.get(file_name.rsplit('.', 1)[-1].lower())
+    if fmt is None and mime_type:
+        fmt = _mime_types.get(mime_type.split(';')[0].strip().lower())
+    return fmt
+
+
+def _record(fmt, elapsed_ms, size, failed):
+    with _metrics_lock:
+        metrics = _metrics.setdefault(fmt, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'bytes': 0})
+        metrics['count'] += 1
+        metrics['errors'] += int(failed)
+        metrics['total_ms'] += elapsed_ms
+        metrics['max_ms'] = max(metrics['max_ms'], elapsed_ms)
+        metrics['bytes'] += size
+
+
+def get_extraction_metrics():
+    """
+    Get per-format extraction timings.
+
+    Returns:
+        dict: Format name -> count, errors, total_ms, avg_ms, max_ms and bytes
+    """
+    with _metrics_lock:
+        return {
+            fmt: {**metrics, 'avg_ms': round(metrics['total_ms'] / metrics['count'], 2)}
+            for fmt, metrics in _metrics.items()
+        }
+
+
+def extract_text(file, file_name=None, mime_type=None, **options):
+    """
+    Extract the text of a document.
+
+    Args:
+        file: Binary file-like object (an upload, a download stream or bytes)
+        file_name (str, optional): Original file name, used as a format hint
+        mime_type (str, optional): Declared MIME type, used as a format hint
+        **options: Passed to the format's extractor (e.g. first_page and
+                   last_page for PDFs)
+
+    Returns:
+        str: The extracted text
+
+    Raises:
+        ExtractionError: If the format is unsupported or extraction fails
+    """
+    stream = io.BytesIO(file) if isinstance(file, (bytes, bytearray)) else file
+    stream.seek(0)
+
+    fmt = detect_format(stream, file_name=file_name, mime_type=mime_type)
+    if fmt is None:
+        raise ExtractionError("Unsupported file type")
+
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    start = time.perf_counter()
+    failed = False
+    try:
+        return _extractors[fmt](stream, **options)
+    except Exception as e:
+        failed = True
+        logger.error(f"Error extracting {fmt.upper()} text: {str(e)}")
+        raise ExtractionError(f"Error processing {fmt.upper()}: {str(e)}") from e
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _record(fmt, elapsed_ms, size, failed)
+        logger.info(f"Extracted {fmt} ({size} bytes) in {elapsed_ms:.1f}ms")
+
+
+def _disk_path(file):
+    """Get the path of a file-like object backed by a file on disk, or None"""
+    temporary_file_path = getattr(file, 'temporary_file_path', None)
+    if temporary_file_path:
+        return temporary_file_path()
+    # Open files, storage files and rolled-over downloads name their absolute path
+    name = getattr(file, 'name', None)
+    if isinstance(name, str) and os.path.isabs(name) and os.path.isfile(name):
+        return name
+    return None
+
+
+def _document_source(file):
+    """
+    Get something a document can be opened from without writing a temporary file.
+
+    Files already on disk (uploads Django spooled to disk, files opened from
+    storage, large Drive downloads) are opened from their path, so their bytes
+    are never loaded into memory or sent to pool workers; anything else is
+    opened from its bytes.
+
+    Returns:
+        str or bytes: A file path or the document bytes
+    """
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    path = _disk_path(file)
+    if path:
+        return path
+    file.seek(0)
+    return file.getvalue() if hasattr(file, 'getvalue') else file.read()
+
+
+def _open_pdf_source(source):
+    if isinstance(source, str):
+        return fitz.open(source, filetype='pdf')
+    return fitz.open(stream=source, filetype='pdf')
+
+
+def open_pdf(file):
+    """Open a PDF with PyMuPDF without writing a temporary file"""
+    return _open_pdf_source(_document_source(file))
+
+
+def parse_page_range(value):
+    """
+    Parse a 1-based page range such as '5', '3-10', '-10' or '20-'.
+
+    Returns:
+        tuple: (first_page, last_page), either of which may be None
+    """
+    value = (value or '').strip()
+    if not value:
+        return None, None
+    first, _, last = value.partition('-') if '-' in value else (value, '', value)
+    first = int(first) if first.strip() else None
+    last = int(last) if last.strip() else None
+    if (first is not None and first < 1) or (last is not None and last < (first or 1)):
+        raise ValueError(f"Invalid page range '{value}'")
+    return first, last
+
+
+def iter_pdf_pages(file, first_page=None, last_page=None):
+    """
+    Extract PDF text page by page.
+
+    Args:
+        file: PDF bytes, upload or binary file-like object
+        first_page (int, optional): First page to extract, 1-based (default: 1)
+        last_page (int, optional): Last page to extract, inclusive (default: the last page)
+
+    Yields:
+        tuple: (page_number, text) for each page, in order
+    """
+    with open_pdf(file) as pdf_document:
+        start, stop = _page_bounds(pdf_document.page_count, first_page, last_page)
+        for page_num in range(start, stop):
+            yield page_num + 1, pdf_document.load_page(page_num).get_text()
+
+
+def _page_bounds(page_count, first_page, last_page):
+    """Convert a 1-based inclusive page range to 0-based start/stop indexes"""
+    start = (first_page or 1) - 1
+    stop = min(last_page or page_count, page_count)
+    return start, max(start, stop)
+
+
+def _extract_page_shard(source, start, stop):
+    """Extract the text of pages [start, stop) in a worker process"""
+    with _open_pdf_source(source) as pdf_document:
+        return [pdf_document.load_page(page_num).get_text() for page_num in range(start, stop)]
+
+
+def _mark_pool_worker():
+    global _in_pool_worker
+    _in_pool_worker = True
+
+
+def _get_process_executor():
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is None:
+            # Spawned workers don't inherit the server's threads and open sockets
+            _process_executor = ProcessPoolExecutor(
+                max_workers=PDF_PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_mark_pool_worker
+            )
+        return _process_executor
+
+
+def _reset_process_executor():
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is not None:
+            _process_executor.shutdown(wait=False, cancel_futures=True)
+        _process_executor = None
+
+
+def _extract_pages_parallel(source, start, stop):
+    """
+    Extract pages [start, stop) in page-range shards on the process pool.
+
+    Every shard is sent the source, so large documents should be given as a
+    path; bytes sources are only the small in-memory ones.
+
+    Returns:
+        list: Page texts in page order
+    """
+    shard_size = -(-(stop - start) // PDF_PARALLEL_WORKERS)
+    executor = _get_process_executor()
+    futures = [
+        executor.submit(_extract_page_shard, source, shard_start, min(shard_start + shard_size, stop))
+        for shard_start in range(start, stop, shard_size)
+    ]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+@register_extractor('pdf', mime_types=('application/pdf',), extensions=('pdf',))
+def extract_pdf(stream, first_page=None, last_page=None, **options):
+    """
+    Extract text from a PDF, optionally only a range of its pages.
+
+    Documents with at least PDF_PARALLEL_MIN_PAGES pages in range are sharded
+    across the document process pool; smaller ones are extracted inline, as
+    is everything inside a pool worker (so workers never start nested pools).
+    """
+    source = _document_source(stream)
+    with _open_pdf_source(source) as pdf_document:
+        start, stop = _page_bounds(pdf_document.page_count, first_page, last_page)
+        inline = PDF_PARALLEL_WORKERS < 2 or _in_pool_worker
+        if stop - start < PDF_PARALLEL_MIN_PAGES or inline:
+            return "".join([pdf_document.load_page(page_num).get_text() for page_num in range(start, stop)])
+
+    try:
+        return "".join(_extract_pages_parallel(source, start, stop))
+    except BrokenProcessPool:
+        logger.warning("PDF process pool broke; extracting inline")
+        _reset_process_executor()
+        return "".join(_extract_page_shard(source, start, stop))
+
+
+def _extract_in_worker(source, file_name, mime_type, options):
+    """Extract a document's text in a pool worker, timing the extraction there"""
+    start = time.perf_counter()
+    if isinstance(source, str):
+        with open(source, 'rb') as stream:
+            text = extract_text(stream, file_name=file_name, mime_type=mime_type, **options)
+    else:
+        text = extract_text(source, file_name=file_name, mime_type=mime_type, **options)
+    return text, (time.perf_counter() - start) * 1000
+
+
+def submit_extraction(file, file_name=None, mime_type=None, **options):
+    """
+    Extract a document's text on the document process pool.
+
+    Files on disk are read by path in the worker; anything else is sent to
+    it as bytes.
+
+    Returns:
+        Future: Resolves to (text, extraction time in ms), or raises
+                ExtractionError
+    """
+    source = _document_source(file)
+    return _get_process_executor().submit(_extract_in_worker, source, file_name, mime_type, options)
+
+
+@register_extractor(
+    'docx',
+    mime_types=('application/vnd.openxmlformats-officedocument.wordprocessingml.document',),
+    extensions=('docx',)
+)
+def extract_docx(stream, **options):
+    """Extract text from a DOCX document"""
+    document = docx.Document(stream)
+    return "\n".join([paragraph.text for paragraph in document.paragraphs])
+
+
+@register_extractor('txt', mime_types=('text/plain',), extensions=('txt',))
+def extract_txt(stream, **options):
+    """Extract text from a plain text file"""
+    return stream.read().decode('utf-8')
+
+
+@register_extractor('csv', mime_types=('text/csv',), extensions=('csv',))
+def extract_csv(stream, owner=None, **options):
+    """Summarize a CSV file, storing the full table for the owner's queries"""
+    return render_dataset_summary(ingest_table(stream, 'csv', owner=owner), title="CSV File Contents")
+
+
+@register_extractor(
+    'excel',
+    mime_types=(
+        'application/vnd.ms-excel',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+    extensions=('xls', 'xlsx')
+)
+def extract_excel(stream, sheet=None, owner=None, **options):
+    """Summarize a sheet of an Excel workbook, storing the full table for the owner's queries"""
+    return render_dataset_summary(
+        ingest_table(stream, 'excel', sheet=sheet, owner=owner), title="Excel File Contents"
+    )
@@ -5,13 +5,9 @@ import os
 import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.auth.exceptions import RefreshError
 import json
 import logging
+from .google_services import CachedServiceFactory
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,62 +16,22 @@ logger = logging.getLogger(__name__)
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
+# Cached Gmail service shared by all operations
+_gmail_services = CachedServiceFactory(
+    'gmail', 'v1', SCOPES,
+    os.path.join('credentials', 'google_credentials.json'),
+    os.path.join('credentials', 'token.json'),
+    'Gmail'
+)
+
 def get_gmail_service():
     """
-    Get an authorized Gmail API service instance using credentials from the credentials folder.
+    Get the cached Gmail API service instance using credentials from the credentials folder.
     
     Returns:
         A Gmail API service object or None if authentication fails.
     """
-    try:
-        creds = None
-        credentials_path = os.path.join('credentials', 'google_credentials.json')
-        token_path = os.path.join('credentials', 'token.json')
-        
-        # Check if credentials file exists
-        if not os.path.exists(credentials_path):
-            logger.error("Google credentials file not found. Please connect Google Apps in MCP Config.")
-            return None
-            
-        # Load credentials from file
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_info(
-                json.load(open(token_path)), SCOPES)
-                
-        # If credentials don't exist or are invalid, refresh or create new ones
-        if not creds or not creds.valid:
-            try:
-                if creds and creds.expired and creds.refresh_token:
-                    try:
-                        creds.refresh(Request())
-                        logger.info("Successfully refreshed Gmail credentials")
-                    except RefreshError as re:
-                        logger.warning(f"Failed to refresh token: {str(re)}")
-                        # If refresh fails, create new credentials
-                        logger.info("Creating new credentials after refresh failure")
-                        flow = InstalledAppFlow.from_client_secrets_file(
-                            credentials_path, SCOPES)
-                        creds = flow.run_local_server(port=0)
-                else:
-                    # Create new credentials
-                    logger.info("Creating new Gmail credentials")
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        credentials_path, SCOPES)
-                    creds = flow.run_local_server(port=0)
-            except Exception as auth_error:
-                logger.error(f"Authentication error: {str(auth_error)}")
-                return None
-                
-            # Save the credentials for the next run
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
-                
-        # Build and return the Gmail service
-        return build('gmail', 'v1', credentials=creds)
-        
-    except Exception as e:
-        logger.error(f"Error getting Gmail service: {str(e)}")
-        return None
+    return _gmail_services.get_service()
 
 def send_email(to, subject, body, cc=None, bcc=None):
     """
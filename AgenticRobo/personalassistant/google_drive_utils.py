@@ -1,7 +1,7 @@
 """
 Google Drive API utilities for RoboSynthesis
 This module provides functions to interact with Google Drive:
-- List all files
+- List all files (paginated)
 - List specific file types (e.g., Excel files)
 - Read file contents
 - Create files with content
@@ -10,15 +10,17 @@ This module provides functions to interact with Google Drive:
 import os
 import io
 import json
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.auth.exceptions import RefreshError
-from googleapiclient.discovery import build
+import itertools
+import tempfile
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 import pandas as pd
 import logging
+from .google_services import CachedServiceFactory
+from .drive_content_cache import content_cache_key, get_content_cache
+from .spreadsheet_reader import read_spreadsheet
+from .table_renderer import render_table
+from .extraction import detect_format, extract_text
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -30,94 +32,108 @@ SCOPES = ['https://www.googleapis.com/auth/drive']
 CREDENTIALS_PATH = os.path.join('credentials', 'google_credentials.json')
 TOKEN_PATH = os.path.join('credentials', 'drive_token.json')
 
+# Default file fields returned by listings, and the API's maximum page size
+DEFAULT_FILE_FIELDS = "id, name, mimeType, createdTime, modifiedTime"
+MAX_PAGE_SIZE = 1000
+
+# Google Workspace files have no binary content and must be exported
+GOOGLE_WORKSPACE_TYPES = [
+    'application/vnd.google-apps.document',  # Google Docs
+    'application/vnd.google-apps.spreadsheet',  # Google Sheets
+    'application/vnd.google-apps.presentation',  # Google Slides
+    'application/vnd.google-apps.drawing'  # Google Drawings
+]
+
+# Download tuning: bytes per request, hard size cap, and in-memory spool size
+DRIVE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('DRIVE_DOWNLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+DRIVE_DOWNLOAD_MAX_BYTES = int(os.getenv('DRIVE_DOWNLOAD_MAX_BYTES', 100 * 1024 * 1024))
+# Metadata needed to download a file and to key its parsed content
+DOWNLOAD_METADATA_FIELDS = "name,mimeType,size,modifiedTime,md5Checksum"
+DRIVE_SPOOL_MAX_MEMORY = int(os.getenv('DRIVE_SPOOL_MAX_MEMORY', 8 * 1024 * 1024))
+# Files a chat listing fetches: a single API page, since the reply only names a few
+DRIVE_CHAT_LIST_LIMIT = int(os.getenv('DRIVE_CHAT_LIST_LIMIT', 100))
+
+# Cached Drive service shared by all operations
+_drive_services = CachedServiceFactory('drive', 'v3', SCOPES, CREDENTIALS_PATH, TOKEN_PATH, 'Drive')
+
 def get_drive_service():
     """
-    Create and return a Google Drive API service instance using OAuth credentials
+    Get the cached Google Drive API service instance using OAuth credentials
     """
-    try:
-        creds = None
-        
-        # Check if credentials file exists
-        if not os.path.exists(CREDENTIALS_PATH):
-            logger.error("Google credentials file not found. Please connect Google Apps in MCP Config.")
-            return None
-            
-        # Load credentials from token file if it exists
-        if os.path.exists(TOKEN_PATH):
-            creds = Credentials.from_authorized_user_info(
-                json.load(open(TOKEN_PATH)), SCOPES)
-                
-        # If credentials don't exist or are invalid, refresh or create new ones
-        if not creds or not creds.valid:
-            try:
-                if creds and creds.expired and creds.refresh_token:
-                    try:
-                        creds.refresh(Request())
-                        logger.info("Successfully refreshed Drive credentials")
-                    except RefreshError as re:
-                        logger.warning(f"Failed to refresh token: {str(re)}")
-                        # If refresh fails, create new credentials
-                        logger.info("Creating new credentials after refresh failure")
-                        flow = InstalledAppFlow.from_client_secrets_file(
-                            CREDENTIALS_PATH, SCOPES)
-                        creds = flow.run_local_server(port=0)
-                else:
-                    # Create new credentials
-                    logger.info("Creating new Drive credentials")
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        CREDENTIALS_PATH, SCOPES)
-                    creds = flow.run_local_server(port=0)
-            except Exception as auth_error:
-                logger.error(f"Authentication error: {str(auth_error)}")
-                return None
-                
-            # Save the credentials for the next run
-            with open(TOKEN_PATH, 'w') as token:
-                token.write(creds.to_json())
-                
-        # Build and return the Drive service
-        service = build('drive', 'v3', credentials=creds)
-        return service
-    except Exception as e:
-        logger.error(f"Error creating Drive service: {str(e)}")
-        return None
+    return _drive_services.get_service()
 
-def list_files(page_size=100, query=None):
+def iter_file_pages(query=None, fields=DEFAULT_FILE_FIELDS, page_size=MAX_PAGE_SIZE, page_token=None):
     """
-    List files in Google Drive
+    Iterate over pages of files in Google Drive, following page tokens
     
     Args:
-        page_size (int): Maximum number of files to return
         query (str): Search query (https://developers.google.com/drive/api/guides/search-files)
+        fields (str): Comma-separated file fields to return (field projection)
+        page_size (int): Files per page (capped at the API maximum of 1000)
+        page_token (str): Token of the page to start from (optional)
     
-    Returns:
-        list: List of file objects with id, name, mimeType, etc.
+    Yields:
+        tuple: (list of file objects, token of the next page or None)
     """
-    try:
-        service = get_drive_service()
-        if not service:
-            logger.error("Failed to get Drive service")
-            return []
-            
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Failed to get Drive service")
+    
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    while True:
         results = service.files().list(
             pageSize=page_size,
-            fields="files(id, name, mimeType, createdTime, modifiedTime)",
-            q=query
+            fields=f"nextPageToken, files({fields})",
+            q=query,
+            pageToken=page_token
         ).execute()
-        return results.get('files', [])
+        page_token = results.get('nextPageToken')
+        yield results.get('files', []), page_token
+        if not page_token:
+            return
+
+def iter_files(query=None, fields=DEFAULT_FILE_FIELDS, page_size=MAX_PAGE_SIZE):
+    """
+    Iterate over all files in Google Drive with constant memory
+    
+    Args:
+        query (str): Search query (optional)
+        fields (str): Comma-separated file fields to return (field projection)
+        page_size (int): Files fetched per API call
+    
+    Yields:
+        dict: File objects with the requested fields
+    """
+    for files, _ in iter_file_pages(query=query, fields=fields, page_size=page_size):
+        yield from files
+
+def list_files(limit=None, query=None, fields=DEFAULT_FILE_FIELDS):
+    """
+    List files in Google Drive, paging through the whole Drive
+    
+    Args:
+        limit (int): Maximum number of files to return (default: no limit)
+        query (str): Search query (https://developers.google.com/drive/api/guides/search-files)
+        fields (str): Comma-separated file fields to return (field projection)
+    
+    Returns:
+        list: List of file objects with id, name, mimeType, etc.
+    """
+    try:
+        # Follow page tokens until every file (or limit files) has been collected
+        page_size = min(limit, MAX_PAGE_SIZE) if limit else MAX_PAGE_SIZE
+        return list(itertools.islice(iter_files(query=query, fields=fields, page_size=page_size), limit))
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}")
         return []
-        logger.error(f"Unexpected error listing files: {str(e)}")
-        raise
 
-def list_files_by_type(file_type, page_size=100):
+def list_files_by_type(file_type, limit=None):
     """
     List files of a specific type in Google Drive
     
     Args:
         file_type (str): File type to filter by (e.g., 'excel', 'document', 'pdf')
-        page_size (int): Maximum number of files to return
+        limit (int): Maximum number of files to return (default: no limit)
     
     Returns:
         list: List of file objects with id, name, mimeType, etc.
@@ -138,126 +154,210 @@ def list_files_by_type(file_type, page_size=100):
         # If the file type is not in our predefined list, try to use it directly
         query = f"mimeType contains '{file_type}'"
     
-    return list_files(page_size=page_size, query=query)
+    return list_files(limit=limit, query=query)
+
+class DownloadTooLargeError(Exception):
+    """Raised when a Drive file exceeds the configured download size cap"""
+
+class SpooledNamedTemporaryFile(tempfile.SpooledTemporaryFile):
+    """
+    SpooledTemporaryFile that rolls over to a named temporary file
+    
+    Once rolled over, .name is the path of the file on disk, so large
+    downloads can be opened by path (e.g. PDFs with fitz) instead of being
+    read back into memory.
+    """
+    
+    def rollover(self):
+        if self._rolled:
+            return
+        memory_file = self._file
+        disk_file = tempfile.NamedTemporaryFile(**self._TemporaryFileArgs)
+        del self._TemporaryFileArgs
+        disk_file.write(memory_file.getvalue())
+        disk_file.seek(memory_file.tell())
+        memory_file.close()
+        self._file = disk_file
+        self._rolled = True
+
+def _media_request(service, file_id, file_name, mime_type):
+    """Build the download (or export, for Google Workspace files) request for a file"""
+    if mime_type in GOOGLE_WORKSPACE_TYPES:
+        logger.info(f"Exporting Google Workspace file: {file_name} ({mime_type})")
+        
+        # Determine export MIME type
+        export_mime_type = 'application/pdf'  # Default to PDF
+        
+        if mime_type == 'application/vnd.google-apps.document':
+            export_mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'  # Export as DOCX
+        elif mime_type == 'application/vnd.google-apps.spreadsheet':
+            export_mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'  # Export as XLSX
+        elif mime_type == 'application/vnd.google-apps.presentation':
+            export_mime_type = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'  # Export as PPTX
+        
+        # Export the file
+        logger.info(f"Exporting file {file_id} as {export_mime_type}")
+        return service.files().export_media(fileId=file_id, mimeType=export_mime_type)
+    
+    # For regular binary files, use get_media
+    logger.info(f"Downloading binary file: {file_name} ({mime_type})")
+    return service.files().get_media(fileId=file_id)
+
+def get_file_metadata(file_id):
+    """
+    Get the metadata needed to download a file and identify its version
+    
+    Args:
+        file_id (str): ID of the file
+    
+    Returns:
+        dict: name, mimeType, size, modifiedTime and md5Checksum (where available)
+    """
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Failed to get Drive service")
+    
+    return service.files().get(fileId=file_id, fields=DOWNLOAD_METADATA_FIELDS).execute()
 
-def read_file_content(file_id):
+def download_file(file_id, chunk_size=DRIVE_DOWNLOAD_CHUNK_SIZE, max_bytes=DRIVE_DOWNLOAD_MAX_BYTES, metadata=None):
+    """
+    Download a file from Google Drive into a spooled temporary file
+    
+    Small files stay in memory; anything larger than DRIVE_SPOOL_MAX_MEMORY
+    spills to a named file on disk, so peak memory per download is bounded and
+    large files can be opened by path.
+    
+    Args:
+        file_id (str): ID of the file to download
+        chunk_size (int): Bytes fetched per download request
+        max_bytes (int): Hard cap on the download size
+        metadata (dict, optional): Metadata already fetched with get_file_metadata
+    
+    Returns:
+        dict: File name, mime_type, metadata and 'stream' (a SpooledNamedTemporaryFile
+              positioned at the start, to be closed by the caller)
+    
+    Raises:
+        DownloadTooLargeError: If the file is larger than max_bytes
+    """
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Failed to get Drive service")
+    
+    # Get file metadata
+    file_metadata = metadata or get_file_metadata(file_id)
+    file_name = file_metadata.get('name', 'unknown')
+    mime_type = file_metadata.get('mimeType', '')
+    
+    # Binary files report their size up front; exports are checked while downloading
+    if int(file_metadata.get('size', 0)) > max_bytes:
+        raise DownloadTooLargeError(f"File '{file_name}' is larger than the {max_bytes} byte download limit")
+    
+    stream = SpooledNamedTemporaryFile(max_size=DRIVE_SPOOL_MAX_MEMORY)
+    try:
+        request = _media_request(service, file_id, file_name, mime_type)
+        downloader = MediaIoBaseDownload(stream, request, chunksize=chunk_size)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+            if stream.tell() > max_bytes:
+                raise DownloadTooLargeError(f"File '{file_name}' is larger than the {max_bytes} byte download limit")
+        # Make a spilled file complete on disk for readers that open it by path
+        stream.flush()
+        stream.seek(0)
+    except Exception:
+        stream.close()
+        raise
+    
+    return {
+        'name': file_name,
+        'mime_type': mime_type,
+        'metadata': file_metadata,
+        'stream': stream
+    }
+
+def read_file_content(file_id, sheet=None, columns=None):
     """
     Read the content of a file from Google Drive
     
+    Parsed text and tabular content is cached per file version, so repeat reads
+    of an unchanged file skip both the download and the parse. Spreadsheets are
+    streamed and only a preview of their rows is returned.
+    
     Args:
         file_id (str): ID of the file to read
+        sheet (str, optional): Spreadsheet sheet to read (default: the first sheet)
+        columns (list, optional): Spreadsheet columns to keep (default: all columns)
     
     Returns:
         dict: Dictionary with file content, name, and mime_type
     """
     try:
-        service = get_drive_service()
-        
-        # Get file metadata
-        file_metadata = service.files().get(fileId=file_id, fields="name,mimeType").execute()
-        file_name = file_metadata.get('name', 'unknown')
-        mime_type = file_metadata.get('mimeType', '')
-        
-        # Handle different file types for download
-        file_content = io.BytesIO()
+        metadata = get_file_metadata(file_id)
+        cache_key = content_cache_key(file_id, metadata)
+        if cache_key and (sheet or columns):
+            cache_key += f":{sheet or ''}:{','.join(columns or [])}"
+        cached = get_content_cache().get(cache_key)
+        if cached is not None:
+            logger.info(f"Serving cached content for {cached['name']}")
+            return dict(cached)
         
-        # Check if this is a Google Workspace file that needs export
-        google_workspace_types = [
-            'application/vnd.google-apps.document',  # Google Docs
-            'application/vnd.google-apps.spreadsheet',  # Google Sheets
-            'application/vnd.google-apps.presentation',  # Google Slides
-            'application/vnd.google-apps.drawing'  # Google Drawings
-        ]
+        download = download_file(file_id, metadata=metadata)
+        file_name = download['name']
+        mime_type = download['mime_type']
         
-        if mime_type in google_workspace_types:
-            logger.info(f"Exporting Google Workspace file: {file_name} ({mime_type})")
-            
-            # Determine export MIME type
-            export_mime_type = 'application/pdf'  # Default to PDF
-            
-            if mime_type == 'application/vnd.google-apps.document':
-                export_mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'  # Export as DOCX
-            elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                export_mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'  # Export as XLSX
-            elif mime_type == 'application/vnd.google-apps.presentation':
-                export_mime_type = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'  # Export as PPTX
-            
-            # Export the file
-            request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
-            logger.info(f"Exporting file {file_id} as {export_mime_type}")
-        else:
-            # For regular binary files, use get_media
-            logger.info(f"Downloading binary file: {file_name} ({mime_type})")
-            request = service.files().get_media(fileId=file_id)
-        
-        # Download the file content
-        downloader = MediaIoBaseDownload(file_content, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            
-        file_content.seek(0)
-        
-        # Process content based on mime type
-        content = None
-        if 'spreadsheet' in mime_type or mime_type in ['application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
-            # For Excel files, convert to DataFrame and then to a readable string format
-            try:
-                df = pd.read_excel(file_content)
-                
-                # Convert DataFrame to a readable string format
-                if not df.empty:
-                    # Get column headers
-                    headers = df.columns.tolist()
-                    
-                    # Convert to a formatted string representation
-                    string_content = "Excel File Contents:\n\n"
-                    string_content += "Columns: " + ", ".join(headers) + "\n\n"
-                    
-                    # Add first 10 rows (or all if less than 10)
-                    max_rows = min(10, len(df))
-                    string_content += f"Showing first {max_rows} rows (total rows: {len(df)}):\n\n"
-                    
-                    # Format each row
-                    for i in range(max_rows):
-                        row = df.iloc[i]
-                        row_str = f"Row {i+1}: " + ", ".join([f"{headers[j]}: {row[headers[j]]}" for j in range(len(headers))])
-                        string_content += row_str + "\n"
-                    
-                    content = string_content
+        with download['stream'] as file_content:
+            # Process content based on mime type, reading straight from the spooled file
+            content = None
+            if 'spreadsheet' in mime_type or mime_type in ['application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
+                # For Excel files, stream a preview and column statistics instead of the whole sheet
+                try:
+                    table = read_spreadsheet(file_content, sheet=sheet, columns=columns)
+                except Exception as excel_err:
+                    logger.error(f"Error processing Excel file: {str(excel_err)}")
+                    content = {
+                        'text': f"Could not read Excel file content: {str(excel_err)}",
+                        'data': []
+                    }
                 else:
-                    content = "Excel file is empty (no data found)."
-            except Exception as excel_err:
-                logger.error(f"Error processing Excel file: {str(excel_err)}")
-                content = f"Could not read Excel file content: {str(excel_err)}"
-                
-            # Also include the dict representation for programmatic use
-            try:
-                content_dict = df.to_dict(orient='records')
-                content = {
-                    'text': content,
-                    'data': content_dict
-                }
-            except:
-                content = {
-                    'text': content,
-                    'data': []
-                }
-        elif mime_type in ['application/pdf']:
-            # For PDF files, return binary content
-            content = file_content.getvalue()
-        elif mime_type in ['text/plain', 'text/csv']:
-            # For text files, decode content
-            content = file_content.getvalue().decode('utf-8')
-        else:
-            # For other files, return binary content
-            content = file_content.getvalue()
+                    headers = table['columns']
+                    if table['total_rows']:
+                        string_content = render_table(
+                            table['rows'], columns=headers,
+                            total_rows=table['total_rows'], stats=table['stats']
+                        )
+                    else:
+                        string_content = "Excel file is empty (no data found)."
+                    
+                    # 'data' only holds the preview rows; 'stats' summarizes every row
+                    content = {
+                        'text': string_content,
+                        'data': table['rows'],
+                        'sheet': table['sheet'],
+                        'sheets': table['sheets'],
+                        'columns': headers,
+                        'total_rows': table['total_rows'],
+                        'stats': table['stats']
+                    }
+            elif mime_type in ['text/plain', 'text/csv']:
+                # For text files, decode content
+                content = file_content.read().decode('utf-8')
+            elif detect_format(file_content, file_name=file_name, mime_type=mime_type):
+                # PDFs, Word documents (and Google Docs exported as DOCX) go through the extraction engine
+                content = extract_text(file_content, file_name=file_name, mime_type=mime_type)
+            else:
+                # For other files, return binary content
+                content = file_content.read()
         
-        return {
+        result = {
             'name': file_name,
             'mime_type': mime_type,
             'content': content
         }
+        # Only parsed text and tables are cached, not raw binary content
+        if not isinstance(content, bytes):
+            get_content_cache().put(cache_key, result)
+        return result
     except HttpError as error:
         logger.error(f"Error reading file content: {str(error)}")
         raise
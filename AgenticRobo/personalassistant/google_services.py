@@ -0,0 +1,169 @@
+"""
+Cached Google API service factory for RoboSynthesis.
+
+Building a Google API client re-reads the token file, re-validates the
+credentials and parses the discovery document. This module does that once per
+credential set and hands out the same service object afterwards:
+- Tokens are refreshed proactively shortly before they expire
+- Each thread reuses its own authorized HTTP transport (httplib2 is not thread-safe)
+- The service is rebuilt if the credentials file is replaced or removed
+
+Configuration (environment variables):
+- GOOGLE_TOKEN_REFRESH_MARGIN: Seconds before expiry to refresh a token (default: 300)
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import httplib2
+import google_auth_httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from google.auth.exceptions import RefreshError
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN', 300))
+
+
+class CachedServiceFactory:
+    """Thread-safe, cached builder for one Google API service and credential set"""
+
+    def __init__(self, api, version, scopes, credentials_path, token_path, label):
+        self.api = api
+        self.version = version
+        self.scopes = scopes
+        self.credentials_path = credentials_path
+        self.token_path = token_path
+        self.label = label
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._creds = None
+        self._service = None
+        self._credentials_mtime = None
+        # Bumped whenever credentials change so threads drop stale transports
+        self._generation = 0
+
+    def get_service(self):
+        """
+        Get the cached service, building or refreshing it only when needed.
+
+        Returns:
+            A Google API service object or None if authentication fails
+        """
+        try:
+            # Check the credentials file is still connected (stat only, no read)
+            try:
+                credentials_mtime = os.stat(self.credentials_path).st_mtime
+            except FileNotFoundError:
+                logger.error("Google credentials file not found. Please connect Google Apps in MCP Config.")
+                self.invalidate()
+                return None
+
+            service = self._service
+            if service is not None and credentials_mtime == self._credentials_mtime and not self._needs_refresh():
+                return service
+
+            with self._lock:
+                if self._service is None or credentials_mtime != self._credentials_mtime:
+                    if not self._load_credentials():
+                        return None
+                    self._service = build(
+                        self.api, self.version,
+                        http=self._authorized_http(),
+                        requestBuilder=self._build_request,
+                        cache_discovery=False
+                    )
+                    self._credentials_mtime = credentials_mtime
+                    logger.info(f"Built {self.label} service")
+                elif self._needs_refresh():
+                    self._refresh_credentials()
+                return self._service
+        except Exception as e:
+            logger.error(f"Error creating {self.label} service: {str(e)}")
+            return None
+
+    def invalidate(self):
+        """Drop the cached service and credentials"""
+        with self._lock:
+            self._service = None
+            self._creds = None
+            self._credentials_mtime = None
+            self._generation += 1
+
+    def _needs_refresh(self):
+        creds = self._creds
+        if creds is None or not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        return creds.expiry - datetime.utcnow() < timedelta(seconds=GOOGLE_TOKEN_REFRESH_MARGIN)
+
+    def _refresh_credentials(self):
+        try:
+            self._creds.refresh(Request())
+            logger.info(f"Successfully refreshed {self.label} credentials")
+        except RefreshError as re:
+            logger.warning(f"Failed to refresh token: {str(re)}")
+            # If refresh fails, create new credentials
+            logger.info("Creating new credentials after refresh failure")
+            flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+            self._creds = flow.run_local_server(port=0)
+        self._save_token()
+        self._generation += 1
+
+    def _load_credentials(self):
+        creds = None
+
+        # Load credentials from token file if it exists
+        if os.path.exists(self.token_path):
+            with open(self.token_path) as token:
+                creds = Credentials.from_authorized_user_info(json.load(token), self.scopes)
+
+        # If credentials don't exist or are invalid, refresh or create new ones
+        if not creds or not creds.valid:
+            try:
+                if creds and creds.expired and creds.refresh_token:
+                    self._creds = creds
+                    self._refresh_credentials()
+                    return True
+                # Create new credentials
+                logger.info(f"Creating new {self.label} credentials")
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+                creds = flow.run_local_server(port=0)
+            except Exception as auth_error:
+                logger.error(f"Authentication error: {str(auth_error)}")
+                return False
+
+            self._creds = creds
+            self._save_token()
+        else:
+            self._creds = creds
+
+        self._generation += 1
+        return True
+
+    def _save_token(self):
+        # Save the credentials for the next run
+        with open(self.token_path, 'w') as token:
+            token.write(self._creds.to_json())
+
+    def _authorized_http(self):
+        # Reuse this thread's transport until the credentials change
+        if getattr(self._local, 'generation', None) != self._generation:
+            self._local.http = google_auth_httplib2.AuthorizedHttp(self._creds, http=httplib2.Http())
+            self._local.generation = self._generation
+        return self._local.http
+
+    def _build_request(self, http, *args, **kwargs):
+        # The service is shared between threads, so every request is bound to
+        # the calling thread's transport instead of the one used at build time
+        return HttpRequest(self._authorized_http(), *args, **kwargs)
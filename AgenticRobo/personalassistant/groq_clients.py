@@ -0,0 +1,149 @@
+"""
+Shared Groq client registry for RoboSynthesis.
+
+Creating a new ``Groq`` client per request opens a fresh HTTP connection pool
+and pays a TLS handshake before the first token. This module keeps one
+long-lived client per API key, backed by a keep-alive ``httpx`` connection
+pool, and hands it out to every Groq call site.
+
+Configuration (environment variables):
+- GROQ_POOL_MAX_CONNECTIONS: Maximum open connections per client (default: 20)
+- GROQ_POOL_MAX_KEEPALIVE: Maximum idle keep-alive connections (default: 10)
+- GROQ_POOL_KEEPALIVE_EXPIRY: Seconds an idle connection is kept (default: 60)
+- GROQ_TIMEOUT: Read/write timeout in seconds (default: 60)
+- GROQ_CONNECT_TIMEOUT: Connect timeout in seconds (default: 5)
+- GROQ_HTTP2: Enable HTTP/2 when the ``h2`` package is installed (default: false)
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import weakref
+import importlib.util
+
+import httpx
+from groq import AsyncGroq, Groq
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+GROQ_POOL_MAX_CONNECTIONS = int(os.getenv('GROQ_POOL_MAX_CONNECTIONS', 20))
+GROQ_POOL_MAX_KEEPALIVE = int(os.getenv('GROQ_POOL_MAX_KEEPALIVE', 10))
+GROQ_POOL_KEEPALIVE_EXPIRY = float(os.getenv('GROQ_POOL_KEEPALIVE_EXPIRY', 60))
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', 60))
+GROQ_CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', 5))
+GROQ_HTTP2 = os.getenv('GROQ_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+
+_lock = threading.Lock()
+_clients = {}
+# Async clients are bound to the event loop that created their connections
+_async_clients = weakref.WeakKeyDictionary()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _http2_enabled():
+    """Return True if HTTP/2 was requested and the h2 package is available"""
+    if not GROQ_HTTP2:
+        return False
+    if importlib.util.find_spec('h2') is None:
+        logger.warning("GROQ_HTTP2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _http_client_options():
+    """Build the shared httpx options for pooled Groq clients"""
+    return {
+        'limits': httpx.Limits(
+            max_connections=GROQ_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=GROQ_POOL_KEEPALIVE_EXPIRY
+        ),
+        'timeout': httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+        'http2': _http2_enabled()
+    }
+
+
+def get_groq_client(api_key=None):
+    """
+    Get the process-wide Groq client for an API key, creating it on first use.
+
+    Args:
+        api_key (str, optional): Groq API key (default: GROQ_API_KEY from the environment)
+
+    Returns:
+        Groq: A thread-safe Groq client sharing a keep-alive connection pool
+    """
+    if api_key is None:
+        api_key = os.getenv('GROQ_API_KEY')
+
+    client = _clients.get(api_key)
+    if client is not None:
+        with _lock:
+            _stats['hits'] += 1
+        return client
+
+    with _lock:
+        # Another thread may have created the client while we waited
+        client = _clients.get(api_key)
+        if client is not None:
+            _stats['hits'] += 1
+            return client
+
+        _stats['misses'] += 1
+        client = Groq(api_key=api_key, http_client=httpx.Client(**_http_client_options()))
+        _clients[api_key] = client
+        logger.info("Created pooled Groq client")
+        return client
+
+
+def get_async_groq_client(api_key=None):
+    """
+    Get the AsyncGroq client for an API key on the running event loop.
+
+    Async connection pools cannot be shared between event loops, so one client
+    is kept per loop and released when the loop is garbage collected.
+
+    Args:
+        api_key (str, optional): Groq API key (default: GROQ_API_KEY from the environment)
+
+    Returns:
+        AsyncGroq: An async Groq client sharing a keep-alive connection pool
+    """
+    if api_key is None:
+        api_key = os.getenv('GROQ_API_KEY')
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(api_key)
+        if client is not None:
+            _stats['hits'] += 1
+            return client
+
+        _stats['misses'] += 1
+        client = AsyncGroq(api_key=api_key, http_client=httpx.AsyncClient(**_http_client_options()))
+        loop_clients[api_key] = client
+        logger.info("Created pooled AsyncGroq client")
+        return client
+
+
+def get_pool_stats():
+    """
+    Get client pool hit/miss counters.
+
+    Returns:
+        dict: Hits, misses, hit ratio and number of pooled clients
+    """
+    with _lock:
+        hits = _stats['hits']
+        misses = _stats['misses']
+        clients = len(_clients) + sum(len(loop_clients) for loop_clients in _async_clients.values())
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+        'clients': clients
+    }
@@ -0,0 +1,173 @@
+"""
+Token-budgeted conversation history for Groq prompts.
+
+Instead of resending the whole conversation on every turn, only the most recent
+messages that fit in a token budget are sent. Older turns are folded into a
+running summary by a background worker, so the prompt size per turn stays flat
+however long the conversation gets.
+
+Configuration (environment variables):
+- HISTORY_TOKEN_BUDGET: Maximum tokens of history sent per turn (default: 6000)
+- HISTORY_SUMMARY_MODEL: Groq model used to summarize older turns
+  (default: 'llama-3.1-8b-instant')
+- HISTORY_SUMMARY_MAX_TOKENS: Maximum length of the running summary (default: 400)
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from .groq_clients import get_groq_client
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 6000))
+HISTORY_SUMMARY_MODEL = os.getenv('HISTORY_SUMMARY_MODEL', 'llama-3.1-8b-instant')
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv('HISTORY_SUMMARY_MAX_TOKENS', 400))
+
+# Approximate characters per token for Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+# Per-message formatting overhead (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Maximum number of session summaries kept in process
+MAX_SUMMARIES = 1000
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='history-summary')
+_lock = threading.Lock()
+# session_id -> {'covered': number of messages folded into the summary, 'text': summary}
+_summaries = OrderedDict()
+_pending = set()
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_message_tokens(message):
+    """
+    Count the tokens of a chat message, caching the result on the message.
+
+    The SQLite memory store also saves the count with each message row and
+    restores it on load, since it rebuilds message objects on every access.
+
+    Args:
+        message (BaseMessage): A LangChain chat message
+
+    Returns:
+        int: Estimated token count
+    """
+    cached = message.additional_kwargs.get('token_count')
+    if cached is not None:
+        return cached
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    count = estimate_tokens(content)
+    message.additional_kwargs['token_count'] = count
+    return count
+
+
+def get_summary(session_id):
+    """Get the running summary for a session as (covered_messages, text)"""
+    with _lock:
+        entry = _summaries.get(session_id)
+        if entry is None:
+            return 0, ''
+        _summaries.move_to_end(session_id)
+        return entry['covered'], entry['text']
+
+
+def window_history(session_id, messages, token_budget=HISTORY_TOKEN_BUDGET):
+    """
+    Select the history to send to the model for this turn.
+
+    The newest messages are kept until the token budget is used up. Messages
+    that fall out of the window are summarized in the background and the
+    summary is returned alongside the window.
+
+    Args:
+        session_id (str): The session ID
+        messages (list): The full conversation history, oldest first
+        token_budget (int): Maximum tokens of history (summary included)
+
+    Returns:
+        tuple: (summary text or '', list of messages in the window)
+    """
+    covered, summary = get_summary(session_id)
+    budget = token_budget - (estimate_tokens(summary) if summary else 0)
+
+    # Walk back from the newest message; always keep the current query
+    start = len(messages)
+    used = 0
+    while start > 0:
+        tokens = count_message_tokens(messages[start - 1])
+        if used + tokens > budget and start < len(messages):
+            break
+        used += tokens
+        start -= 1
+
+    # Fold newly dropped messages into the summary without blocking this turn
+    if start > covered:
+        schedule_summary(session_id, messages[covered:start], covered, start)
+
+    # A summary computed for an earlier, shorter history still describes the
+    # oldest messages, so it is used as is until the refresh completes
+    return summary, messages[start:]
+
+
+def schedule_summary(session_id, new_messages, covered, upto):
+    """Queue a background update of a session summary"""
+    with _lock:
+        if session_id in _pending:
+            return
+        _pending.add(session_id)
+    _summary_executor.submit(_update_summary, session_id, list(new_messages), covered, upto)
+
+
+def _update_summary(session_id, new_messages, covered, upto):
+    try:
+        _, previous = get_summary(session_id)
+
+        transcript = []
+        for msg in new_messages:
+            if isinstance(msg, HumanMessage):
+                transcript.append(f"User: {msg.content}")
+            elif isinstance(msg, AIMessage):
+                transcript.append(f"Assistant: {msg.content}")
+
+        prompt = (
+            f"Current summary of the conversation:\n{previous or '(none)'}\n\n"
+            f"New messages:\n" + "\n".join(transcript) + "\n\n"
+            "Update the summary so it also covers the new messages. Keep names, facts, "
+            "decisions and open questions. Reply with the summary only."
+        )
+
+        response = get_groq_client().chat.completions.create(
+            model=HISTORY_SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": "You maintain concise running summaries of conversations."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS
+        )
+        text = response.choices[0].message.content.strip()
+
+        with _lock:
+            entry = _summaries.get(session_id)
+            # Only advance; never replace a summary that already covers more
+            if entry is None or entry['covered'] == covered:
+                _summaries[session_id] = {'covered': upto, 'text': text}
+                _summaries.move_to_end(session_id)
+                while len(_summaries) > MAX_SUMMARIES:
+                    _summaries.popitem(last=False)
+        logger.info(f"Updated history summary for session {session_id} ({upto} messages covered)")
+    except Exception as e:
+        logger.error(f"Error updating history summary: {str(e)}")
+    finally:
+        with _lock:
+            _pending.discard(session_id)
@@ -0,0 +1,156 @@
+"""
+Image pre-processing for vision requests in RoboSynthesis.
+
+Phone photos and screenshots are often several megabytes and far larger than
+the resolution the vision model actually uses. Before an image is sent to
+Groq it is:
+- Decoded to detect its true format and MIME type
+- Rotated according to its EXIF orientation, then stripped of all metadata
+- Downscaled so its longest side fits the model's useful resolution
+- Re-encoded as JPEG at a quality target (transparent images are flattened)
+
+Configuration (environment variables):
+- VISION_MAX_SIDE: Longest image side sent to the vision model (default: 1120)
+- VISION_JPEG_QUALITY: JPEG quality used when re-encoding (default: 85)
+"""
+
+import io
+import os
+import logging
+import threading
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+VISION_MAX_SIDE = int(os.getenv('VISION_MAX_SIDE', 1120))
+VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', 85))
+
+# Formats the vision API accepts as they are
+PASSTHROUGH_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+# Leading bytes -> MIME type, for images PIL cannot decode
+IMAGE_SIGNATURES = [
+    (b'\x89PNG', 'image/png'),
+    (b'\xff\xd8', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+# Used when the type cannot be guessed (what was always sent before pre-processing)
+DEFAULT_MIME_TYPE = 'image/jpeg'
+
+_stats_lock = threading.Lock()
+_stats = {'images': 0, 'original_bytes': 0, 'bytes': 0}
+
+
+def _flatten(img):
+    """Convert an image to RGB, compositing any transparency onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def guess_mime_type(image_data):
+    """Guess an image's MIME type from its leading bytes"""
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if image_data.startswith(signature):
+            return mime_type
+    return DEFAULT_MIME_TYPE
+
+
+def _unprocessed(image_data):
+    """Result for an image sent as uploaded"""
+    mime_type = guess_mime_type(image_data)
+    return {
+        'data': image_data,
+        'mime_type': mime_type,
+        'original_mime_type': mime_type,
+        'width': None,
+        'height': None,
+        'original_bytes': len(image_data),
+        'bytes': len(image_data),
+        'bytes_saved': 0
+    }
+
+
+def preprocess_image(image_data, max_side=VISION_MAX_SIDE, quality=VISION_JPEG_QUALITY):
+    """
+    Shrink an image for a vision request.
+
+    Images PIL cannot decode (unusual variants, truncated files) are passed
+    through unchanged with a MIME type guessed from their leading bytes.
+
+    Args:
+        image_data (bytes): The uploaded image's bytes
+        max_side (int): Longest side of the output image
+        quality (int): JPEG quality for the re-encoded image
+
+    Returns:
+        dict: 'data' (bytes to send), 'mime_type', 'original_mime_type',
+              'width', 'height', 'original_bytes', 'bytes' and 'bytes_saved'
+    """
+    try:
+        return _preprocess(image_data, max_side, quality)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Could not pre-process image, sending it unchanged: {str(e)}")
+        return _unprocessed(image_data)
+
+
+def _preprocess(image_data, max_side, quality):
+    with Image.open(io.BytesIO(image_data)) as img:
+        original_format = img.format
+        original_mime_type = Image.MIME.get(original_format, 'application/octet-stream')
+        # Animated images only contribute their first frame
+        img.seek(0)
+        resized = max(img.size) > max_side
+
+        processed = ImageOps.exif_transpose(img)
+        processed = _flatten(processed)
+        if resized:
+            processed.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        # Saving without exif/info drops all metadata
+        output = io.BytesIO()
+        processed.save(output, format='JPEG', quality=quality, optimize=True)
+        data = output.getvalue()
+        mime_type = 'image/jpeg'
+        width, height = processed.size
+
+    # Small images (e.g. tiny PNG icons) can grow when re-encoded; keep those as they were
+    if not resized and len(data) >= len(image_data) and original_format in PASSTHROUGH_FORMATS:
+        data = image_data
+        mime_type = original_mime_type
+
+    result = {
+        'data': data,
+        'mime_type': mime_type,
+        'original_mime_type': original_mime_type,
+        'width': width,
+        'height': height,
+        'original_bytes': len(image_data),
+        'bytes': len(data),
+        'bytes_saved': len(image_data) - len(data)
+    }
+
+    with _stats_lock:
+        _stats['images'] += 1
+        _stats['original_bytes'] += result['original_bytes']
+        _stats['bytes'] += result['bytes']
+
+    logger.info(
+        f"Pre-processed {original_mime_type} image: {result['original_bytes']} -> {result['bytes']} bytes "
+        f"({result['bytes_saved']} saved, {width}x{height})"
+    )
+    return result
+
+
+def get_image_preprocessing_stats():
+    """Get the total number of images pre-processed and bytes saved"""
+    with _stats_lock:
+        return {**_stats, 'bytes_saved': _stats['original_bytes'] - _stats['bytes']}
@@ -0,0 +1,194 @@
+"""
+Background ingestion of subject context files for RoboSynthesis.
+
+Extracting the text of a large textbook can take far longer than an HTTP
+request should. Uploads are stored and hashed in the request, then extracted
+and indexed by a local worker pool while the tutor page polls the job's status.
+
+Re-uploading a file whose content was already ingested (same SHA-256) for the
+same subject does no work and completes immediately.
+
+Jobs left queued or running by a restarted or crashed worker are marked failed
+once they stop making progress, so the file can be uploaded again.
+
+Configuration (environment variables):
+- INGESTION_WORKERS: Number of background ingestion threads (default: 2)
+- INGESTION_STALE_SECONDS: Seconds without progress before a queued or running
+  job is considered dead (default: 1800)
+"""
+
+import os
+import time
+import hashlib
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import SubjectContext, IngestionJob
+from .extraction import extract_text, ExtractionError
+from .retrieval import index_context
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))
+INGESTION_STALE_SECONDS = int(os.getenv('INGESTION_STALE_SECONDS', 30 * 60))
+
+_executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix='ingestion')
+
+
+def hash_upload(uploaded_file):
+    """Compute the SHA-256 of an uploaded file without loading it all at once"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def fail_stale_jobs(**filters):
+    """
+    Mark queued or running jobs that stopped making progress as failed.
+
+    Args:
+        **filters: Extra IngestionJob filters limiting which jobs are checked
+
+    Returns:
+        int: Number of jobs marked failed
+    """
+    now = timezone.now()
+    stale = IngestionJob.objects.filter(
+        status__in=['queued', 'running'],
+        updated_at__lt=now - timedelta(seconds=INGESTION_STALE_SECONDS),
+        **filters
+    ).update(
+        status='failed', stage='Failed', error='Ingestion was interrupted; please upload the file again',
+        finished_at=now, updated_at=now
+    )
+    if stale:
+        logger.warning(f"Marked {stale} stale ingestion jobs as failed")
+    return stale
+
+
+def submit_context_file(user, subject, uploaded_file):
+    """
+    Store an uploaded context file and queue it for ingestion.
+
+    Args:
+        user (User): The uploading user
+        subject (str): Subject the context belongs to
+        uploaded_file (UploadedFile): The uploaded PDF, DOCX or TXT file
+
+    Returns:
+        IngestionJob: The queued job, or an already completed/in-flight job
+                      for the same file content
+    """
+    file_hash = hash_upload(uploaded_file)
+    subject_context, created = SubjectContext.objects.defer('context_text').get_or_create(user=user, subject=subject)
+    # A job orphaned by a worker restart must not be reused
+    fail_stale_jobs(subject_context=subject_context)
+
+    # The same content is already ingested, or on its way from the current file
+    existing = IngestionJob.objects.filter(
+        subject_context=subject_context,
+        file_hash=file_hash,
+        status__in=['queued', 'running', 'completed']
+    ).first()
+    if existing:
+        if existing.status == 'completed':
+            reusable = subject_context.content_hash == file_hash
+        else:
+            reusable = subject_context.context_file.name == existing.file_name
+        if reusable:
+            logger.info(f"Reusing ingestion job {existing.id} for unchanged context file")
+            return existing
+
+    # Replace the stored file, keeping the current text until the new one is extracted
+    file_ext = uploaded_file.name.split('.')[-1].lower()
+    if subject_context.context_file:
+        subject_context.context_file.delete(save=False)
+    subject_context.file_type = file_ext
+    timestamp = int(time.time())
+    subject_context.context_file.save(
+        f"{user.username}_{subject}_{timestamp}.{file_ext}",
+        uploaded_file,
+        save=False
+    )
+    subject_context.save(update_fields=['context_file', 'file_type', 'updated_at'])
+
+    job = IngestionJob.objects.create(
+        user=user,
+        subject_context=subject_context,
+        file_name=subject_context.context_file.name,
+        file_hash=file_hash,
+        stage='Queued'
+    )
+    _executor.submit(_run_job, job.id)
+    logger.info(f"Queued ingestion job {job.id} for {job.file_name}")
+    return job
+
+
+def _update_job(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=list(fields) + ['updated_at'])
+
+
+def _run_job(job_id):
+    """Extract and store the text of a queued context file"""
+    close_old_connections()
+    try:
+        job = IngestionJob.objects.select_related('subject_context').defer('subject_context__context_text').get(id=job_id)
+        if job.status != 'queued':
+            # Marked failed as stale while it waited for a worker
+            return
+        subject_context = job.subject_context
+        _update_job(job, status='running', progress=10, stage='Extracting text')
+
+        start = time.perf_counter()
+        # Storage files on local disk name their path, so PDF workers open the file themselves
+        with subject_context.context_file.storage.open(job.file_name, 'rb') as context_file:
+            extracted_text = extract_text(context_file, file_name=job.file_name, owner=job.user_id)
+        if not extracted_text or not extracted_text.strip():
+            raise ExtractionError(f"No text found in the {subject_context.file_type.upper()} file")
+
+        _update_job(job, progress=90, stage='Saving')
+        subject_context.refresh_from_db(fields=['context_file'])
+        if subject_context.context_file.name != job.file_name:
+            # A newer upload replaced this file while it was being extracted
+            _update_job(job, status='failed', stage='Superseded', error='Superseded by a newer upload', finished_at=timezone.now())
+            return
+
+        subject_context.context_text = extracted_text
+        subject_context.content_hash = job.file_hash
+        subject_context.save(update_fields=['context_text', 'content_hash', 'updated_at'])
+
+        _update_job(job, progress=95, stage='Indexing')
+        index_context(subject_context, extracted_text)
+
+        _update_job(job, status='completed', progress=100, stage='Completed', finished_at=timezone.now())
+        logger.info(f"Ingestion job {job_id} completed in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+        IngestionJob.objects.filter(id=job_id).update(
+            status='failed', stage='Failed', error=str(e), finished_at=timezone.now(), updated_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def get_job(job_id, user):
+    """
+    Get a user's ingestion job.
+
+    Jobs that stopped making progress are reported as failed, so clients
+    polling them stop.
+
+    Returns:
+        IngestionJob or None: The job, if it exists and belongs to the user
+    """
+    fail_stale_jobs(id=job_id, user=user)
+    return IngestionJob.objects.filter(id=job_id, user=user).first()
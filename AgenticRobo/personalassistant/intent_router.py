@@ -0,0 +1,141 @@
+"""
+Intent routing for chat messages.
+
+The cheap keyword-based email detector runs inline; the identity (LLM) and
+Google Drive detectors run concurrently on a pool created for the request, so
+one request's slow detectors never queue behind another's. Routing stops as
+soon as the highest-priority positive intent is known.
+
+The identity detector only calls the LLM once its own keyword gate matches
+("my name is", ...), and is then waited for without a deadline (the Groq
+client's timeout still applies), so an identity update is never dropped
+because the LLM was slow. The Drive detector has a deadline, so a plain chat
+message never waits on a slow Drive lookup.
+
+Configuration (environment variables):
+- INTENT_DEADLINE_DRIVE: Seconds to wait for Drive detection (default: 1.0)
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .user_identity import detect_identity_update_intent
+from .gmail_utils import detect_email_intent
+from .drive_handler import detect_drive_intent
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Pooled detectors missing from here are waited for until they finish
+INTENT_DEADLINES = {
+    'drive': float(os.getenv('INTENT_DEADLINE_DRIVE', 1.0))
+}
+
+def _is_identity_update(result):
+    return bool(result and result['is_identity_update'])
+
+
+def _is_email_request(result):
+    return bool(result and result['is_email_request'])
+
+
+def _is_drive_request(result):
+    return bool(result and result[0] and result[1])
+
+
+# Detectors in priority order: (name, detector, is_positive, negative result, pooled)
+# Keyword-only detectors are not pooled; they run inline before the others are awaited
+DETECTORS = [
+    ('identity', detect_identity_update_intent, _is_identity_update, None, True),
+    ('email', detect_email_intent, _is_email_request, None, False),
+    ('drive', detect_drive_intent, _is_drive_request, (False, None, {}), True)
+]
+
+
+def _timed(detector, query):
+    start = time.perf_counter()
+    result = detector(query)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def route_intent(query, deadlines=None):
+    """
+    Run all intent detectors and pick the winning intent.
+
+    Keyword detectors run inline; the others run concurrently on threads
+    started for this request, so their deadlines are not spent queueing.
+    Detectors are resolved in priority order (identity, email, drive). A
+    detector that misses its deadline (if it has one) or fails counts as
+    negative. Once a
+    detector is positive, lower-priority detectors are not waited for (they
+    finish in the background and their results are discarded).
+
+    Args:
+        query (str): The user's query
+        deadlines (dict, optional): Per-detector deadlines in seconds (None to
+                                    wait for the detector to finish)
+
+    Returns:
+        dict: The winning 'intent' name (or None), each detector's 'results',
+              and per-detector 'timings' with duration and status
+    """
+    deadlines = {**INTENT_DEADLINES, **(deadlines or {})}
+    start = time.perf_counter()
+
+    pooled = [(name, detector) for name, detector, _, _, is_pooled in DETECTORS if is_pooled]
+    # A pool per request: every detector starts right away instead of queueing
+    executor = ThreadPoolExecutor(max_workers=len(pooled), thread_name_prefix='intent')
+    try:
+        futures = {name: executor.submit(_timed, detector, query) for name, detector in pooled}
+    finally:
+        # Don't block on detectors that overrun; their threads exit when they finish
+        executor.shutdown(wait=False)
+
+    inline = {}
+    for name, detector, _, negative, is_pooled in DETECTORS:
+        if is_pooled:
+            continue
+        try:
+            inline[name] = (*_timed(detector, query), 'ok')
+        except Exception as e:
+            inline[name] = (negative, None, 'error')
+            logger.error(f"Intent detector '{name}' failed: {str(e)}")
+
+    route = {'intent': None, 'results': {}, 'timings': {}}
+
+    for name, _, is_positive, negative, is_pooled in DETECTORS:
+        if route['intent'] is not None:
+            # A higher-priority intent already won; don't wait for this one
+            if is_pooled:
+                futures[name].cancel()
+            route['results'][name] = negative
+            route['timings'][name] = {'ms': None, 'status': 'skipped'}
+            continue
+
+        if not is_pooled:
+            result, elapsed_ms, status = inline[name]
+            route['timings'][name] = {'ms': round(elapsed_ms, 2) if elapsed_ms is not None else None, 'status': status}
+        else:
+            deadline = deadlines.get(name)
+            remaining = None if deadline is None else max(deadline - (time.perf_counter() - start), 0)
+            try:
+                result, elapsed_ms = futures[name].result(timeout=remaining)
+                route['timings'][name] = {'ms': round(elapsed_ms, 2), 'status': 'ok'}
+            except FutureTimeoutError:
+                result = negative
+                route['timings'][name] = {'ms': round(deadline * 1000, 2), 'status': 'timeout'}
+                logger.warning(f"Intent detector '{name}' missed its {deadline}s deadline")
+            except Exception as e:
+                result = negative
+                route['timings'][name] = {'ms': None, 'status': 'error'}
+                logger.error(f"Intent detector '{name}' failed: {str(e)}")
+
+        route['results'][name] = result
+        if is_positive(result):
+            route['intent'] = name
+
+    route['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    logger.info(f"Intent routing: {route['intent']} in {route['total_ms']}ms, timings: {route['timings']}")
+    return route
@@ -0,0 +1,371 @@
+"""
+Conversation memory stores for RoboSynthesis.
+
+Conversation memories used to live in an unbounded module-level dict that was
+never evicted and could not be shared between worker processes. This module
+provides two interchangeable stores:
+- LocalMemoryStore: In-process LRU store with TTL expiry and a byte budget
+- SQLiteMemoryStore: Shared store backed by a SQLite file, so any worker
+  process can serve any session
+
+Configuration (environment variables):
+- CONVERSATION_MEMORY_BACKEND: 'local' or 'sqlite' (default: 'local')
+- CONVERSATION_MEMORY_MAX_SESSIONS: Maximum sessions kept in process (default: 1000)
+- CONVERSATION_MEMORY_MAX_BYTES: Approximate per-process byte budget (default: 64 MB)
+- CONVERSATION_MEMORY_TTL: Seconds of inactivity before a session expires (default: 86400)
+- CONVERSATION_MEMORY_SQLITE_PATH: SQLite file for the shared backend
+  (default: 'conversation_memory.sqlite3')
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import messages_from_dict, message_to_dict
+
+from .history_window import count_message_tokens
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CONVERSATION_MEMORY_BACKEND = os.getenv('CONVERSATION_MEMORY_BACKEND', 'local').lower()
+CONVERSATION_MEMORY_MAX_SESSIONS = int(os.getenv('CONVERSATION_MEMORY_MAX_SESSIONS', 1000))
+CONVERSATION_MEMORY_MAX_BYTES = int(os.getenv('CONVERSATION_MEMORY_MAX_BYTES', 64 * 1024 * 1024))
+CONVERSATION_MEMORY_TTL = float(os.getenv('CONVERSATION_MEMORY_TTL', 24 * 60 * 60))
+CONVERSATION_MEMORY_SQLITE_PATH = os.getenv('CONVERSATION_MEMORY_SQLITE_PATH', 'conversation_memory.sqlite3')
+
+# Rough fixed cost of a message object on top of its text
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+def estimate_message_bytes(message):
+    """Approximate the in-process size of a chat message in bytes"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content) + MESSAGE_OVERHEAD_BYTES
+
+
+class LocalChatMessageHistory(BaseChatMessageHistory):
+    """In-process chat message history that reports its size to a LocalMemoryStore"""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+        self.messages = []
+        self.size_bytes = 0
+
+    def add_message(self, message):
+        self.messages.append(message)
+        self.size_bytes += estimate_message_bytes(message)
+        self.store._resize(self)
+
+    def clear(self):
+        self.messages = []
+        self.size_bytes = 0
+        self.store._resize(self)
+
+
+class LocalMemoryStore:
+    """
+    In-process conversation memory store with LRU + TTL eviction.
+
+    Sessions are evicted least-recently-used first when the number of sessions
+    or the approximate byte budget is exceeded, and dropped once they have been
+    idle for longer than the TTL. Each session's history reports its size as
+    messages are added, so a reply counts against the budget right away.
+    """
+
+    def __init__(self, max_sessions=CONVERSATION_MEMORY_MAX_SESSIONS,
+                 max_bytes=CONVERSATION_MEMORY_MAX_BYTES, ttl=CONVERSATION_MEMORY_TTL):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # session_id -> [memory, last_access, size_bytes], oldest access first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._evictions = 0
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def get(self, session_id):
+        """Get the memory for a session, or None if it does not exist or expired"""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._touch(session_id, entry)
+            self._enforce_budget(keep=session_id)
+            return entry[0]
+
+    def get_or_create(self, session_id):
+        """Get the memory for a session, creating an empty one if needed"""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                memory = ConversationBufferMemory(
+                    chat_memory=LocalChatMessageHistory(self, session_id),
+                    return_messages=True
+                )
+                entry = [memory, time.time(), 0]
+                self._entries[session_id] = entry
+            self._touch(session_id, entry)
+            self._enforce_budget(keep=session_id)
+            return entry[0]
+
+    def pop(self, session_id):
+        """Remove a session and return its memory, or None"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry[2]
+            return entry[0]
+
+    def stats(self):
+        """Get store size and eviction counters"""
+        with self._lock:
+            return {
+                'backend': 'local',
+                'sessions': len(self._entries),
+                'bytes': self._total_bytes,
+                'evictions': self._evictions
+            }
+
+    def _touch(self, session_id, entry):
+        entry[1] = time.time()
+        self._entries.move_to_end(session_id)
+
+    def _resize(self, history):
+        """Record the new size of a session's history after it changed"""
+        with self._lock:
+            entry = self._entries.get(history.session_id)
+            # Ignore histories of sessions that were evicted or popped meanwhile
+            if entry is None or entry[0].chat_memory is not history:
+                return
+            self._total_bytes += history.size_bytes - entry[2]
+            entry[2] = history.size_bytes
+            self._enforce_budget(keep=history.session_id)
+
+    def _evict_oldest(self):
+        session_id, entry = self._entries.popitem(last=False)
+        self._total_bytes -= entry[2]
+        self._evictions += 1
+        logger.info(f"Evicted conversation memory for session {session_id}")
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry[1] >= cutoff:
+                break
+            self._evict_oldest()
+
+    def _enforce_budget(self, keep):
+        while self._entries and (len(self._entries) > self.max_sessions or self._total_bytes > self.max_bytes):
+            # Never evict the session that is currently being served
+            if next(iter(self._entries)) == keep:
+                break
+            self._evict_oldest()
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """Chat message history that reads and writes through to a SQLiteMemoryStore"""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self):
+        return self.store._load_messages(self.session_id)
+
+    def add_message(self, message):
+        self.store._append_message(self.session_id, message)
+
+    def clear(self):
+        self.store._clear_messages(self.session_id)
+
+
+class SQLiteMemoryStore:
+    """
+    Conversation memory store shared between worker processes through SQLite.
+
+    Messages are written through on every add, so a session can continue on
+    any worker. Sessions idle for longer than the TTL are purged periodically.
+    """
+
+    # Minimum seconds between purges of expired sessions
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path=CONVERSATION_MEMORY_SQLITE_PATH, ttl=CONVERSATION_MEMORY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._init_schema()
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def get(self, session_id):
+        """Get the memory for a session, or None if it does not exist or expired"""
+        self._purge_expired()
+        row = self._connection().execute(
+            "SELECT 1 FROM conversation_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch(session_id)
+        return self._memory(session_id)
+
+    def get_or_create(self, session_id):
+        """Get the memory for a session, creating an empty one if needed"""
+        self._purge_expired()
+        self._touch(session_id)
+        return self._memory(session_id)
+
+    def pop(self, session_id):
+        """Remove a session and return its final memory, or None"""
+        memory = self.get(session_id)
+        if memory is None:
+            return None
+        messages = memory.chat_memory.messages
+        self._clear_messages(session_id, drop_session=True)
+        detached = ConversationBufferMemory(return_messages=True)
+        detached.chat_memory.add_messages(messages)
+        return detached
+
+    def stats(self):
+        """Get store size counters"""
+        conn = self._connection()
+        sessions = conn.execute("SELECT COUNT(*) FROM conversation_sessions").fetchone()[0]
+        messages = conn.execute("SELECT COUNT(*) FROM conversation_messages").fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'sessions': sessions,
+            'messages': messages
+        }
+
+    def _memory(self, session_id):
+        return ConversationBufferMemory(
+            chat_memory=SQLiteChatMessageHistory(self, session_id),
+            return_messages=True
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_sessions ("
+            "session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL, "
+            "token_count INTEGER)"
+        )
+        # Databases created before token counts were stored lack the column
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(conversation_messages)")]
+        if 'token_count' not in columns:
+            conn.execute("ALTER TABLE conversation_messages ADD COLUMN token_count INTEGER")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_messages_session "
+            "ON conversation_messages (session_id, id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_sessions_last_access "
+            "ON conversation_sessions (last_access)"
+        )
+
+    def _touch(self, session_id):
+        self._connection().execute(
+            "INSERT INTO conversation_sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time())
+        )
+
+    def _load_messages(self, session_id):
+        rows = self._connection().execute(
+            "SELECT message, token_count FROM conversation_messages WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        ).fetchall()
+        messages = messages_from_dict([json.loads(row[0]) for row in rows])
+        # Messages are rebuilt on every load; restore the stored counts so history
+        # windowing does not re-tokenize the whole conversation each turn
+        for message, (_, token_count) in zip(messages, rows):
+            if token_count is not None:
+                message.additional_kwargs['token_count'] = token_count
+        return messages
+
+    def _append_message(self, session_id, message):
+        data = message_to_dict(message)
+        data['data'].get('additional_kwargs', {}).pop('token_count', None)
+        self._connection().execute(
+            "INSERT INTO conversation_messages (session_id, message, token_count) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data), count_message_tokens(message))
+        )
+
+    def _clear_messages(self, session_id, drop_session=False):
+        conn = self._connection()
+        conn.execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+        if drop_session:
+            conn.execute("DELETE FROM conversation_sessions WHERE session_id = ?", (session_id,))
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        cutoff = now - self.ttl
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM conversation_messages WHERE session_id IN "
+                "(SELECT session_id FROM conversation_sessions WHERE last_access < ?)",
+                (cutoff,)
+            )
+            deleted = conn.execute(
+                "DELETE FROM conversation_sessions WHERE last_access < ?", (cutoff,)
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if deleted:
+            logger.info(f"Purged {deleted} expired conversation sessions")
+
+
+def get_memory_store(backend=CONVERSATION_MEMORY_BACKEND):
+    """
+    Create the conversation memory store selected by configuration.
+
+    Args:
+        backend (str): 'local' for the in-process store or 'sqlite' for the shared store
+
+    Returns:
+        LocalMemoryStore or SQLiteMemoryStore: The memory store
+    """
+    if backend == 'sqlite':
+        logger.info(f"Using SQLite conversation memory store at {CONVERSATION_MEMORY_SQLITE_PATH}")
+        return SQLiteMemoryStore()
+    if backend != 'local':
+        logger.warning(f"Unknown conversation memory backend '{backend}', using local store")
+    return LocalMemoryStore()
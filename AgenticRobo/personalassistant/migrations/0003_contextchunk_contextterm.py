@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personalassistant', '0002_subjectcontext_content_hash_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subjectcontext',
+            name='avg_chunk_length',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subjectcontext',
+            name='chunk_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ContextChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('length', models.PositiveIntegerField()),
+                ('subject_context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='personalassistant.subjectcontext')),
+            ],
+            options={
+                'ordering': ['position'],
+                'indexes': [models.Index(fields=['subject_context', 'position'], name='personalass_subject_84c00c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContextTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField()),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='personalassistant.contextchunk')),
+                ('subject_context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='personalassistant.subjectcontext')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject_context', 'term'], name='personalass_subject_f2e583_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personalassistant', '0003_contextchunk_contextterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
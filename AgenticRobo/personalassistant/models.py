@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -18,6 +20,9 @@ class SubjectContext(models.Model):
     context_text = models.TextField(blank=True, null=True)
     context_file = models.FileField(upload_to='subject_contexts/', blank=True, null=True)
     file_type = models.CharField(max_length=10, blank=True, null=True)  # pdf, docx, txt
+    content_hash = models.CharField(max_length=64, blank=True, null=True)  # SHA-256 of the ingested file
+    chunk_count = models.PositiveIntegerField(default=0)  # Number of indexed chunks
+    avg_chunk_length = models.FloatField(default=0)  # Average index terms per chunk
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -27,3 +32,62 @@ class SubjectContext(models.Model):
     
     def __str__(self):
         return f"{self.user.username}'s {self.get_subject_display()} Context"
+
+
+class ContextChunk(models.Model):
+    """Model to store one retrievable passage of a subject context"""
+    subject_context = models.ForeignKey(SubjectContext, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField()  # Order within the document
+    text = models.TextField()
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 of the text
+    length = models.PositiveIntegerField()  # Number of index terms
+    
+    class Meta:
+        ordering = ['position']
+        indexes = [models.Index(fields=['subject_context', 'position'])]
+    
+    def __str__(self):
+        return f"Chunk {self.position} of {self.subject_context}"
+
+
+class ContextTerm(models.Model):
+    """Model to store a term posting: how often a term occurs in a context chunk"""
+    subject_context = models.ForeignKey(SubjectContext, on_delete=models.CASCADE, related_name='terms')
+    chunk = models.ForeignKey(ContextChunk, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=64)
+    frequency = models.PositiveIntegerField()
+    
+    class Meta:
+        indexes = [models.Index(fields=['subject_context', 'term'])]
+    
+    def __str__(self):
+        return f"{self.term} x{self.frequency} in chunk {self.chunk_id}"
+
+
+class IngestionJob(models.Model):
+    """Model to track background ingestion of an uploaded subject context file"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    subject_context = models.ForeignKey(SubjectContext, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    file_name = models.CharField(max_length=255)  # Stored name of the uploaded file
+    file_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the uploaded file
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # Percent complete
+    stage = models.CharField(max_length=50, blank=True, default='')
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Ingestion of {self.file_name} ({self.status})"
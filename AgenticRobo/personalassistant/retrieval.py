@@ -0,0 +1,254 @@
+"""
+Passage retrieval over subject contexts for RoboSynthesis.
+
+Rather than sending a whole uploaded document to Groq on every tutor turn, the
+context is split into chunks at ingestion time and its term postings are
+stored in the database. Each question is ranked with BM25 using indexed
+lookups of its own terms, and only the few best passages are sent, so prompt
+size per turn stays roughly constant however large the document is.
+
+Configuration (environment variables):
+- CONTEXT_CHUNK_CHARS: Target maximum characters per chunk (default: 1000)
+- CONTEXT_TOP_K: Passages injected per question (default: 4)
+"""
+
+import os
+import re
+import math
+import zlib
+import heapq
+import hashlib
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import SubjectContext, ContextChunk, ContextTerm
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CONTEXT_CHUNK_CHARS = int(os.getenv('CONTEXT_CHUNK_CHARS', 1000))
+CONTEXT_TOP_K = int(os.getenv('CONTEXT_TOP_K', 4))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Rows written per INSERT when indexing
+BULK_BATCH_SIZE = 1000
+
+# On average one sentence in this many ends a chunk
+CHUNK_BOUNDARY_DIVISOR = 5
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its
+me my no not of on or so that the their them then there these they this to was
+we what when where which who why will with you your
+""".split())
+
+_TOKEN_RE = re.compile(r'\w+')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _split_units(paragraph, max_chars):
+    """Split a paragraph into sentences, hard-splitting any longer than max_chars at word boundaries"""
+    units = []
+    for sentence in _SENTENCE_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            units.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            units.append(sentence)
+    return units
+
+
+def _is_cut_point(unit):
+    """Content-defined boundary test: depends only on the unit's own text"""
+    return zlib.crc32(unit.encode('utf-8')) % CHUNK_BOUNDARY_DIVISOR == 0
+
+
+def chunk_text(text, max_chars=CONTEXT_CHUNK_CHARS):
+    """
+    Split a document into content-defined passages of at most max_chars characters.
+
+    Chunk boundaries fall after sentences whose own hash marks them as cut
+    points (or at paragraph ends), once a chunk has at least a quarter of
+    max_chars. Because boundaries depend on local content rather than on
+    offsets, editing one part of a document only changes the chunks around
+    the edit; the rest come out identical and can be reused when re-indexing.
+
+    Returns:
+        list: The chunk strings, in document order
+    """
+    min_chars = max_chars // 4
+    chunks = []
+    current = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            chunks.append(" ".join(current))
+        current = []
+        size = 0
+
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        for unit in _split_units(paragraph, max_chars):
+            if current and size + 1 + len(unit) > max_chars:
+                flush()
+            current.append(unit)
+            size += len(unit) + 1
+            if size >= min_chars and _is_cut_point(unit):
+                flush()
+        if size >= min_chars:
+            flush()
+    flush()
+    return chunks
+
+
+def chunk_hash(chunk):
+    """Identify a chunk by its content"""
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+def bm25_weight(tf, df, length, avg_length, total):
+    """BM25 contribution of one query term to one chunk's score"""
+    idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+    return idf * tf * (BM25_K1 + 1) / norm
+
+
+def index_context(subject_context, text):
+    """
+    Chunk a subject context's text and update its stored chunks and term postings.
+
+    Chunks whose content hash is already stored for the context are reused
+    as they are (only their position is updated); only new chunks are
+    tokenized and get postings, and chunks no longer present are deleted.
+
+    Args:
+        subject_context (SubjectContext): The context to index
+        text (str): The context's full text
+
+    Returns:
+        dict: Counts of 'reused', 'added' and 'removed' chunks
+    """
+    chunks = chunk_text(text or '')
+
+    with transaction.atomic():
+        # content hash -> stored chunks with that content
+        existing = defaultdict(list)
+        for chunk in ContextChunk.objects.filter(subject_context=subject_context).only('id', 'position', 'content_hash', 'length'):
+            existing[chunk.content_hash].append(chunk)
+
+        reused = []
+        new_chunks = []
+        lengths = []
+        new_counts = []
+        for position, text_chunk in enumerate(chunks):
+            digest = chunk_hash(text_chunk)
+            if existing.get(digest):
+                stored = existing[digest].pop()
+                if stored.position != position:
+                    stored.position = position
+                    reused.append(stored)
+                lengths.append(stored.length)
+                continue
+            counts = Counter(t[:64] for t in tokenize(text_chunk))
+            length = sum(counts.values())
+            new_chunks.append(ContextChunk(
+                subject_context=subject_context, position=position,
+                text=text_chunk, content_hash=digest, length=length
+            ))
+            new_counts.append(counts)
+            lengths.append(length)
+
+        stale_ids = [chunk.id for group in existing.values() for chunk in group]
+        ContextChunk.objects.filter(id__in=stale_ids).delete()
+        ContextChunk.objects.bulk_update(reused, ['position'], batch_size=BULK_BATCH_SIZE)
+        stored = ContextChunk.objects.bulk_create(new_chunks, batch_size=BULK_BATCH_SIZE)
+        ContextTerm.objects.bulk_create([
+            ContextTerm(subject_context=subject_context, chunk=chunk, term=term, frequency=tf)
+            for chunk, counts in zip(stored, new_counts)
+            for term, tf in counts.items()
+        ], batch_size=BULK_BATCH_SIZE)
+        SubjectContext.objects.filter(id=subject_context.id).update(
+            chunk_count=len(chunks),
+            avg_chunk_length=(sum(lengths) / len(lengths)) if lengths else 0
+        )
+
+    result = {'reused': len(chunks) - len(new_chunks), 'added': len(new_chunks), 'removed': len(stale_ids)}
+    logger.info(f"Indexed subject context {subject_context.id}: {result}")
+    return result
+
+
+def retrieve_passages(user, subject, query, k=CONTEXT_TOP_K):
+    """
+    Find the passages of a user's subject context that best match a question.
+
+    Only the postings of the question's terms and the winning chunks are read;
+    the full context text is never loaded. If no passage shares a term with
+    the question (e.g. "summarize this"), the opening passages are returned.
+
+    Returns:
+        list: Up to k passage strings, best match first
+    """
+    meta = SubjectContext.objects.filter(user=user, subject=subject).values(
+        'id', 'chunk_count', 'avg_chunk_length'
+    ).first()
+    if meta is None:
+        return []
+    if not meta['chunk_count']:
+        # Contexts saved before chunk indexing existed are indexed on first use
+        legacy = SubjectContext.objects.filter(id=meta['id']).exclude(context_text__isnull=True).exclude(context_text='').first()
+        if legacy is None:
+            return []
+        index_context(legacy, legacy.context_text)
+        meta = SubjectContext.objects.filter(id=meta['id']).values('id', 'chunk_count', 'avg_chunk_length').first()
+        # Text with no chunkable content (e.g. only whitespace) has nothing to retrieve
+        if meta is None or not meta['chunk_count']:
+            return []
+
+    terms = set(t[:64] for t in tokenize(query))
+    postings = ContextTerm.objects.filter(subject_context_id=meta['id'], term__in=terms).values_list(
+        'term', 'chunk_id', 'frequency', 'chunk__length'
+    )
+
+    by_term = defaultdict(list)
+    for term, chunk_id, tf, length in postings:
+        by_term[term].append((chunk_id, tf, length))
+
+    scores = defaultdict(float)
+    avg_length = meta['avg_chunk_length'] or 1.0
+    for term_postings in by_term.values():
+        df = len(term_postings)
+        for chunk_id, tf, length in term_postings:
+            scores[chunk_id] += bm25_weight(tf, df, length, avg_length, meta['chunk_count'])
+
+    chunks = ContextChunk.objects.filter(subject_context_id=meta['id'])
+    if scores:
+        best = [chunk_id for chunk_id, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+        texts = dict(chunks.filter(id__in=best).values_list('id', 'text'))
+        return [texts[chunk_id] for chunk_id in best]
+    return list(chunks.order_by('position').values_list('text', flat=True)[:k])
+
+
+def format_passages(passages, subject):
+    """Format retrieved passages as a system prompt section"""
+    numbered = "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages, 1))
+    return (
+        f"Relevant passages from the user's {subject} material:\n\n{numbered}\n\n"
+        f"Please use this context to help answer questions about {subject}."
+    )
@@ -0,0 +1,250 @@
+"""
+Streaming spreadsheet reader for RoboSynthesis.
+
+Loading a whole workbook into a DataFrame and converting it to a list of
+record dicts costs several times the size of the sheet, while a chat reply
+only ever shows a handful of rows. This reader streams rows from .xlsx files
+with openpyxl in read-only mode, keeping only the requested sheet and columns,
+a preview of the first rows and running per-column statistics.
+
+For ingesting whole sheets, iter_row_batches() streams all rows as bounded
+DataFrame batches.
+
+Legacy .xls workbooks are not zip-based and fall back to pandas.
+"""
+
+import logging
+from datetime import date, datetime
+
+import openpyxl
+import pandas as pd
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of rows kept for the preview by default
+DEFAULT_PREVIEW_ROWS = 10
+
+
+class ColumnStats:
+    """Running statistics for one spreadsheet column"""
+
+    __slots__ = ('non_null', 'numeric', 'minimum', 'maximum', 'total', 'types')
+
+    def __init__(self):
+        self.non_null = 0
+        self.numeric = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0
+        self.types = set()
+
+    def add(self, value):
+        if value is None or value == '':
+            return
+        self.non_null += 1
+        if isinstance(value, bool):
+            self.types.add('boolean')
+        elif isinstance(value, (int, float)):
+            self.types.add('number')
+            self.numeric += 1
+            self.total += value
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        elif isinstance(value, (datetime, date)):
+            self.types.add('date')
+        else:
+            self.types.add('text')
+
+    def to_dict(self, total_rows):
+        if not self.types:
+            column_type = 'empty'
+        elif len(self.types) == 1:
+            column_type = next(iter(self.types))
+        else:
+            column_type = 'mixed'
+
+        stats = {
+            'type': column_type,
+            'non_null': self.non_null,
+            'nulls': total_rows - self.non_null
+        }
+        if self.numeric:
+            stats['min'] = self.minimum
+            stats['max'] = self.maximum
+            stats['mean'] = self.total / self.numeric
+        return stats
+
+
+def _header_names(header_row):
+    # Match pandas' naming for blank header cells and repeated names ("Total", "Total.1")
+    names = []
+    seen = set()
+    for idx, value in enumerate(header_row):
+        name = str(value) if value is not None else f"Unnamed: {idx}"
+        candidate = name
+        suffix = 1
+        while candidate in seen:
+            candidate = f"{name}.{suffix}"
+            suffix += 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def _select_columns(headers, columns):
+    if not columns:
+        return list(range(len(headers)))
+    wanted = {str(c).lower() for c in columns}
+    return [idx for idx, name in enumerate(headers) if name.lower() in wanted]
+
+
+def _read_xlsx(stream, sheet, columns, preview_rows):
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheets = workbook.sheetnames
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+
+        rows = worksheet.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return {'sheet': worksheet.title, 'sheets': sheets, 'columns': [], 'rows': [], 'total_rows': 0, 'stats': {}}
+
+        headers = _header_names(header_row)
+        selected = _select_columns(headers, columns)
+        names = [headers[idx] for idx in selected]
+        stats = [ColumnStats() for _ in selected]
+        preview = []
+        total_rows = 0
+
+        for row in rows:
+            values = [row[idx] if idx < len(row) else None for idx in selected]
+            # Read-only sheets often report trailing blank rows
+            if all(value is None for value in values):
+                continue
+            total_rows += 1
+            for column_stats, value in zip(stats, values):
+                column_stats.add(value)
+            if len(preview) < preview_rows:
+                preview.append(dict(zip(names, values)))
+
+        return {
+            'sheet': worksheet.title,
+            'sheets': sheets,
+            'columns': names,
+            'rows': preview,
+            'total_rows': total_rows,
+            'stats': {name: s.to_dict(total_rows) for name, s in zip(names, stats)}
+        }
+    finally:
+        workbook.close()
+
+
+def _read_with_pandas(stream, sheet, columns, preview_rows):
+    workbook = pd.ExcelFile(stream)
+    sheet_name = sheet or workbook.sheet_names[0]
+    df = workbook.parse(sheet_name)
+    if columns:
+        wanted = {str(c).lower() for c in columns}
+        df = df[[c for c in df.columns if str(c).lower() in wanted]]
+    df = df.dropna(how='all')
+
+    names = [str(c) for c in df.columns]
+    stats = {}
+    for name, column in zip(names, df.columns):
+        column_stats = ColumnStats()
+        for value in df[column].dropna():
+            column_stats.add(value.item() if hasattr(value, 'item') else value)
+        stats[name] = column_stats.to_dict(len(df))
+
+    # Blank cells come back as NaN; report them as None like openpyxl does
+    preview = df.head(preview_rows).astype(object)
+    preview = preview.where(preview.notna(), None)
+    return {
+        'sheet': sheet_name,
+        'sheets': workbook.sheet_names,
+        'columns': names,
+        'rows': [dict(zip(names, row)) for row in preview.itertuples(index=False, name=None)],
+        'total_rows': len(df),
+        'stats': stats
+    }
+
+
+def read_spreadsheet(stream, sheet=None, columns=None, preview_rows=DEFAULT_PREVIEW_ROWS):
+    """
+    Read a preview and per-column statistics from a spreadsheet.
+
+    Args:
+        stream: Seekable binary file-like object positioned at the start
+        sheet (str, optional): Sheet to read (default: the first sheet)
+        columns (list, optional): Column names to keep (default: all columns)
+        preview_rows (int): Number of leading rows to return
+
+    Returns:
+        dict: 'sheet', 'sheets', 'columns', preview 'rows' (list of dicts),
+              'total_rows' and per-column 'stats'
+    """
+    # .xlsx workbooks are zip archives; anything else is left to pandas
+    is_xlsx = stream.read(2) == b'PK'
+    stream.seek(0)
+
+    if is_xlsx:
+        return _read_xlsx(stream, sheet, columns, preview_rows)
+
+    logger.info("Reading non-xlsx spreadsheet with pandas")
+    return _read_with_pandas(stream, sheet, columns, preview_rows)
+
+
+def iter_row_batches(stream, sheet=None, batch_rows=10000):
+    """
+    Stream a sheet's rows as DataFrames of at most batch_rows rows.
+
+    Only one batch is held in memory at a time for .xlsx workbooks; column
+    dtypes are inferred per batch.
+
+    Args:
+        stream: Seekable binary file-like object positioned at the start
+        sheet (str, optional): Sheet to read (default: the first sheet)
+        batch_rows (int): Rows per DataFrame
+
+    Yields:
+        DataFrame: Consecutive batches of non-blank rows
+    """
+    is_xlsx = stream.read(2) == b'PK'
+    stream.seek(0)
+
+    if not is_xlsx:
+        logger.info("Reading non-xlsx spreadsheet with pandas")
+        workbook = pd.ExcelFile(stream)
+        df = workbook.parse(sheet or workbook.sheet_names[0]).dropna(how='all')
+        for start in range(0, max(len(df), 1), batch_rows):
+            yield df.iloc[start:start + batch_rows]
+        return
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+
+        headers = _header_names(header_row)
+        batch = []
+        yielded = False
+        for row in rows:
+            values = [row[idx] if idx < len(row) else None for idx in range(len(headers))]
+            if all(value is None for value in values):
+                continue
+            batch.append(values)
+            if len(batch) >= batch_rows:
+                yield pd.DataFrame(batch, columns=headers).infer_objects()
+                yielded = True
+                batch = []
+        # A header-only sheet still yields its (empty) columns
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=headers).infer_objects()
+    finally:
+        workbook.close()
@@ -0,0 +1,205 @@
+"""
+Table-to-prompt rendering for RoboSynthesis.
+
+Turns tabular data (spreadsheet previews, lists of records) into text for chat
+replies and LLM prompts. Cells are formatted a column at a time with pandas
+string operations rather than per-cell Python loops, and the output is kept
+to MAX_ROWS rows (10, as before) and within a token budget so wide or long
+sheets cannot blow up a prompt.
+
+Formats:
+- 'rows': "Row N: col: value, ..." lines (the original preview style)
+- 'markdown': A markdown table
+- 'csv': Comma-separated values
+- 'compact': Tab-separated values with a single header line
+
+Configuration (environment variables):
+- TABLE_TOKEN_BUDGET: Maximum tokens of rendered table text (default: 1500)
+"""
+
+import os
+
+import pandas as pd
+
+TABLE_TOKEN_BUDGET = int(os.getenv('TABLE_TOKEN_BUDGET', 1500))
+
+# Same approximation as the conversation history window
+CHARS_PER_TOKEN = 4
+# Longest cell value shown before truncation
+MAX_CELL_CHARS = 80
+# Widest table rendered before columns are dropped
+MAX_COLUMNS = 30
+# Rows shown by default, as in the original preview
+MAX_ROWS = 10
+
+FORMATS = ('rows', 'markdown', 'csv', 'compact')
+
+
+def _tokens(length):
+    return length // CHARS_PER_TOKEN + 1
+
+
+def summarize_columns(df):
+    """
+    Compute per-column type and value statistics for a DataFrame.
+
+    Returns:
+        dict: Column name -> 'type', 'non_null', 'nulls' and, for numeric
+              columns, 'min', 'max' and 'mean'
+    """
+    non_null = df.notna().sum()
+    stats = {}
+    for column in df.columns:
+        series = df[column]
+        if not non_null[column]:
+            column_type = 'empty'
+        elif pd.api.types.is_bool_dtype(series):
+            column_type = 'boolean'
+        elif pd.api.types.is_numeric_dtype(series):
+            column_type = 'number'
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            column_type = 'date'
+        else:
+            column_type = 'text'
+
+        column_stats = {
+            'type': column_type,
+            'non_null': int(non_null[column]),
+            'nulls': int(len(series) - non_null[column])
+        }
+        if column_type == 'number':
+            column_stats['min'] = series.min().item()
+            column_stats['max'] = series.max().item()
+            column_stats['mean'] = series.mean().item()
+        stats[str(column)] = column_stats
+    return stats
+
+
+def _format_stat(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def render_column_summary(stats):
+    """Render column statistics as one line per column"""
+    lines = []
+    for name, column_stats in stats.items():
+        line = f"- {name} ({column_stats['type']}): {column_stats['non_null']} values, {column_stats['nulls']} empty"
+        if 'mean' in column_stats:
+            line += (
+                f", min {_format_stat(column_stats['min'])}, max {_format_stat(column_stats['max'])}"
+                f", mean {_format_stat(column_stats['mean'])}"
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _format_cells(df, max_cell_chars):
+    """Format every cell as a string, one vectorized pass per column"""
+    cells = df.astype(object).where(df.notna(), '').astype(str)
+    for column in cells.columns:
+        values = cells[column].str.replace('\n', ' ', regex=False)
+        too_long = values.str.len() > max_cell_chars
+        if too_long.any():
+            values = values.where(~too_long, values.str.slice(0, max_cell_chars - 3) + '...')
+        cells[column] = values
+    return cells
+
+
+def _join_columns(parts, separator):
+    """Join per-column string Series into per-row lines"""
+    lines = parts[0]
+    for part in parts[1:]:
+        lines = lines + separator + part
+    return lines
+
+
+def _render_lines(cells, names, fmt):
+    """Render the header lines and one line per row for the given format"""
+    if fmt == 'rows':
+        parts = [name + ': ' + cells[column] for name, column in zip(names, cells.columns)]
+        numbers = pd.Series(range(1, len(cells) + 1), index=cells.index).astype(str)
+        return [], 'Row ' + numbers + ': ' + _join_columns(parts, ', ')
+
+    if fmt == 'markdown':
+        escaped = [cells[column].str.replace('|', '\\|', regex=False) for column in cells.columns]
+        header = ['| ' + ' | '.join(names) + ' |', '|' + '---|' * len(names)]
+        return header, '| ' + _join_columns(escaped, ' | ') + ' |'
+
+    if fmt == 'csv':
+        csv_text = cells.to_csv(index=False, header=False, lineterminator='\n')
+        header = [pd.DataFrame(columns=names).to_csv(index=False, lineterminator='\n').rstrip('\n')]
+        return header, pd.Series(csv_text.splitlines(), dtype=object)
+
+    # compact
+    parts = [cells[column].str.replace('\t', ' ', regex=False) for column in cells.columns]
+    return ['\t'.join(names)], _join_columns(parts, '\t')
+
+
+def render_table(rows, columns=None, total_rows=None, stats=None, fmt='rows',
+                 token_budget=TABLE_TOKEN_BUDGET, max_cell_chars=MAX_CELL_CHARS,
+                 max_columns=MAX_COLUMNS, max_rows=MAX_ROWS, title="Excel File Contents"):
+    """
+    Render tabular data as prompt-ready text within a token budget.
+
+    Args:
+        rows (list or DataFrame): Records (list of dicts) or a DataFrame
+        columns (list, optional): Column order (default: the data's own order)
+        total_rows (int, optional): Row count of the full table, if only a
+                                    preview is given
+        stats (dict, optional): Per-column statistics; computed from the rows
+                                if omitted
+        fmt (str): One of 'rows', 'markdown', 'csv' or 'compact'
+        token_budget (int): Approximate maximum tokens of output
+        max_cell_chars (int): Longest cell value before truncation
+        max_columns (int): Widest table rendered before columns are dropped
+        max_rows (int): Most rows shown, even if more fit the budget
+                        (None for no limit)
+        title (str): Heading for the rendered text
+
+    Returns:
+        str: The rendered table
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown table format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, columns=columns)
+    if total_rows is None:
+        total_rows = len(df)
+    if stats is None:
+        stats = summarize_columns(df)
+
+    names = [str(c) for c in df.columns]
+    heading = f"{title}:\n\nColumns: " + ", ".join(names) + "\n\n"
+    if len(names) > max_columns:
+        heading += f"(showing the first {max_columns} of {len(names)} columns)\n\n"
+        df = df.iloc[:, :max_columns]
+        names = names[:max_columns]
+        stats = {name: stats[name] for name in names if name in stats}
+
+    if stats:
+        heading += "Column summary:\n" + render_column_summary(stats) + "\n\n"
+
+    if df.empty:
+        return heading + "No rows to show."
+
+    if max_rows is not None:
+        df = df.head(max_rows)
+
+    header_lines, lines = _render_lines(_format_cells(df, max_cell_chars), names, fmt)
+    header_text = "".join(line + "\n" for line in header_lines)
+
+    # Keep as many leading rows as fit in what is left of the budget
+    remaining = token_budget - _tokens(len(heading) + len(header_text)) - 20
+    line_tokens = (lines.str.len() + 1) // CHARS_PER_TOKEN + 1
+    shown = int((line_tokens.cumsum() <= remaining).sum())
+    lines = lines.iloc[:shown]
+
+    text = heading + f"Showing first {shown} rows (total rows: {total_rows}):\n\n"
+    if shown < len(df):
+        text += f"(preview trimmed to {shown} of {len(df)} rows to fit the token budget)\n\n"
+    text += header_text + "\n".join(lines) + ("\n" if shown else "")
+    if total_rows > shown:
+        text += f"... {total_rows - shown} more rows\n"
+    return text
@@ -0,0 +1,401 @@
+"""
+Size-aware tabular ingestion for RoboSynthesis.
+
+Uploaded CSV and Excel files used to be rendered in full with to_string() and
+pasted into the prompt, which exhausts memory and the context window for large
+tables. Instead, a table is read in bounded chunks (with dtypes inferred per
+chunk) and, in the same single pass:
+- Per-column types and statistics are accumulated
+- The first rows are kept as a sample
+- Every chunk is appended to a per-upload SQLite database
+
+The prompt only gets a token-bounded summary (schema, statistics and sample),
+while the full data stays queryable server-side with read-only SELECT
+statements, using the dataset_id returned with the upload. Datasets are stored
+per owning user and identified by a hash of the uploaded bytes, so re-uploading
+the same file reuses its database, and a user can only query their own
+datasets. Tables ingested without an owner are summarized but not stored.
+
+Configuration (environment variables):
+- TABULAR_STORE_DIR: Directory holding the SQLite databases (default: <project>/tabular_datasets)
+- TABULAR_STORE_TTL_HOURS: Hours an unused dataset is kept (default: 24)
+- TABULAR_CHUNK_ROWS: Rows read per chunk (default: 50000)
+- TABULAR_SUMMARY_TOKENS: Maximum tokens of the prompt summary (default: 1000)
+- TABULAR_QUERY_MAX_ROWS: Maximum rows returned by a query (default: 200)
+- TABULAR_QUERY_TIMEOUT: Seconds a query may run before it is interrupted (default: 5)
+- TABULAR_QUERY_MAX_VALUE_BYTES: Largest string or blob a query may produce (default: 1 MB)
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from contextlib import closing
+
+import pandas as pd
+
+from .spreadsheet_reader import iter_row_batches
+from .table_renderer import render_table, summarize_columns
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Beside the Django project (BASE_DIR) rather than in a world-readable temp directory
+TABULAR_STORE_DIR = os.getenv('TABULAR_STORE_DIR', str(Path(__file__).resolve().parent.parent / 'tabular_datasets'))
+TABULAR_STORE_TTL_HOURS = float(os.getenv('TABULAR_STORE_TTL_HOURS', 24))
+TABULAR_CHUNK_ROWS = int(os.getenv('TABULAR_CHUNK_ROWS', 50000))
+TABULAR_SUMMARY_TOKENS = int(os.getenv('TABULAR_SUMMARY_TOKENS', 1000))
+TABULAR_QUERY_MAX_ROWS = int(os.getenv('TABULAR_QUERY_MAX_ROWS', 200))
+TABULAR_QUERY_TIMEOUT = float(os.getenv('TABULAR_QUERY_TIMEOUT', 5))
+TABULAR_QUERY_MAX_VALUE_BYTES = int(os.getenv('TABULAR_QUERY_MAX_VALUE_BYTES', 1024 * 1024))
+
+# Table holding the uploaded rows
+TABLE_NAME = 'data'
+# Table holding the dataset's summary (columns, stats and sample)
+INFO_TABLE_NAME = 'dataset_info'
+# Rows kept as the sample shown in the summary
+SAMPLE_ROWS = 20
+# SQLite VM steps between query timeout checks
+PROGRESS_STEPS = 10000
+
+# Statements a dataset query may prepare: plain reads only
+_ALLOWED_ACTIONS = frozenset((
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_RECURSIVE,
+))
+
+# SQL functions a dataset query may call. Functions that allocate large values
+# in a single step (zeroblob, randomblob, printf, ...) are left out, since the
+# progress handler cannot interrupt them
+ALLOWED_FUNCTIONS = frozenset((
+    # Aggregates
+    'count', 'sum', 'total', 'avg', 'min', 'max', 'group_concat',
+    # Scalars
+    'abs', 'round', 'length', 'lower', 'upper', 'trim', 'ltrim', 'rtrim',
+    'substr', 'substring', 'instr', 'replace', 'coalesce', 'ifnull', 'nullif',
+    'iif', 'typeof', 'like', 'glob', 'sign', 'floor', 'ceil', 'ceiling',
+    # Dates
+    'date', 'time', 'datetime', 'julianday', 'strftime', 'unixepoch',
+))
+
+_DATASET_ID_RE = re.compile(r'[0-9a-f]{64}')
+
+
+class TableQueryError(Exception):
+    """Raised when a dataset query is rejected or fails"""
+
+
+class DatasetNotFound(TableQueryError):
+    """Raised when a dataset does not exist (or has expired)"""
+
+
+class _StatsAccumulator:
+    """Merges per-chunk column statistics into statistics for the whole table"""
+
+    def __init__(self):
+        self.columns = {}
+
+    def add(self, chunk):
+        for name, stats in summarize_columns(chunk).items():
+            entry = self.columns.setdefault(name, {
+                'type': 'empty', 'non_null': 0, 'nulls': 0,
+                'numeric': 0, 'min': None, 'max': None, 'total': 0.0
+            })
+            entry['non_null'] += stats['non_null']
+            entry['nulls'] += stats['nulls']
+            if stats['type'] != 'empty':
+                # A column inferred differently in different chunks is mixed
+                entry['type'] = stats['type'] if entry['type'] in ('empty', stats['type']) else 'mixed'
+            if 'mean' in stats:
+                entry['numeric'] += stats['non_null']
+                entry['total'] += stats['mean'] * stats['non_null']
+                entry['min'] = stats['min'] if entry['min'] is None else min(entry['min'], stats['min'])
+                entry['max'] = stats['max'] if entry['max'] is None else max(entry['max'], stats['max'])
+
+    def to_dict(self):
+        result = {}
+        for name, entry in self.columns.items():
+            stats = {'type': entry['type'], 'non_null': entry['non_null'], 'nulls': entry['nulls']}
+            if entry['numeric']:
+                stats['min'] = entry['min']
+                stats['max'] = entry['max']
+                stats['mean'] = entry['total'] / entry['numeric']
+            result[name] = stats
+        return result
+
+
+def _hash_stream(stream, salt=''):
+    """Hash a stream's bytes in blocks, leaving it at the start"""
+    digest = hashlib.sha256(salt.encode('utf-8'))
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _owner_dir(owner):
+    return os.path.join(TABULAR_STORE_DIR, str(int(owner)))
+
+
+def _dataset_path(dataset_id, owner):
+    if not _DATASET_ID_RE.fullmatch(dataset_id or ''):
+        raise DatasetNotFound(f"Unknown dataset '{dataset_id}'")
+    return os.path.join(_owner_dir(owner), f"{dataset_id}.sqlite3")
+
+
+def _make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # makedirs' mode is ignored for existing directories and masked by the umask
+    os.chmod(path, 0o700)
+
+
+def _evict_expired():
+    """Delete datasets that have not been used within the TTL"""
+    cutoff = time.time() - TABULAR_STORE_TTL_HOURS * 3600
+    try:
+        owner_dirs = [entry.path for entry in os.scandir(TABULAR_STORE_DIR) if entry.is_dir()]
+    except OSError:
+        return
+    for owner_dir in owner_dirs:
+        try:
+            entries = list(os.scandir(owner_dir))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.name.endswith('.sqlite3') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _unique_names(columns):
+    """Column names that are unique ignoring case, as SQLite requires"""
+    seen = set()
+    names = []
+    for column in columns:
+        name = str(column)
+        candidate = name
+        suffix = 1
+        while candidate.lower() in seen:
+            candidate = f"{name}.{suffix}"
+            suffix += 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _sqlite_ready(chunk):
+    """Convert values SQLite cannot store (times, decimals, ...) to strings"""
+    return chunk.assign(**{
+        column: chunk[column].map(
+            lambda value: value if value is None or isinstance(value, (str, int, float)) else str(value)
+        )
+        for column in chunk.columns[chunk.dtypes == object]
+    })
+
+
+def _iter_chunks(stream, fmt, sheet):
+    if fmt == 'csv':
+        return pd.read_csv(stream, chunksize=TABULAR_CHUNK_ROWS)
+    return iter_row_batches(stream, sheet=sheet, batch_rows=TABULAR_CHUNK_ROWS)
+
+
+def _load_info(path):
+    with closing(sqlite3.connect(path)) as conn:
+        row = conn.execute(f"SELECT value FROM {INFO_TABLE_NAME} WHERE key = 'summary'").fetchone()
+    return json.loads(row[0])
+
+
+def _build(stream, fmt, sheet, path):
+    """Read a table in one pass into a new SQLite database, returning its summary"""
+    accumulator = _StatsAccumulator()
+    names = None
+    sample = None
+    total_rows = 0
+
+    conn = sqlite3.connect(path)
+    try:
+        # The file is only published once complete, so durability is not needed while building
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for chunk in _iter_chunks(stream, fmt, sheet):
+            if names is None:
+                names = _unique_names(chunk.columns)
+            chunk.columns = names
+            accumulator.add(chunk)
+            total_rows += len(chunk)
+            if sample is None:
+                sample = chunk.head(SAMPLE_ROWS)
+            elif len(sample) < SAMPLE_ROWS:
+                sample = pd.concat([sample, chunk.head(SAMPLE_ROWS - len(sample))])
+            _sqlite_ready(chunk).to_sql(TABLE_NAME, conn, if_exists='append', index=False)
+
+        info = {
+            'columns': names or [],
+            'total_rows': total_rows,
+            'stats': accumulator.to_dict(),
+            'sample': [] if sample is None else json.loads(sample.to_json(orient='values', date_format='iso'))
+        }
+        conn.execute(f"CREATE TABLE {INFO_TABLE_NAME} (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(f"INSERT INTO {INFO_TABLE_NAME} VALUES ('summary', ?)", (json.dumps(info, default=str),))
+        conn.commit()
+    finally:
+        conn.close()
+    return info
+
+
+def ingest_table(stream, fmt, sheet=None, owner=None):
+    """
+    Read a CSV or Excel table into a queryable dataset in one streaming pass.
+
+    Args:
+        stream: Seekable binary file-like object
+        fmt (str): 'csv' or 'excel'
+        sheet (str, optional): Excel sheet to read (default: the first sheet)
+        owner (int, optional): ID of the user the dataset belongs to; without
+                               an owner the table is only summarized, not stored
+
+    Returns:
+        dict: 'dataset_id' (None if not stored), 'columns', 'total_rows',
+              per-column 'stats' and 'sample' (a DataFrame of the first rows)
+    """
+    if owner is None:
+        # Nobody could query it, so build it in a scratch directory and drop it
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            info = _build(stream, fmt, sheet, os.path.join(scratch_dir, 'dataset.sqlite3'))
+        dataset_id = None
+    else:
+        dataset_id = dataset_id_for(stream, fmt, sheet)
+        info = _store(stream, fmt, sheet, dataset_id, owner)
+
+    return {
+        'dataset_id': dataset_id,
+        'columns': info['columns'],
+        'total_rows': info['total_rows'],
+        'stats': info['stats'],
+        'sample': pd.DataFrame(info['sample'], columns=info['columns'])
+    }
+
+
+def dataset_id_for(stream, fmt, sheet=None):
+    """Get the id a table is stored under, a hash of its bytes, format and sheet"""
+    return _hash_stream(stream, salt=f"{fmt}:{sheet or ''}")
+
+
+def _store(stream, fmt, sheet, dataset_id, owner):
+    """Load a stored dataset's summary, building its database first if needed"""
+    path = _dataset_path(dataset_id, owner)
+
+    if os.path.exists(path):
+        os.utime(path)
+        info = _load_info(path)
+        logger.info(f"Reusing stored dataset {dataset_id}")
+    else:
+        _make_private_dir(TABULAR_STORE_DIR)
+        _make_private_dir(_owner_dir(owner))
+        _evict_expired()
+        start = time.perf_counter()
+        # Build under a unique name so concurrent uploads of the same file cannot clash
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            info = _build(stream, fmt, sheet, temporary_path)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        logger.info(
+            f"Stored dataset {dataset_id}: {info['total_rows']} rows, {len(info['columns'])} columns "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+    return info
+
+
+def render_dataset_summary(dataset, token_budget=TABULAR_SUMMARY_TOKENS, title="Table Contents"):
+    """
+    Render a token-bounded summary of a dataset for the prompt.
+
+    Returns:
+        str: Schema, column statistics and sample rows
+    """
+    return render_table(
+        dataset['sample'], columns=dataset['columns'], total_rows=dataset['total_rows'],
+        stats=dataset['stats'], fmt='compact', token_budget=token_budget, title=title
+    )
+
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # For function calls the second argument is the function name
+    if action == sqlite3.SQLITE_FUNCTION and (arg2 or '').lower() in ALLOWED_FUNCTIONS:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _json_value(value):
+    # Blobs are not JSON serializable; describe them instead
+    if isinstance(value, bytes):
+        return f"<{len(value)} byte blob>"
+    return value
+
+
+def query_table(dataset_id, sql, owner, max_rows=TABULAR_QUERY_MAX_ROWS):
+    """
+    Run a read-only SQL query against one of a user's stored datasets.
+
+    The database is opened read-only and an authorizer rejects anything but
+    SELECT statements (no PRAGMA, ATTACH or writes) and functions outside
+    ALLOWED_FUNCTIONS. Strings and blobs are limited to
+    TABULAR_QUERY_MAX_VALUE_BYTES, and queries running longer than
+    TABULAR_QUERY_TIMEOUT seconds are interrupted.
+
+    Args:
+        dataset_id (str): The dataset's id
+        sql (str): A single SELECT statement
+        owner (int): ID of the user making the query
+        max_rows (int): Maximum rows returned
+
+    Returns:
+        dict: Result 'columns', 'rows' (lists of values) and whether the
+              result was 'truncated' to max_rows
+
+    Raises:
+        DatasetNotFound: If the dataset does not exist or belongs to another user
+        TableQueryError: If the query is not allowed or fails
+    """
+    if owner is None:
+        raise DatasetNotFound(f"Unknown dataset '{dataset_id}'")
+    path = _dataset_path(dataset_id, owner)
+    if not os.path.exists(path):
+        raise DatasetNotFound(f"Unknown dataset '{dataset_id}'")
+
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        conn.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, TABULAR_QUERY_MAX_VALUE_BYTES)
+        conn.set_authorizer(_authorize)
+        deadline = time.monotonic() + TABULAR_QUERY_TIMEOUT
+        # A true return value interrupts the running statement
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        cursor = conn.execute(sql)
+        columns = [description[0] for description in cursor.description or ()]
+        rows = cursor.fetchmany(max_rows + 1)
+    except sqlite3.Error as e:
+        raise TableQueryError(f"Query failed: {str(e)}") from e
+    finally:
+        conn.close()
+
+    os.utime(path)
+    return {
+        'columns': columns,
+        'rows': [[_json_value(value) for value in row] for row in rows[:max_rows]],
+        'truncated': len(rows) > max_rows
+    }
@@ -1,3 +1,1230 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import docx
+import fitz
+import openpyxl
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from langchain_core.messages import AIMessage, HumanMessage
+
+from . import (
+    batch_upload, drive_handler, drive_resolver, extraction, google_drive_utils, history_window, ingestion, intent_router,
+    memory_store, tabular_store, views, vision
+)
+from .batch_upload import process_batch
+from .drive_content_cache import DriveContentCache, content_cache_key
+from .drive_index import NameMatcher
+from .drive_resolver import resolve_file
+from .extraction import ExtractionError, detect_format, extract_text, get_extraction_metrics
+from .groq_clients import get_groq_client, get_pool_stats
+from .history_window import window_history
+from .image_preprocessing import preprocess_image
+from .ingestion import get_job, submit_context_file
+from .intent_router import route_intent
+from .memory_store import LocalMemoryStore, SQLiteMemoryStore
+from .models import ContextChunk, ContextTerm, IngestionJob, SubjectContext
+from .retrieval import bm25_weight, chunk_text, index_context, retrieve_passages
+from .spreadsheet_reader import read_spreadsheet
+from .table_renderer import render_table
+from .tabular_store import DatasetNotFound, TableQueryError, ingest_table, query_table, render_dataset_summary
+from .vision import ResultCache, describe_image, get_vision_cache_stats, ocr_image, stream_image_answer
+
+
+def make_workbook(rows):
+    """Build an in-memory .xlsx workbook from a list of rows (header first)"""
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    for row in rows:
+        worksheet.append(row)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+class SpreadsheetReaderTests(SimpleTestCase):
+
+    def test_repeated_headers_keep_every_column(self):
+        stream = make_workbook([
+            ['Total', 'Total', None, None],
+            [1, 2, 'a', 'b'],
+            [3, 4, 'c', 'd'],
+        ])
+
+        result = read_spreadsheet(stream)
+
+        self.assertEqual(result['columns'], ['Total', 'Total.1', 'Unnamed: 2', 'Unnamed: 3'])
+        self.assertEqual(result['rows'][0], {'Total': 1, 'Total.1': 2, 'Unnamed: 2': 'a', 'Unnamed: 3': 'b'})
+        self.assertEqual(result['stats']['Total']['max'], 3)
+        self.assertEqual(result['stats']['Total.1']['max'], 4)
+        self.assertEqual(result['total_rows'], 2)
+
+
+class GroqClientPoolTests(SimpleTestCase):
+
+    def test_client_is_reused_per_api_key(self):
+        before = get_pool_stats()
+
+        first = get_groq_client('pool-test-key')
+        second = get_groq_client('pool-test-key')
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, get_groq_client('other-pool-test-key'))
+        after = get_pool_stats()
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+
+class PerformanceStatsViewTests(TestCase):
+
+    def test_staff_only(self):
+        user = User.objects.create_user(username='member', password='secret')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('personalassistant:performance_stats')).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('personalassistant:performance_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'groq_clients', 'extraction', 'vision_cache', 'image_preprocessing'})
+
+
+class FakeAsyncStream:
+    """Stands in for an AsyncGroq streaming completion"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for piece in self.pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def close(self):
+        self.closed = True
+
+
+async def collect(agen):
+    return [event async for event in agen]
+
+
+class AsyncStreamingResponseTests(SimpleTestCase):
+
+    def test_streams_with_requested_model_and_context(self):
+        stream = FakeAsyncStream(['Hel', 'lo'])
+        client = mock.MagicMock()
+        client.chat.completions.create = mock.AsyncMock(return_value=stream)
+
+        with mock.patch.object(views, 'get_async_groq_client', return_value=client):
+            events = async_to_sync(collect)(
+                views.agenerate_streaming_response('test-model', 'Hi there', 'async-stream-test', context='Use metric units')
+            )
+
+        kwargs = client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['model'], 'test-model')
+        self.assertIn({'role': 'system', 'content': 'Use metric units'}, kwargs['messages'])
+        self.assertEqual(events[-1], f"data: {json.dumps({'status': 'done'})}\n\n")
+        self.assertTrue(stream.closed)
+        history = views.get_or_create_memory('async-stream-test').chat_memory.messages
+        self.assertEqual([m.content for m in history], ['Hi there', 'Hello'])
+
+
+class LocalMemoryStoreTests(SimpleTestCase):
+
+    def test_idle_sessions_expire(self):
+        store = LocalMemoryStore(ttl=60)
+        with mock.patch.object(memory_store.time, 'time', return_value=1000):
+            store.get_or_create('a')
+        with mock.patch.object(memory_store.time, 'time', return_value=1030):
+            self.assertIsNotNone(store.get('a'))
+        with mock.patch.object(memory_store.time, 'time', return_value=1100):
+            self.assertIsNone(store.get('a'))
+
+    def test_messages_count_as_soon_as_they_are_added(self):
+        store = LocalMemoryStore()
+        memory = store.get_or_create('a')
+        memory.chat_memory.add_user_message('x' * 100)
+        memory.chat_memory.add_ai_message('y' * 50)
+
+        self.assertEqual(store.stats()['bytes'], 100 + 50 + 2 * memory_store.MESSAGE_OVERHEAD_BYTES)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        store = LocalMemoryStore(max_bytes=500)
+        store.get_or_create('a').chat_memory.add_user_message('x' * 100)
+        store.get_or_create('b').chat_memory.add_user_message('y' * 100)
+
+        self.assertIsNone(store.get('a'))
+        self.assertIsNotNone(store.get('b'))
+        self.assertEqual(store.stats()['evictions'], 1)
+        self.assertEqual(store.stats()['bytes'], 300)
+
+    def test_popped_session_no_longer_counts(self):
+        store = LocalMemoryStore()
+        memory = store.get_or_create('a')
+        store.pop('a')
+        memory.chat_memory.add_user_message('late reply')
+
+        self.assertEqual(store.stats(), {'backend': 'local', 'sessions': 0, 'bytes': 0, 'evictions': 0})
+
+    def test_session_count_limit(self):
+        store = LocalMemoryStore(max_sessions=2)
+        for session_id in ('a', 'b', 'c'):
+            store.get_or_create(session_id)
+
+        self.assertEqual(store.stats()['sessions'], 2)
+        self.assertIsNone(store.get('a'))
+
+
+class WindowHistoryTests(SimpleTestCase):
+
+    def test_keeps_newest_messages_within_budget(self):
+        # Each message is 40 characters: 40 // 4 + 4 = 14 tokens
+        messages = [
+            HumanMessage(content='q' * 40), AIMessage(content='a' * 40),
+            HumanMessage(content='r' * 40), AIMessage(content='b' * 40),
+            HumanMessage(content='s' * 40)
+        ]
+        with mock.patch.object(history_window, 'schedule_summary') as schedule_summary:
+            summary, window = window_history('window-test', messages, token_budget=30)
+
+        self.assertEqual(summary, '')
+        self.assertEqual(window, messages[-2:])
+        schedule_summary.assert_called_once_with('window-test', messages[:3], 0, 3)
+
+    def test_current_query_kept_even_over_budget(self):
+        messages = [HumanMessage(content='z' * 400)]
+        with mock.patch.object(history_window, 'schedule_summary') as schedule_summary:
+            _, window = window_history('window-over', messages, token_budget=10)
+
+        self.assertEqual(window, messages)
+        schedule_summary.assert_not_called()
+
+
+class SQLiteMemoryStoreTests(SimpleTestCase):
+
+    def test_token_counts_survive_reload(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = SQLiteMemoryStore(path=os.path.join(directory, 'memory.sqlite3'))
+        store.get_or_create('s').chat_memory.add_user_message('w' * 40)
+
+        message = store.get('s').chat_memory.messages[0]
+
+        self.assertEqual(message.content, 'w' * 40)
+        self.assertEqual(message.additional_kwargs, {'token_count': 14})
+
+
+def fake_detector(result, delay=0.0):
+    def detector(query):
+        time.sleep(delay)
+        return result
+    return detector
+
+
+IDENTITY_UPDATE = {'is_identity_update': True, 'name': 'Sam', 'email': None, 'organization': None}
+NO_IDENTITY = {'is_identity_update': False, 'name': None, 'email': None, 'organization': None}
+EMAIL_REQUEST = {'is_email_request': True}
+NO_EMAIL = {'is_email_request': False}
+DRIVE_REQUEST = (True, 'list', {})
+NO_DRIVE = (False, None, {})
+
+
+class RouteIntentTests(SimpleTestCase):
+
+    def route(self, identity, email, drive, deadlines=None):
+        detectors = [
+            ('identity', identity, intent_router._is_identity_update, None, True),
+            ('email', email, intent_router._is_email_request, None, False),
+            ('drive', drive, intent_router._is_drive_request, (False, None, {}), True)
+        ]
+        with mock.patch.object(intent_router, 'DETECTORS', detectors):
+            return route_intent('query', deadlines=deadlines)
+
+    def test_plain_chat_has_no_intent(self):
+        route = self.route(fake_detector(NO_IDENTITY), fake_detector(NO_EMAIL), fake_detector(NO_DRIVE))
+
+        self.assertIsNone(route['intent'])
+        self.assertEqual({timing['status'] for timing in route['timings'].values()}, {'ok'})
+
+    def test_higher_priority_intent_wins(self):
+        route = self.route(fake_detector(IDENTITY_UPDATE), fake_detector(EMAIL_REQUEST), fake_detector(DRIVE_REQUEST))
+
+        self.assertEqual(route['intent'], 'identity')
+        self.assertEqual(route['timings']['email']['status'], 'skipped')
+        self.assertEqual(route['timings']['drive']['status'], 'skipped')
+        self.assertEqual(route['results']['drive'], NO_DRIVE)
+
+    def test_email_does_not_wait_for_drive(self):
+        route = self.route(fake_detector(NO_IDENTITY), fake_detector(EMAIL_REQUEST), fake_detector(DRIVE_REQUEST, delay=1.0))
+
+        self.assertEqual(route['intent'], 'email')
+        self.assertEqual(route['timings']['drive']['status'], 'skipped')
+        self.assertLess(route['total_ms'], 500)
+
+    def test_slow_drive_detection_times_out(self):
+        route = self.route(
+            fake_detector(NO_IDENTITY), fake_detector(NO_EMAIL), fake_detector(DRIVE_REQUEST, delay=1.0),
+            deadlines={'drive': 0.05}
+        )
+
+        self.assertIsNone(route['intent'])
+        self.assertEqual(route['timings']['drive']['status'], 'timeout')
+        self.assertEqual(route['results']['drive'], NO_DRIVE)
+
+    def test_slow_identity_update_is_not_dropped(self):
+        route = self.route(
+            fake_detector(IDENTITY_UPDATE, delay=0.3), fake_detector(NO_EMAIL), fake_detector(NO_DRIVE),
+            deadlines={'drive': 0.05}
+        )
+
+        self.assertEqual(route['intent'], 'identity')
+        self.assertEqual(route['results']['identity'], IDENTITY_UPDATE)
+
+    def test_failing_detector_counts_as_negative(self):
+        def broken(query):
+            raise RuntimeError('detector failed')
+
+        route = self.route(broken, fake_detector(NO_EMAIL), fake_detector(DRIVE_REQUEST))
+
+        self.assertEqual(route['intent'], 'drive')
+        self.assertEqual(route['timings']['identity']['status'], 'error')
+
+
+class NameMatcherTests(SimpleTestCase):
+
+    def test_matches_naive_substring_search(self):
+        rng = random.Random(42)
+        alphabet = 'abc '
+        for _ in range(200):
+            names = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(8)]
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+
+            expected = [name for name in names if name in text]
+            self.assertEqual(NameMatcher(names).find(text), expected, (names, text))
+
+    def test_overlapping_names(self):
+        matcher = NameMatcher(['budget', 'budget 2024', 'get', 'report'])
+
+        self.assertEqual(matcher.find('open budget 2024 please'), ['budget', 'budget 2024', 'get'])
+
+
+class ResolveFileTests(SimpleTestCase):
+
+    def setUp(self):
+        drive_resolver._resolutions.clear()
+        self.index = mock.Mock()
+        self.index.search.return_value = []
+        patcher = mock.patch.object(drive_resolver, 'get_drive_name_index', return_value=self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.list_files = mock.Mock(return_value=[])
+        patcher = mock.patch.object(drive_resolver.google_drive_utils, 'list_files', self.list_files)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exact_index_match_makes_no_api_calls(self):
+        self.index.search.return_value = [
+            {'id': '1', 'name': 'Budget notes.docx'},
+            {'id': '2', 'name': 'Budget.xlsx'}
+        ]
+
+        result = resolve_file('budget')
+
+        self.assertEqual(result['file'], {'id': '2', 'name': 'Budget.xlsx'})
+        self.assertEqual((result['source'], result['api_calls']), ('index', 0))
+        self.list_files.assert_not_called()
+
+    def test_unindexed_name_uses_one_query(self):
+        self.list_files.return_value = [
+            {'id': '3', 'name': 'Heroes backup.xlsx'},
+            {'id': '4', 'name': 'Heroes.xlsx'}
+        ]
+
+        result = resolve_file("heroes")
+
+        self.assertEqual(result['file']['id'], '4')
+        self.assertEqual((result['source'], result['api_calls']), ('query', 1))
+        self.list_files.assert_called_once()
+        self.assertIn("name contains 'heroes'", self.list_files.call_args.kwargs['query'])
+
+    def test_repeat_resolution_is_cached(self):
+        self.list_files.return_value = [{'id': '5', 'name': 'Plan.docx'}]
+        resolve_file('plan')
+
+        result = resolve_file('Plan')
+
+        self.assertEqual((result['source'], result['api_calls']), ('cache', 0))
+        self.assertEqual(self.list_files.call_count, 1)
+
+    def test_quotes_in_names_are_escaped(self):
+        resolve_file("bob's notes")
+
+        self.assertIn("name = 'bob\\'s notes'", self.list_files.call_args.kwargs['query'])
+
+
+def fake_drive_service(pages):
+    """A mock Drive service whose files().list() returns the given pages in turn"""
+    service = mock.Mock()
+    service.files.return_value.list.return_value.execute.side_effect = pages
+    return service
+
+
+class ListFilesTests(SimpleTestCase):
+
+    def test_limit_stops_after_the_first_page(self):
+        pages = [
+            {'files': [{'id': str(i), 'name': f'f{i}'} for i in range(100)], 'nextPageToken': 'next'},
+            {'files': [{'id': 'late', 'name': 'late'}]}
+        ]
+        service = fake_drive_service(pages)
+        with mock.patch.object(google_drive_utils, 'get_drive_service', return_value=service):
+            files = google_drive_utils.list_files(limit=100)
+
+        self.assertEqual(len(files), 100)
+        self.assertEqual(service.files.return_value.list.return_value.execute.call_count, 1)
+        self.assertEqual(service.files.return_value.list.call_args.kwargs['pageSize'], 100)
+
+    def test_without_limit_follows_page_tokens(self):
+        pages = [
+            {'files': [{'id': '1', 'name': 'a'}], 'nextPageToken': 'next'},
+            {'files': [{'id': '2', 'name': 'b'}]}
+        ]
+        with mock.patch.object(google_drive_utils, 'get_drive_service', return_value=fake_drive_service(pages)):
+            files = google_drive_utils.list_files()
+
+        self.assertEqual([f['id'] for f in files], ['1', '2'])
+
+    def test_chat_listing_fetches_one_page(self):
+        files = [{'id': str(i), 'name': f'f{i}', 'mimeType': 'text/plain'} for i in range(drive_handler.DRIVE_CHAT_LIST_LIMIT)]
+        with mock.patch.object(drive_handler, 'list_files', return_value=files) as list_files:
+            result = drive_handler.process_drive_request('list', 'list my drive files')
+
+        list_files.assert_called_once_with(limit=drive_handler.DRIVE_CHAT_LIST_LIMIT)
+        self.assertEqual(result['message'], f'Found {len(files)}+ files in your Google Drive.')
+
+
+def make_pdf(pages):
+    """Build PDF bytes with one line of text per page"""
+    document = fitz.open()
+    for page_number in range(1, pages + 1):
+        document.new_page().insert_text((72, 72), f"Page {page_number} text")
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def fake_downloader(data, chunk_size=1024 * 1024):
+    """A MediaIoBaseDownload stand-in that writes data to the target in chunks"""
+    class FakeDownloader:
+        def __init__(self, fd, request, chunksize=None):
+            self.fd = fd
+            self.offset = 0
+
+        def next_chunk(self):
+            self.fd.write(data[self.offset:self.offset + chunk_size])
+            self.offset += chunk_size
+            return None, self.offset >= len(data)
+    return FakeDownloader
+
+
+class DownloadFileTests(SimpleTestCase):
+
+    def download(self, data, **kwargs):
+        metadata = {'name': 'book.pdf', 'mimeType': 'application/pdf', 'size': str(len(data))}
+        with mock.patch.object(google_drive_utils, 'get_drive_service', return_value=mock.Mock()), \
+                mock.patch.object(google_drive_utils, 'MediaIoBaseDownload', fake_downloader(data)), \
+                mock.patch.object(google_drive_utils, 'DRIVE_SPOOL_MAX_MEMORY', 64 * 1024):
+            return google_drive_utils.download_file('file-id', metadata=metadata, **kwargs)
+
+    def test_small_downloads_stay_in_memory(self):
+        download = self.download(b'%PDF-1.4 small')
+
+        with download['stream'] as stream:
+            self.assertIsNone(stream.name)
+            self.assertEqual(stream.read(), b'%PDF-1.4 small')
+
+    def test_large_pdfs_are_opened_from_disk(self):
+        data = make_pdf(3) + b'\n%' + b'x' * (128 * 1024)
+        download = self.download(data)
+
+        with download['stream'] as stream:
+            self.assertTrue(os.path.isfile(stream.name))
+            self.assertEqual(extraction._document_source(stream), stream.name)
+            with mock.patch.object(stream, 'read', wraps=stream.read) as read:
+                text = extract_text(stream, file_name='book.pdf')
+            # Only the format sniff reads from the stream itself
+            self.assertTrue(all(0 < call.args[0] <= 8 for call in read.call_args_list), read.call_args_list)
+            path = stream.name
+
+        self.assertIn('Page 3 text', text)
+        self.assertFalse(os.path.exists(path))
+
+    def test_downloads_over_the_cap_are_rejected(self):
+        with self.assertRaises(google_drive_utils.DownloadTooLargeError):
+            self.download(b'x' * 2048, max_bytes=1024)
+
+
+class DriveContentCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.disk_dir = os.path.join(tempfile.mkdtemp(), 'drive-cache')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.disk_dir), ignore_errors=True)
+
+    def test_key_follows_file_version(self):
+        self.assertEqual(content_cache_key('f1', {'md5Checksum': 'abc', 'modifiedTime': 't1'}), 'f1:abc')
+        self.assertEqual(content_cache_key('f1', {'modifiedTime': 't2'}), 'f1:t2')
+        self.assertIsNone(content_cache_key('f1', {}))
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = DriveContentCache(max_bytes=100)
+        cache.put('a', 'x' * 40)
+        cache.put('b', 'y' * 40)
+        cache.get('a')
+        cache.put('c', 'z' * 40)
+
+        self.assertEqual(cache.get('a'), 'x' * 40)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_disk_tier_is_private_json(self):
+        value = {'name': 'Budget.xlsx', 'content': {'data': [{'Date': datetime.date(2024, 1, 31), 'Total': 5}]}}
+        DriveContentCache(disk_dir=self.disk_dir).put('f1:abc', value)
+
+        self.assertEqual(os.stat(self.disk_dir).st_mode & 0o777, 0o700)
+        [entry] = os.listdir(self.disk_dir)
+        self.assertTrue(entry.endswith('.json'))
+
+        fresh = DriveContentCache(disk_dir=self.disk_dir)
+        self.assertEqual(
+            fresh.get('f1:abc'),
+            {'name': 'Budget.xlsx', 'content': {'data': [{'Date': '2024-01-31', 'Total': 5}]}}
+        )
+        self.assertEqual(fresh.stats()['disk_hits'], 1)
+
+    def test_unreadable_disk_entries_are_misses(self):
+        cache = DriveContentCache(disk_dir=self.disk_dir)
+        with open(cache._disk_path('f1:abc'), 'wb') as f:
+            f.write(b'\x80\x04not json')
+
+        self.assertIsNone(cache.get('f1:abc'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+def old_render_table(content):
+    """The Excel preview renderer render_table replaced"""
+    display_content = "Excel File Contents:\n\n"
+    headers = list(content[0].keys())
+    display_content += "Columns: " + ", ".join(headers) + "\n\n"
+    max_rows = min(10, len(content))
+    display_content += f"Showing first {max_rows} rows (total rows: {len(content)}):\n\n"
+    for i in range(max_rows):
+        row = content[i]
+        display_content += f"Row {i+1}: " + ", ".join([f"{h}: {row.get(h, '')}" for h in headers]) + "\n"
+    return display_content
+
+
+class RenderTableTests(SimpleTestCase):
+
+    def test_rows_format_matches_old_renderer(self):
+        rows = [{'Name': f'Item {i}', 'Qty': i, 'Price': i * 1.5} for i in range(1, 8)]
+
+        self.assertEqual(render_table(rows, stats={}), old_render_table(rows))
+
+    def test_long_tables_are_capped_with_footer(self):
+        rows = [{'Name': f'Item {i}', 'Qty': i} for i in range(25)]
+
+        text = render_table(rows, stats={})
+
+        self.assertTrue(text.startswith(old_render_table(rows)))
+        self.assertIn('Row 10: ', text)
+        self.assertNotIn('Row 11: ', text)
+        self.assertTrue(text.endswith('... 15 more rows\n'))
+
+    def test_empty_cells_render_blank(self):
+        rows = [{'Name': 'Item', 'Qty': None}]
+
+        self.assertIn('Row 1: Name: Item, Qty: \n', render_table(rows, stats={}))
+
+    def test_token_budget_trims_rows(self):
+        rows = [{'Name': 'x' * 60, 'Notes': 'y' * 60} for _ in range(10)]
+
+        text = render_table(rows, stats={}, token_budget=150)
+
+        self.assertIn('preview trimmed to', text)
+        self.assertLessEqual(len(text) // 4, 150)
+
+
+def make_docx(text):
+    """Build in-memory DOCX bytes with a single paragraph"""
+    document = docx.Document()
+    document.add_paragraph(text)
+    stream = io.BytesIO()
+    document.save(stream)
+    return stream.getvalue()
+
+
+class DetectFormatTests(SimpleTestCase):
+
+    def test_magic_bytes_beat_name_and_mime_type(self):
+        stream = io.BytesIO(make_pdf(1))
+
+        self.assertEqual(detect_format(stream, file_name='notes.txt', mime_type='text/plain'), 'pdf')
+        self.assertEqual(stream.tell(), 0)
+
+    def test_zip_formats_are_told_apart(self):
+        self.assertEqual(detect_format(io.BytesIO(make_docx('hi')), file_name='upload.bin'), 'docx')
+        self.assertEqual(detect_format(make_workbook([['a'], [1]]), file_name='upload.bin'), 'excel')
+
+    def test_extension_beats_mime_type(self):
+        # Windows browsers send application/vnd.ms-excel for .csv files
+        stream = io.BytesIO(b'a,b\n1,2\n')
+
+        self.assertEqual(detect_format(stream, file_name='Data.CSV', mime_type='application/vnd.ms-excel'), 'csv')
+
+    def test_mime_type_is_the_last_resort(self):
+        stream = io.BytesIO(b'hello')
+
+        self.assertEqual(detect_format(stream, file_name='README', mime_type='text/plain; charset=utf-8'), 'txt')
+        self.assertIsNone(detect_format(stream, file_name='archive.7z', mime_type='application/x-7z-compressed'))
+
+    def test_extraction_is_timed_per_format(self):
+        before = get_extraction_metrics().get('txt', {'count': 0})['count']
+
+        self.assertEqual(extract_text(b'plain text', file_name='a.txt'), 'plain text')
+        with self.assertRaises(ExtractionError):
+            extract_text(b'\x00\x01', file_name='a.7z')
+
+        self.assertEqual(get_extraction_metrics()['txt']['count'], before + 1)
+
+
+class PdfPageStreamingTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='reader', password='secret'))
+
+    def upload(self, **data):
+        upload = SimpleUploadedFile('book.pdf', make_pdf(5), content_type='application/pdf')
+        return self.client.post(reverse('personalassistant:upload_file'), {'file': upload, **data})
+
+    def test_page_range_streams_one_event_per_page(self):
+        response = self.upload(pages='2-4', stream='true')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = [
+            json.loads(line[len('data: '):])
+            for line in b''.join(response.streaming_content).decode().split('\n\n') if line
+        ]
+        self.assertEqual(events[0], {'status': 'start'})
+        self.assertEqual([event['page'] for event in events[1:-1]], [2, 3, 4])
+        self.assertIn('Page 3 text', events[2]['content'])
+        self.assertEqual(events[-1], {'status': 'done'})
+
+    def test_without_streaming_returns_the_range_as_json(self):
+        response = self.upload(pages='5')
+
+        self.assertEqual(response.json()['text'].strip(), 'Page 5 text')
+
+
+class InlineExecutor:
+    """Runs submitted calls immediately, recording their arguments"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, func, *args):
+        self.calls.append(args)
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+@mock.patch.object(extraction, 'PDF_PARALLEL_MIN_PAGES', 4)
+@mock.patch.object(extraction, 'PDF_PARALLEL_WORKERS', 2)
+class ParallelPdfExtractionTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'book.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(make_pdf(6))
+        self.expected = "".join(f"Page {n} text\n" for n in range(1, 7))
+
+    def test_files_on_disk_are_sent_to_workers_by_path(self):
+        executor = InlineExecutor()
+        storage = FileSystemStorage(location=os.path.dirname(self.path))
+        with mock.patch.object(extraction, '_get_process_executor', return_value=executor):
+            with storage.open('book.pdf', 'rb') as stream:
+                text = extract_text(stream, file_name='book.pdf')
+
+        self.assertEqual(text, self.expected)
+        self.assertEqual([call[1:] for call in executor.calls], [(0, 3), (3, 6)])
+        self.assertTrue(all(call[0] == self.path for call in executor.calls))
+
+    def test_in_memory_pdfs_are_sent_as_bytes(self):
+        executor = InlineExecutor()
+        with mock.patch.object(extraction, '_get_process_executor', return_value=executor):
+            text = extract_text(make_pdf(6), file_name='book.pdf', first_page=2, last_page=5)
+
+        self.assertEqual(text, "".join(f"Page {n} text\n" for n in range(2, 6)))
+        self.assertTrue(all(isinstance(call[0], bytes) for call in executor.calls))
+
+    def test_process_pool_matches_inline_extraction(self):
+        self.addCleanup(extraction._reset_process_executor)
+        with open(self.path, 'rb') as stream:
+            self.assertEqual(extract_text(stream, file_name='book.pdf'), self.expected)
+
+
+class IngestionJobTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.executor = InlineExecutor()
+        for name, value in (('_executor', self.executor), ('close_old_connections', lambda: None)):
+            patcher = mock.patch.object(ingestion, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='learner', password='secret')
+
+    def submit(self, content, name='notes.txt'):
+        return submit_context_file(self.user, 'history', SimpleUploadedFile(name, content))
+
+    def test_upload_is_extracted_and_indexed(self):
+        job = self.submit(b'The Magna Carta was sealed in 1215.')
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('completed', 100))
+        context = SubjectContext.objects.get(user=self.user, subject='history')
+        self.assertEqual(context.context_text, 'The Magna Carta was sealed in 1215.')
+        self.assertEqual(context.chunk_count, 1)
+
+    def test_unchanged_upload_reuses_the_completed_job(self):
+        first = self.submit(b'The Magna Carta was sealed in 1215.')
+
+        second = self.submit(b'The Magna Carta was sealed in 1215.', name='renamed.txt')
+
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(len(self.executor.calls), 1)
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+    def test_whitespace_only_upload_fails(self):
+        job = self.submit(b'  \n\t  ')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('No text found', job.error)
+
+    def test_stale_jobs_are_failed_and_not_reused(self):
+        with mock.patch.object(ingestion, '_executor', mock.Mock()):
+            orphan = self.submit(b'The Magna Carta was sealed in 1215.')
+        IngestionJob.objects.filter(id=orphan.id).update(
+            status='running', updated_at=timezone.now() - datetime.timedelta(seconds=ingestion.INGESTION_STALE_SECONDS + 1)
+        )
+
+        self.assertEqual(get_job(orphan.id, self.user).status, 'failed')
+        retry = self.submit(b'The Magna Carta was sealed in 1215.')
+        self.assertNotEqual(retry.id, orphan.id)
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, 'completed')
+
+    def test_jobs_no_longer_queued_are_not_run(self):
+        with mock.patch.object(ingestion, '_executor', mock.Mock()):
+            job = self.submit(b'The Magna Carta was sealed in 1215.')
+        IngestionJob.objects.filter(id=job.id).update(status='failed')
+
+        ingestion._run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(SubjectContext.objects.get(id=job.subject_context_id).context_text)
+
+    def test_jobs_are_private_to_their_user(self):
+        job = self.submit(b'The Magna Carta was sealed in 1215.')
+        other = User.objects.create_user(username='other', password='secret')
+
+        self.assertIsNone(get_job(job.id, other))
+
+
+class BM25Tests(SimpleTestCase):
+
+    def test_more_occurrences_score_higher(self):
+        self.assertGreater(bm25_weight(3, 2, 10, 10, 20), bm25_weight(1, 2, 10, 10, 20))
+
+    def test_rarer_terms_score_higher(self):
+        self.assertGreater(bm25_weight(1, 1, 10, 10, 20), bm25_weight(1, 15, 10, 10, 20))
+
+    def test_longer_chunks_score_lower(self):
+        self.assertGreater(bm25_weight(2, 2, 5, 10, 20), bm25_weight(2, 2, 40, 10, 20))
+
+
+class RetrievePassagesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='secret')
+
+    def index(self, subject, text):
+        subject_context = SubjectContext.objects.create(user=self.user, subject=subject, context_text=text)
+        index_context(subject_context, text)
+        return subject_context
+
+    def test_best_matching_passage_first(self):
+        self.index('science', (
+            "Photosynthesis turns light into chemical energy in chloroplasts.\n\n"
+            "The French Revolution began in 1789 with the storming of the Bastille.\n\n"
+            "Mitochondria release energy from glucose during respiration."
+        ))
+
+        passages = retrieve_passages(self.user, 'science', 'When did the French Revolution begin?', k=1)
+
+        self.assertEqual(len(passages), 1)
+        self.assertIn('Bastille', passages[0])
+
+    def test_top_k_limits_the_passages(self):
+        subject_context = self.index('science', "\n\n".join(
+            f"Energy fact number {i} about cells and chloroplasts. " * 20 for i in range(10)
+        ))
+
+        passages = retrieve_passages(self.user, 'science', 'energy in chloroplasts', k=3)
+
+        subject_context.refresh_from_db()
+        self.assertGreater(subject_context.chunk_count, 3)
+        self.assertEqual(len(passages), 3)
+
+    def test_other_users_contexts_are_not_searched(self):
+        self.index('science', "The French Revolution began in 1789 with the storming of the Bastille.")
+        other = User.objects.create_user(username='other', password='secret')
+
+        self.assertEqual(retrieve_passages(other, 'science', 'French Revolution'), [])
+
+
+class IndexContextTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='secret')
+
+    def test_chunks_and_postings_are_stored(self):
+        subject_context = SubjectContext.objects.create(user=self.user, subject='science', context_text='')
+
+        index_context(subject_context, "Chloroplasts capture light.\n\nMitochondria release energy.")
+
+        subject_context.refresh_from_db()
+        self.assertEqual(subject_context.chunk_count, ContextChunk.objects.filter(subject_context=subject_context).count())
+        self.assertTrue(ContextTerm.objects.filter(subject_context=subject_context, term='mitochondria').exists())
+
+    def test_legacy_context_is_indexed_on_first_use(self):
+        SubjectContext.objects.create(
+            user=self.user, subject='history', context_text='The Bastille was stormed in 1789.'
+        )
+
+        passages = retrieve_passages(self.user, 'history', 'When was the Bastille stormed?')
+
+        self.assertEqual(passages, ['The Bastille was stormed in 1789.'])
+        self.assertEqual(SubjectContext.objects.get(user=self.user, subject='history').chunk_count, 1)
+
+    def test_whitespace_only_legacy_context_returns_nothing(self):
+        SubjectContext.objects.create(user=self.user, subject='math', context_text='   \n\n  ')
+
+        self.assertEqual(retrieve_passages(self.user, 'math', 'what is a derivative?'), [])
+        self.assertFalse(ContextChunk.objects.exists())
+
+
+def make_document(sentences=300):
+    """A long synthetic document of distinct sentences in paragraphs of ten"""
+    paragraphs = []
+    for start in range(0, sentences, 10):
+        paragraphs.append(" ".join(
+            f"Sentence {i} explains topic {i % 7} with detail number {i * 31 % 97}."
+            for i in range(start, start + 10)
+        ))
+    return "\n\n".join(paragraphs)
+
+
+class ChunkTextTests(SimpleTestCase):
+
+    def test_chunks_respect_max_chars(self):
+        chunks = chunk_text(make_document(), max_chars=400)
+
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(chunk) <= 400 for chunk in chunks))
+
+    def test_overlong_sentences_are_split_at_word_boundaries(self):
+        chunks = chunk_text("word " * 200, max_chars=100)
+
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), ["word"] * 200)
+
+    def test_local_edit_keeps_other_chunks(self):
+        document = make_document()
+        edited = document.replace("Sentence 150 explains", "Sentence 150 now describes", 1)
+
+        before = chunk_text(document, max_chars=400)
+        after = chunk_text(edited, max_chars=400)
+
+        changed = set(after) - set(before)
+        self.assertGreaterEqual(len(changed), 1)
+        self.assertLessEqual(len(changed), 2)
+
+    def test_whitespace_only_text_has_no_chunks(self):
+        self.assertEqual(chunk_text("   \n\n \t  "), [])
+        self.assertEqual(chunk_text(""), [])
+
+
+class ReindexContextTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='secret')
+        self.subject_context = SubjectContext.objects.create(user=self.user, subject='science', context_text='')
+
+    def test_local_edit_only_reindexes_changed_chunks(self):
+        document = make_document()
+        first = index_context(self.subject_context, document)
+        chunk_ids = set(ContextChunk.objects.values_list('id', flat=True))
+
+        second = index_context(self.subject_context, document.replace("Sentence 150 explains", "Sentence 150 now describes", 1))
+
+        self.assertEqual(first['reused'], 0)
+        self.assertGreaterEqual(second['added'], 1)
+        self.assertLessEqual(second['added'], 2)
+        self.assertEqual(second['removed'], second['added'])
+        self.assertEqual(len(chunk_ids & set(ContextChunk.objects.values_list('id', flat=True))), second['reused'])
+        self.assertEqual(retrieve_passages(self.user, 'science', 'now describes', k=1)[0].count('now describes'), 1)
+
+    def test_unchanged_text_reuses_every_chunk(self):
+        index_context(self.subject_context, make_document())
+        terms = ContextTerm.objects.count()
+
+        result = index_context(self.subject_context, make_document())
+
+        self.assertEqual((result['added'], result['removed']), (0, 0))
+        self.assertEqual(ContextTerm.objects.count(), terms)
+
+
+def make_image(color='red', size=(32, 32), fmt='PNG'):
+    """Encode a solid-colour test image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def fake_vision_client(answer='A red square.'):
+    """A Groq client whose completions return a fixed answer, streamed in small pieces"""
+    def create(messages, model, stream=False):
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+        chunks = mock.MagicMock()
+        chunks.__iter__.return_value = iter([
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=answer[i:i + 4]))])
+            for i in range(0, len(answer), 4)
+        ])
+        return chunks
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=mock.Mock(side_effect=create))))
+
+
+class VisionCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = fake_vision_client()
+        for name, value in (('_results', ResultCache()), ('get_groq_client', lambda: self.client)):
+            patcher = mock.patch.object(vision, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.create = self.client.chat.completions.create
+
+    def test_same_image_and_query_is_answered_once(self):
+        image = make_image()
+
+        answers = [describe_image(image, 'What colour is it?') for _ in range(3)]
+
+        self.assertEqual(answers, ['A red square.'] * 3)
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(get_vision_cache_stats(), {'hits': 2, 'misses': 1, 'hit_ratio': 0.667, 'entries': 1})
+
+    def test_image_query_and_model_are_all_part_of_the_key(self):
+        describe_image(make_image(), 'What colour is it?')
+        describe_image(make_image('blue'), 'What colour is it?')
+        describe_image(make_image(), 'What shape is it?')
+        describe_image(make_image(), 'What colour is it?', model='other-vision-model')
+
+        self.assertEqual(self.create.call_count, 4)
+
+    def test_empty_query_shares_the_default_question_entry(self):
+        describe_image(make_image(), None)
+        describe_image(make_image(), '  ')
+        describe_image(make_image(), vision.DEFAULT_IMAGE_QUERY)
+
+        self.assertEqual(self.create.call_count, 1)
+
+    def test_streamed_answer_is_cached_only_when_complete(self):
+        image = make_image()
+        stream = stream_image_answer(image, 'What colour is it?')
+        next(stream)
+        stream.close()
+
+        self.assertEqual(''.join(stream_image_answer(image, 'What colour is it?')), 'A red square.')
+        self.assertEqual(describe_image(image, 'What colour is it?'), 'A red square.')
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_ocr_text_is_cached_separately_from_vision_answers(self):
+        image = make_image()
+        pytesseract = SimpleNamespace(image_to_string=mock.Mock(return_value='HELLO'))
+
+        with mock.patch.dict('sys.modules', {'pytesseract': pytesseract}):
+            self.assertEqual(ocr_image(image), 'HELLO')
+            self.assertEqual(ocr_image(image), 'HELLO')
+        describe_image(image, '')
+
+        self.assertEqual(pytesseract.image_to_string.call_count, 1)
+        self.assertEqual(self.create.call_count, 1)
+
+
+class PreprocessImageTests(SimpleTestCase):
+
+    def test_large_images_are_downscaled_to_jpeg(self):
+        image = make_image(size=(3000, 1500), fmt='PNG')
+
+        result = preprocess_image(image, max_side=1000)
+
+        self.assertEqual((result['width'], result['height']), (1000, 500))
+        self.assertEqual((result['mime_type'], result['original_mime_type']), ('image/jpeg', 'image/png'))
+        with Image.open(io.BytesIO(result['data'])) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (1000, 500)))
+
+    def test_small_images_that_would_grow_are_sent_as_uploaded(self):
+        image = make_image(size=(16, 16), fmt='PNG')
+
+        result = preprocess_image(image)
+
+        self.assertEqual(result['data'], image)
+        self.assertEqual((result['mime_type'], result['bytes_saved']), ('image/png', 0))
+
+    def test_transparency_is_flattened_onto_white(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (2000, 2000), (255, 0, 0, 0)).save(buffer, 'PNG')
+
+        result = preprocess_image(buffer.getvalue(), max_side=100)
+
+        with Image.open(io.BytesIO(result['data'])) as img:
+            self.assertEqual(img.mode, 'RGB')
+            self.assertTrue(all(channel > 240 for channel in img.getpixel((50, 50))))
+
+    def test_exif_orientation_is_applied_and_metadata_dropped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'green').save(buffer, 'JPEG', exif=exif)
+
+        result = preprocess_image(buffer.getvalue(), max_side=400)
+
+        self.assertEqual((result['width'], result['height']), (200, 400))
+        with Image.open(io.BytesIO(result['data'])) as img:
+            self.assertNotIn(0x0112, img.getexif())
+
+    def test_undecodable_images_are_sent_unchanged(self):
+        for data, mime_type in (
+            (b'\x89PNG\r\n\x1a\n' + b'\x00' * 32, 'image/png'),
+            (make_image(size=(64, 64), fmt='PNG')[:60], 'image/png'),
+            (b'RIFF\x00\x00\x00\x00WEBPVP8 broken', 'image/webp'),
+            (b'not an image at all', 'image/jpeg'),
+        ):
+            with self.subTest(mime_type=mime_type, size=len(data)):
+                result = preprocess_image(data)
+
+                self.assertEqual(result['data'], data)
+                self.assertEqual(result['mime_type'], mime_type)
+                self.assertEqual((result['width'], result['bytes_saved']), (None, 0))
+
+
+class ProcessBatchTests(SimpleTestCase):
+
+    def setUp(self):
+        # file name -> (text, work_ms) or an exception; files not listed stay pending
+        self.outcomes = {}
+        self.pending = {}
+
+        def fake_submit(file, file_name=None, mime_type=None, owner=None):
+            future = Future()
+            outcome = self.outcomes.get(file_name)
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            elif outcome is not None:
+                future.set_result(outcome)
+            self.pending[file_name] = future
+            return future
+
+        for name, value in (
+            ('submit_extraction', mock.Mock(side_effect=fake_submit)),
+            ('describe_image', mock.Mock(side_effect=lambda data, query: f"{query}: {len(data)} bytes")),
+        ):
+            patcher = mock.patch.object(batch_upload, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_results_are_yielded_as_they_complete(self):
+        files = [
+            SimpleUploadedFile('slow.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            SimpleUploadedFile('fast.txt', b'notes', content_type='text/plain'),
+        ]
+        self.outcomes['fast.txt'] = ('fast text', 2.0)
+        results = process_batch(files, owner=7)
+
+        first = next(results)
+        self.pending['slow.pdf'].set_result(('slow text', 30.0))
+        rest = list(results)
+
+        self.assertEqual((first['index'], first['name'], first['text']), (1, 'fast.txt', 'fast text'))
+        self.assertEqual((rest[0]['index'], rest[0]['text'], rest[0]['work_ms']), (0, 'slow text', 30.0))
+        self.assertLessEqual(first['total_ms'], rest[0]['total_ms'])
+        self.assertEqual(batch_upload.submit_extraction.call_args.kwargs['owner'], 7)
+
+    def test_summary_counts_failures_and_sums_work(self):
+        files = [
+            SimpleUploadedFile('photo.PNG', b'\x89PNG image'),
+            SimpleUploadedFile('notes.txt', b'notes', content_type='text/plain'),
+            SimpleUploadedFile('broken.pdf', b'%PDF', content_type='application/pdf'),
+        ]
+        self.outcomes['notes.txt'] = ('notes', 4.0)
+        self.outcomes['broken.pdf'] = ExtractionError('Could not read the PDF file')
+
+        results = list(process_batch(files, query='Describe it'))
+
+        by_index = {result['index']: result for result in results[:-1]}
+        self.assertEqual(sorted(by_index), [0, 1, 2])
+        self.assertEqual((by_index[0]['kind'], by_index[0]['text']), ('image', 'Describe it: 10 bytes'))
+        self.assertEqual(by_index[2]['error'], 'Could not read the PDF file')
+        self.assertNotIn('text', by_index[2])
+        summary = results[-1]
+        self.assertEqual(summary['type'], 'summary')
+        self.assertEqual((summary['files'], summary['succeeded'], summary['failed']), (3, 2, 1))
+        self.assertGreaterEqual(summary['work_ms'], 4.0)
+        self.assertGreaterEqual(summary['total_ms'], max(result['total_ms'] for result in results[:-1]))
+
+
+class TabularStoreTestMixin:
+
+    def setUp(self):
+        super().setUp()
+        self.store_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(tabular_store, 'TABULAR_STORE_DIR', self.store_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.store_dir) for name in names]
+
+
+CITIES_CSV = b"city,population\nOslo,700000\nBergen,290000\n"
+
+
+class IngestTableTests(TabularStoreTestMixin, SimpleTestCase):
+
+    def test_owned_tables_are_stored_once(self):
+        first = ingest_table(io.BytesIO(CITIES_CSV), 'csv', owner=1)
+        second = ingest_table(io.BytesIO(CITIES_CSV), 'csv', owner=1)
+
+        self.assertEqual(first['dataset_id'], second['dataset_id'])
+        self.assertEqual((first['columns'], first['total_rows']), (['city', 'population'], 2))
+        self.assertEqual(self.stored_files(), [f"{first['dataset_id']}.sqlite3"])
+
+    def test_tables_without_an_owner_are_summarized_but_not_stored(self):
+        dataset = ingest_table(io.BytesIO(CITIES_CSV), 'csv')
+
+        self.assertIsNone(dataset['dataset_id'])
+        self.assertEqual(dataset['total_rows'], 2)
+        self.assertEqual(dataset['stats']['population']['max'], 700000)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_summary_has_no_query_instructions(self):
+        summary = render_dataset_summary(ingest_table(io.BytesIO(CITIES_CSV), 'csv', owner=1))
+
+        self.assertIn('Oslo', summary)
+        self.assertNotIn('SELECT', summary)
+        self.assertNotIn('dataset', summary)
+
+
+class QueryTableTests(TabularStoreTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = ingest_table(io.BytesIO(CITIES_CSV), 'csv', owner=1)
+
+    def test_select_is_allowed(self):
+        result = query_table(self.dataset['dataset_id'], "SELECT city FROM data ORDER BY population DESC", owner=1)
+
+        self.assertEqual(result['columns'], ['city'])
+        self.assertEqual(result['rows'], [['Oslo'], ['Bergen']])
+        self.assertFalse(result['truncated'])
+
+    def test_writes_attach_and_pragma_are_rejected(self):
+        for sql in (
+            "DELETE FROM data",
+            "INSERT INTO data VALUES ('Trondheim', 210000)",
+            "DROP TABLE data",
+            "ATTACH DATABASE 'other.sqlite3' AS other",
+            "PRAGMA table_info(data)",
+        ):
+            with self.subTest(sql=sql):
+                with self.assertRaises(TableQueryError):
+                    query_table(self.dataset['dataset_id'], sql, owner=1)
+
+    def test_unlisted_functions_are_rejected(self):
+        with self.assertRaises(TableQueryError):
+            query_table(self.dataset['dataset_id'], "SELECT zeroblob(2000000000)", owner=1)
+
+    def test_other_users_cannot_query_the_dataset(self):
+        for owner in (2, None):
+            with self.subTest(owner=owner):
+                with self.assertRaises(DatasetNotFound):
+                    query_table(self.dataset['dataset_id'], "SELECT * FROM data", owner=owner)
+
+
+class TableUploadViewTests(TabularStoreTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='analyst', password='secret')
+        self.client.force_login(self.user)
+
+    def test_upload_returns_a_queryable_dataset_id(self):
+        response = self.client.post(reverse('personalassistant:upload_file'), {
+            'file': SimpleUploadedFile('cities.csv', CITIES_CSV, content_type='text/csv')
+        })
+
+        dataset_id = response.json()['dataset_id']
+        self.assertNotIn('SELECT', response.json()['text'])
+        result = self.client.post(
+            reverse('personalassistant:table_query', args=[dataset_id]),
+            data=json.dumps({'sql': "SELECT SUM(population) AS total FROM data"}),
+            content_type='application/json'
+        ).json()
+        self.assertEqual(result['rows'], [[990000]])
+
+    def test_other_uploads_have_no_dataset_id(self):
+        response = self.client.post(reverse('personalassistant:upload_file'), {
+            'file': SimpleUploadedFile('notes.txt', b'plain notes', content_type='text/plain')
+        })
+
+        self.assertEqual(response.json(), {'text': 'plain notes'})
@@ -18,11 +18,16 @@ urlpatterns = [
     # API endpoints - match the frontend URL expectations
     path('api/tavily-search/', views.tavily_search, name='tavily_search'),
     path('api/message/', views.message_api, name='message_api'),
+    path('api/message/async/', views.async_message_api, name='async_message_api'),
     path('api/upload/', views.upload_file, name='upload_file'),
+    path('api/upload/batch/', views.upload_files_batch, name='upload_files_batch'),
+    path('api/tables/<str:dataset_id>/query/', views.table_query, name='table_query'),
+    path('api/stats/', views.performance_stats, name='performance_stats'),
     
     # Subject tutor endpoints
     path('subject-tutor/<str:subject>/', views.subject_tutor, name='subject_tutor'),
     path('save_subject_context/', views.save_subject_context, name='save_subject_context'),
+    path('ingestion_jobs/<uuid:job_id>/', views.ingestion_job_status, name='ingestion_job_status'),
     path('subject_message/', views.subject_message, name='subject_message'),
     
     # MCP Config endpoints
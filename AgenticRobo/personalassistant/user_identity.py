@@ -1,15 +1,10 @@
 import logging
 import json
 import re
-from groq import Groq
-import os
+from .groq_clients import get_groq_client
 
 logger = logging.getLogger(__name__)
 
-# Initialize Groq client
-groq_api_key = os.environ.get('GROQ_API_KEY')
-groq_client = Groq(api_key=groq_api_key)
-
 def detect_identity_update_intent(query):
     """
     Detect if the user is trying to update their identity information using LLM.
@@ -55,7 +50,7 @@ def detect_identity_update_intent(query):
         """
         
         # Call LLM
-        response = groq_client.chat.completions.create(
+        response = get_groq_client().chat.completions.create(
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that extracts structured information from text."},
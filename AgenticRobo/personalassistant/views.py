@@ -7,30 +7,32 @@ from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from .watson_services import text_to_speech, speech_to_text
 from django.http.response import HttpResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_GET
 from .models import SubjectContext
 import json
 import os
+import asyncio
 import requests
 import uuid
-import time
-import base64
-import io
-import fitz  # PyMuPDF for PDF processing
-import tempfile
-import pandas as pd
-from PIL import Image
-import docx  # python-docx for DOCX processing
-
-from docx import Document
 from dotenv import load_dotenv
 from langchain_tavily import TavilySearch
-from langchain.memory import ConversationBufferMemory
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains import ConversationChain
-from groq import AsyncGroq, Groq
+from asgiref.sync import sync_to_async
+from .groq_clients import get_groq_client, get_async_groq_client, get_pool_stats
+from .memory_store import get_memory_store
+from .history_window import window_history
+from .extraction import (
+    extract_text, detect_format, iter_pdf_pages, parse_page_range, ExtractionError, get_extraction_metrics
+)
+from .ingestion import submit_context_file, get_job
+from .retrieval import retrieve_passages, format_passages, index_context
+from .vision import describe_image, stream_image_answer, ocr_image, decode_base64_image, get_vision_cache_stats
+from .batch_upload import process_batch, BATCH_UPLOAD_MAX_FILES
+from .image_preprocessing import get_image_preprocessing_stats
+from .tabular_store import query_table, dataset_id_for, TableQueryError, DatasetNotFound
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
@@ -108,14 +110,12 @@ def watson_text_to_speech(request):
         print(f"Error in watson_text_to_speech: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
-# Dictionary to store conversation memories
-conversation_memories = {}
+# Bounded store of conversation memories (see memory_store.py)
+conversation_memories = get_memory_store()
 
 def get_or_create_memory(session_id):
     """Get or create a conversation memory for the session"""
-    if session_id not in conversation_memories:
-        conversation_memories[session_id] = ConversationBufferMemory(return_messages=True)
-    return conversation_memories[session_id]
+    return conversation_memories.get_or_create(session_id)
 
 def home(request):
     """View function for the home page of the site."""
@@ -209,71 +209,13 @@ def subject_tutor(request, subject):
         'subject_name': subject_name
     })
 
-def process_pdf(file):
-    """Extract text from a PDF file"""
-    try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # Write uploaded file content to temp file
-            for chunk in file.chunks():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
-        
-        # Extract text from PDF
-        text = ""
-        with fitz.open(temp_file_path) as pdf_document:
-            for page_num in range(len(pdf_document)):
-                page = pdf_document.load_page(page_num)
-                text += page.get_text()
-        
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
-        return text
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
-        return ""
-
-def process_docx(file):
-    """Extract text from a DOCX file"""
-    try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            # Write uploaded file content to temp file
-            for chunk in file.chunks():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
-        
-        # Extract text from DOCX
-        doc = docx.Document(temp_file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
-        return text
-    except Exception as e:
-        print(f"Error processing DOCX: {str(e)}")
-        return ""
-
-def process_txt(file):
-    """Extract text from a TXT file"""
-    try:
-        text = ""
-        for chunk in file.chunks():
-            text += chunk.decode('utf-8')
-        return text
-    except Exception as e:
-        print(f"Error processing TXT: {str(e)}")
-        return ""
-
 @login_required
 @require_POST
 def save_subject_context(request):
     """Handle subject context uploads (file or text)"""
     try:
         subject = request.POST.get('subject')
-        context_text = request.POST.get('context_text', '')
+        context_text = request.POST.get('context_text', '').strip()
         context_file = request.FILES.get('context_file')
         
         if not subject:
@@ -282,23 +224,7 @@ def save_subject_context(request):
         if not context_file and not context_text:
             return JsonResponse({'success': False, 'error': 'Either file or text context is required'}, status=400)
         
-        # Get or create subject context for this user and subject
-        subject_context, created = SubjectContext.objects.get_or_create(
-            user=request.user,
-            subject=subject
-        )
-        
-        # Clear previous context data
-        subject_context.context_text = ''
-        if subject_context.context_file:
-            subject_context.context_file.delete(save=False)
-        
-        # Update context text if provided
-        if context_text:
-            subject_context.context_text = context_text
-            subject_context.file_type = None
-        
-        # Process file if uploaded
+        # Files are extracted in the background; the page polls the returned job
         if context_file:
             # Get file extension
             file_ext = context_file.name.split('.')[-1].lower()
@@ -306,41 +232,55 @@ def save_subject_context(request):
             if file_ext not in ['pdf', 'docx', 'txt']:
                 return JsonResponse({'success': False, 'error': 'Unsupported file format. Please upload PDF, DOCX, or TXT files only.'}, status=400)
             
-            # Save file type
-            subject_context.file_type = file_ext
-            
-            # Save file with a unique name to prevent caching issues
-            timestamp = int(time.time())
-            subject_context.context_file.save(
-                f"{request.user.username}_{subject}_{timestamp}.{file_ext}",
-                context_file
-            )
-            
-            # Reset file pointer for processing
-            context_file.seek(0)
-            
-            # Process file content based on type
-            extracted_text = ''
-            if file_ext == 'pdf':
-                extracted_text = process_pdf(context_file)
-            elif file_ext == 'docx':
-                extracted_text = process_docx(context_file)
-            elif file_ext == 'txt':
-                extracted_text = process_txt(context_file)
-                
-            if extracted_text:
-                subject_context.context_text = extracted_text
-            else:
-                return JsonResponse({'success': False, 'error': f'Could not extract text from the {file_ext.upper()} file. Please check the file and try again.'}, status=400)
+            job = submit_context_file(request.user, subject, context_file)
+            return JsonResponse({
+                'success': True,
+                'job_id': str(job.id),
+                'status': job.status,
+                'message': 'Context upload is being processed'
+            }, status=202)
+        
+        # Get or create subject context for this user and subject
+        subject_context, created = SubjectContext.objects.defer('context_text').get_or_create(
+            user=request.user,
+            subject=subject
+        )
+        
+        # Replace previous context data with the text
+        if subject_context.context_file:
+            subject_context.context_file.delete(save=False)
+        subject_context.context_text = context_text
+        subject_context.file_type = None
+        subject_context.content_hash = None
         
         # Save changes
-        subject_context.save()
+        subject_context.save(update_fields=['context_text', 'context_file', 'file_type', 'content_hash', 'updated_at'])
+        index_context(subject_context, context_text)
         
         return JsonResponse({'success': True, 'message': 'Context updated successfully'})
     except Exception as e:
         print(f"Error in save_subject_context: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+@login_required
+@require_GET
+def ingestion_job_status(request, job_id):
+    """Report the progress of a subject context ingestion job"""
+    job = get_job(job_id, request.user)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    return JsonResponse({
+        'success': True,
+        'job': {
+            'id': str(job.id),
+            'status': job.status,
+            'progress': job.progress,
+            'stage': job.stage,
+            'error': job.error
+        }
+    })
+
 @login_required
 def subject_message(request):
     """Handle subject-specific chat messages"""
@@ -356,26 +296,13 @@ def subject_message(request):
             # Get session ID
             session_id = get_session_id(request)
             
-            # Try to get context for this subject
-            try:
-                subject_context = SubjectContext.objects.get(user=request.user, subject=subject)
-                context_text = subject_context.context_text or ''
-            except SubjectContext.DoesNotExist:
-                context_text = ''
-            
-            # Create a system message with the context
-            if context_text:
-                # Get or create memory for this session
-                memory = get_or_create_memory(session_id)
-                
-                # Add system message with context if not already added
-                if not any('SUBJECT_CONTEXT' in msg.content for msg in memory.chat_memory.messages if hasattr(msg, 'content')):
-                    system_msg = f"SUBJECT_CONTEXT: {context_text}\n\nPlease use this context to help answer questions about {subject}."
-                    memory.chat_memory.add_ai_message(system_msg)
+            # Inject only the passages of the subject context relevant to this question
+            passages = retrieve_passages(request.user, subject, message)
+            context = format_passages(passages, subject) if passages else None
             
             # Generate streaming response
             return StreamingHttpResponse(
-                generate_streaming_response('meta-llama/llama-4-scout-17b-16e-instruct', message, session_id, request),
+                generate_streaming_response('meta-llama/llama-4-scout-17b-16e-instruct', message, session_id, request, context=context),
                 content_type='text/event-stream'
             )
         except Exception as e:
@@ -392,170 +319,25 @@ def mcp_config(request):
 # File processing functions
 def process_image(file):
     """Extract text from image using Groq's vision model"""
-    try:
-        # Read the image file
-        image_data = file.read()
-        
-        # Encode the image to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Initialize Groq client
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        
-        # Default query
-        query = "What's in this image?"
-        
-        # Create chat completion with the image
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": query},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                            },
-                        },
-                    ],
-                }
-            ],
-            model="llama-3.2-11b-vision-preview",
-        )
-        
-        # Extract the response
-        response = chat_completion.choices[0].message.content
-        return response
-    except Exception as e:
-        print(f"Error processing image: {str(e)}")
-        return f"Error processing image: {str(e)}"
+    return process_image_with_query(file, None)
 
 def process_image_with_query(file, query):
     """Extract text from image using Groq's vision model with a specific query"""
     try:
-        # Read the image file
-        image_data = file.read()
-        
-        # Encode the image to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Initialize Groq client
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        
-        # Use the provided query or default
-        if not query or query.strip() == "":
-            query = "What's in this image?"
-        
-        # Create chat completion with the image
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": query},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                            },
-                        },
-                    ],
-                }
-            ],
-            model="llama-3.2-11b-vision-preview",
-        )
-        
-        # Extract the response
-        response = chat_completion.choices[0].message.content
-        return response
+        # Answers are cached per (image, query, model)
+        return describe_image(file.read(), query)
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         return f"Error processing image: {str(e)}"
 
-
-def process_pdf(file):
-    """Extract text from PDF"""
-    try:
-        # Create a temporary file to save the uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            file.save(temp_file.name)
-            temp_file_path = temp_file.name
-        
-        # Open the PDF with PyMuPDF
-        doc = fitz.open(temp_file_path)
-        text = ""
-        
-        # Extract text from each page
-        for page in doc:
-            text += page.get_text()
-        
-        # Close the document and remove the temporary file
-        doc.close()
-        os.unlink(temp_file_path)
-        
-        return text
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
-        return f"Error processing PDF: {str(e)}"
-
-def process_docx(file):
-    """Extract text from DOCX"""
+def process_base64_image(base64_data):
+    """Extract text from base64 encoded image using OCR"""
     try:
-        doc = Document(file)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
+        # OCR text is cached per image
+        return ocr_image(decode_base64_image(base64_data))
     except Exception as e:
-        print(f"Error processing DOCX: {str(e)}")
-        return f"Error processing DOCX: {str(e)}"
-
-def process_txt(file):
-    """Extract text from TXT"""
-    try:
-        text = file.read().decode('utf-8')
-        return text
-    except Exception as e:
-        print(f"Error processing TXT: {str(e)}")
-        return f"Error processing TXT: {str(e)}"
-
-def process_csv(file):
-    """Extract text from CSV"""
-    try:
-        df = pd.read_csv(file)
-        return df.to_string()
-    except Exception as e:
-        print(f"Error processing CSV: {str(e)}")
-        return f"Error processing CSV: {str(e)}"
-
-def process_excel(file):
-    """Extract text from Excel"""
-    try:
-        df = pd.read_excel(file)
-        return df.to_string()
-    except Exception as e:
-        print(f"Error processing Excel: {str(e)}")
-        return f"Error processing Excel: {str(e)}"
-
-def process_file(file):
-    """Process file based on its type"""
-    filename = file.name.lower()
-    
-    if filename.endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-        # Image processing is now handled separately in the upload route
-        # This is to avoid double-processing
-        return "Image processing handled separately"
-    elif filename.endswith('.pdf'):
-        return process_pdf(file)
-    elif filename.endswith(('.doc', '.docx')):
-        return process_docx(file)
-    elif filename.endswith('.txt'):
-        return process_txt(file)
-    elif filename.endswith('.csv'):
-        return process_csv(file)
-    elif filename.endswith(('.xls', '.xlsx')):
-        return process_excel(file)
-    else:
-        return "Unsupported file type"
+        print(f"Error processing base64 image: {str(e)}")
+        return f"Error processing base64 image: {str(e)}"
 
 def process_search_query(query):
     """Process a search query using Tavily Search API"""
@@ -590,14 +372,83 @@ def get_session_id(request):
     return request.session['session_id']
 
 # Import Gmail utilities
-from .gmail_utils import detect_email_intent, process_email_request
+from .gmail_utils import process_email_request
 from .email_handler import generate_email_response
 
 # Import Google Drive utilities
-from .drive_handler import detect_drive_intent, process_drive_request, generate_drive_response
+from .drive_handler import process_drive_request, generate_drive_response
 
 # Import user identity utilities
-from .user_identity import detect_identity_update_intent, process_identity_update, get_user_identity
+from .user_identity import process_identity_update, get_user_identity
+
+# Import intent routing
+from .intent_router import route_intent
+
+# Message API helpers
+def build_email_prompt(query, identity):
+    """Build the LLM prompt for composing an email on the user's behalf"""
+    user_name = identity['name']
+    user_org = identity['organization']
+    
+    # Prepare identity information for the prompt
+    identity_info = f"I am {user_name}"
+    if user_org and user_org.strip():
+        identity_info += f" from {user_org}"
+    identity_info += ".\n\n"
+    
+    # Add detailed instructions for the LLM to format the email professionally
+    return (
+        f"{query}\n\n"
+        f"{identity_info}"
+        "Please format your response as a professional email with the following structure:\n"
+        "1. To: [recipient email address]\n"
+        "2. Subject: [clear, concise subject line]\n"
+        "3. Body: [professional email body with proper greeting, paragraphs, and closing]\n\n"
+        "Guidelines for a professional email:\n"
+        "- Include a proper greeting (Dear, Hello, etc.)\n"
+        "- Use clear paragraphs with proper spacing\n"
+        "- Include a professional closing (Sincerely, Best regards, etc.)\n"
+        "- Use proper capitalization and punctuation\n"
+        "- Keep the tone professional and courteous\n"
+        f"- Sign the email with my name: {user_name}\n\n"
+        "After the email content, add a note saying 'I'll send this email for you.'"
+    )
+
+def build_drive_prompt(query, identity):
+    """Build the LLM prompt for a Google Drive operation"""
+    return (
+        f"{query}\n\n"
+        f"I am {identity['name']}.\n\n"
+        "I'll help you with your Google Drive request. Let me process that for you."
+    )
+
+def parse_message_request(request):
+    """Extract the query text and session ID from a message API request"""
+    # Handle both GET and POST requests
+    if request.method == 'POST':
+        # For POST requests, get data from JSON body
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+            query = data.get('message', '')
+            
+            # Get session ID
+            session_id = get_session_id(request)
+            
+            # Check if there's a file in the request
+            if 'file' in data and data['file']:
+                base64_data = data['file']
+                extracted_text = process_base64_image(base64_data)
+                query = f"{query}\n\nContent extracted from image:\n{extracted_text}"
+        else:
+            # Handle form data if not JSON
+            query = request.POST.get('message', '')
+            session_id = get_session_id(request)
+    else:
+        # For GET requests, get data from query parameters
+        query = request.GET.get('message', '')
+        session_id = get_session_id(request)
+    
+    return query, session_id
 
 # API endpoints
 @csrf_exempt
@@ -605,29 +456,7 @@ from .user_identity import detect_identity_update_intent, process_identity_updat
 def message_api(request):
     """Handle message API requests (both GET and POST)"""
     try:
-        # Handle both GET and POST requests
-        if request.method == 'POST':
-            # For POST requests, get data from JSON body
-            if request.content_type == 'application/json':
-                data = json.loads(request.body)
-                query = data.get('message', '')
-                
-                # Get session ID
-                session_id = get_session_id(request)
-                
-                # Check if there's a file in the request
-                if 'file' in data and data['file']:
-                    base64_data = data['file']
-                    extracted_text = process_base64_image(base64_data)
-                    query = f"{query}\n\nContent extracted from image:\n{extracted_text}"
-            else:
-                # Handle form data if not JSON
-                query = request.POST.get('message', '')
-                session_id = get_session_id(request)
-        else:
-            # For GET requests, get data from query parameters
-            query = request.GET.get('message', '')
-            session_id = get_session_id(request)
+        query, session_id = parse_message_request(request)
         
         # Use fixed model ID as specified
         model = 'meta-llama/llama-4-scout-17b-16e-instruct'
@@ -635,73 +464,33 @@ def message_api(request):
         print(f"Using model: {model}")
         print(f"Query: {query}")
         
-        # Check if this is an identity update request
-        identity_intent = detect_identity_update_intent(query)
+        # Run the identity, email and Drive detectors concurrently
+        route = route_intent(query)
+        print(f"Intent routing result: {route['intent']}, timings: {route['timings']}")
         
-        if identity_intent and identity_intent['is_identity_update']:
+        if route['intent'] == 'identity':
             # Process identity update
-            response_message = process_identity_update(request, identity_intent)
+            response_message = process_identity_update(request, route['results']['identity'])
             return JsonResponse({
                 'message': response_message,
                 'success': True
             })
         
-        # Check if this is an email request
-        email_intent = detect_email_intent(query)
-        print(f"Email intent detection result: {email_intent}")
+        drive_intent, drive_intent_type, drive_parameters = route['results']['drive']
         
-        # Check if this is a Google Drive request
-        drive_intent, drive_intent_type, drive_parameters = detect_drive_intent(query)
-        print(f"Drive intent detection result: {drive_intent}, type: {drive_intent_type}, parameters: {drive_parameters}")
-        
-        if email_intent and email_intent['is_email_request']:
+        if route['intent'] == 'email':
             # Get user identity information dynamically
-            identity = get_user_identity(request)
-            user_name = identity['name']
-            user_email = identity['email']
-            user_org = identity['organization']
-            
-            # Prepare identity information for the prompt
-            identity_info = f"I am {user_name}"
-            if user_org and user_org.strip():
-                identity_info += f" from {user_org}"
-            identity_info += ".\n\n"
-            
-            # Add detailed instructions for the LLM to format the email professionally
-            email_prompt = (
-                f"{query}\n\n"
-                f"{identity_info}"
-                "Please format your response as a professional email with the following structure:\n"
-                "1. To: [recipient email address]\n"
-                "2. Subject: [clear, concise subject line]\n"
-                "3. Body: [professional email body with proper greeting, paragraphs, and closing]\n\n"
-                "Guidelines for a professional email:\n"
-                "- Include a proper greeting (Dear, Hello, etc.)\n"
-                "- Use clear paragraphs with proper spacing\n"
-                "- Include a professional closing (Sincerely, Best regards, etc.)\n"
-                "- Use proper capitalization and punctuation\n"
-                "- Keep the tone professional and courteous\n"
-                f"- Sign the email with my name: {user_name}\n\n"
-                "After the email content, add a note saying 'I'll send this email for you.'"
-            )
+            email_prompt = build_email_prompt(query, get_user_identity(request))
             
             # Use a custom handler for email requests
             return StreamingHttpResponse(
                 generate_email_response(model, email_prompt, query, session_id, request),
                 content_type='text/event-stream'
             )
-        elif drive_intent and drive_intent_type:
+        elif route['intent'] == 'drive':
             print(f"Processing Drive request with intent type: {drive_intent_type}")
             # Get user identity information dynamically
-            identity = get_user_identity(request)
-            user_name = identity['name']
-            
-            # Prepare a prompt for Google Drive operations
-            drive_prompt = (
-                f"{query}\n\n"
-                f"I am {user_name}.\n\n"
-                "I'll help you with your Google Drive request. Let me process that for you."
-            )
+            drive_prompt = build_drive_prompt(query, get_user_identity(request))
             
             # Use a custom handler for Google Drive requests
             return StreamingHttpResponse(
@@ -720,10 +509,78 @@ def message_api(request):
         print(f"Error in /api/message: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@login_required
+async def async_message_api(request):
+    """
+    Async variant of message_api for ASGI deployments.
+    
+    Regular chat is streamed natively through AsyncGroq, so an open stream does
+    not hold a worker thread. Email and Drive requests keep their synchronous
+    handlers, which are stepped through in a thread pool.
+    """
+    try:
+        query, session_id = await sync_to_async(parse_message_request)(request)
+        
+        # Use fixed model ID as specified
+        model = 'meta-llama/llama-4-scout-17b-16e-instruct'
+        
+        print(f"Using model: {model}")
+        print(f"Query: {query}")
+        
+        # Run the identity, email and Drive detectors concurrently
+        route = await sync_to_async(route_intent, thread_sensitive=False)(query)
+        print(f"Intent routing result: {route['intent']}, timings: {route['timings']}")
+        
+        if route['intent'] == 'identity':
+            # Process identity update
+            response_message = await sync_to_async(process_identity_update)(request, route['results']['identity'])
+            return JsonResponse({
+                'message': response_message,
+                'success': True
+            })
+        
+        drive_intent, drive_intent_type, drive_parameters = route['results']['drive']
+        
+        if route['intent'] == 'email':
+            identity = await sync_to_async(get_user_identity)(request)
+            email_prompt = build_email_prompt(query, identity)
+            return StreamingHttpResponse(
+                iterate_in_thread(generate_email_response(model, email_prompt, query, session_id, request)),
+                content_type='text/event-stream'
+            )
+        elif route['intent'] == 'drive':
+            print(f"Processing Drive request with intent type: {drive_intent_type}")
+            identity = await sync_to_async(get_user_identity)(request)
+            drive_prompt = build_drive_prompt(query, identity)
+            return StreamingHttpResponse(
+                iterate_in_thread(generate_drive_response(model, drive_prompt, query, drive_intent_type, session_id, request, drive_parameters)),
+                content_type='text/event-stream'
+            )
+        else:
+            # Regular non-email, non-drive query
+            print("No specific intent detected, processing as regular query")
+            return StreamingHttpResponse(
+                agenerate_streaming_response(model, query, session_id),
+                content_type='text/event-stream'
+            )
+    
+    except Exception as e:
+        print(f"Error in /api/message/async: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
 @csrf_exempt
 @login_required
 def upload_file(request):
-    """Handle file upload requests"""
+    """
+    Handle file upload requests
+    
+    For images, posting stream=true (or accepting text/event-stream) streams the
+    answer as server-sent events, framed like the chat responses. PDFs uploaded
+    with a 'pages' range stream the same way, one event per page as soon as it
+    is extracted. CSV and Excel uploads also return the 'dataset_id' to query
+    the full table with.
+    """
     try:
         if 'file' not in request.FILES:
             return JsonResponse({'error': 'No file part'}, status=400)
@@ -738,8 +595,16 @@ def upload_file(request):
         
         # Process the file based on its type
         filename = file.name.lower()
+        wants_stream = request.POST.get('stream') in ('1', 'true') or 'text/event-stream' in request.headers.get('Accept', '')
         
         if filename.endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
+            # Stream the vision answer as server-sent events if the client asks for it
+            if wants_stream:
+                return StreamingHttpResponse(
+                    generate_image_streaming_response(file.read(), query),
+                    content_type='text/event-stream'
+                )
+            
             # For images, use the vision model with query
             if query and query.strip():
                 # Reset file pointer to beginning
@@ -751,8 +616,26 @@ def upload_file(request):
                 # Use default "What's in this image?" query
                 extracted_text = process_image(file)
         else:
-            # For other file types, use the regular processing
-            extracted_text = process_file(file)
+            # For other file types, extract the document text (optionally only some PDF pages)
+            try:
+                first_page, last_page = parse_page_range(request.POST.get('pages'))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            fmt = detect_format(file, file_name=file.name, mime_type=file.content_type)
+            if wants_stream and request.POST.get('pages') and fmt == 'pdf':
+                return StreamingHttpResponse(
+                    generate_pdf_pages_streaming_response(file, first_page, last_page),
+                    content_type='text/event-stream'
+                )
+            try:
+                extracted_text = extract_text(
+                    file, file_name=file.name, mime_type=file.content_type,
+                    first_page=first_page, last_page=last_page, owner=request.user.id
+                )
+            except ExtractionError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            if fmt in ('csv', 'excel'):
+                return JsonResponse({'text': extracted_text, 'dataset_id': dataset_id_for(file, fmt)})
         
         return JsonResponse({'text': extracted_text})
     
@@ -760,6 +643,76 @@ def upload_file(request):
         print(f"Error in /api/upload: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@login_required
+@require_POST
+def upload_files_batch(request):
+    """
+    Handle multi-file upload requests
+
+    All files posted as 'files' are processed concurrently. Results are streamed
+    as newline-delimited JSON, one line per file as soon as it is ready, then a
+    summary line with the batch's timings.
+    """
+    try:
+        files = [f for f in request.FILES.getlist('files') if f.name]
+        if not files:
+            return JsonResponse({'error': 'No files uploaded'}, status=400)
+        if len(files) > BATCH_UPLOAD_MAX_FILES:
+            return JsonResponse({'error': f'At most {BATCH_UPLOAD_MAX_FILES} files can be uploaded at once'}, status=400)
+
+        query = request.POST.get('message', '')
+
+        return StreamingHttpResponse(
+            (json.dumps(result) + "\n" for result in process_batch(files, query, owner=request.user.id)),
+            content_type='application/x-ndjson'
+        )
+
+    except Exception as e:
+        print(f"Error in /api/upload/batch: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@login_required
+@require_POST
+def table_query(request, dataset_id):
+    """
+    Run a read-only SQL query against an uploaded CSV/Excel table
+
+    Expects a JSON body with 'sql', a single SELECT statement against the
+    table "data" of the dataset_id returned by the upload. Only datasets
+    from the user's own uploads can be queried.
+    """
+    try:
+        data = json.loads(request.body)
+        sql = (data.get('sql') or '').strip()
+        if not sql:
+            return JsonResponse({'error': 'No query provided'}, status=400)
+
+        return JsonResponse(query_table(dataset_id, sql, owner=request.user.id))
+
+    except DatasetNotFound as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except TableQueryError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        print(f"Error in /api/tables/query: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+@require_GET
+def performance_stats(request):
+    """Report client pool, cache and extraction metrics (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+
+    return JsonResponse({
+        'groq_clients': get_pool_stats(),
+        'extraction': get_extraction_metrics(),
+        'vision_cache': get_vision_cache_stats(),
+        'image_preprocessing': get_image_preprocessing_stats()
+    })
+
 @csrf_exempt
 @login_required
 def upload_mcp_config(request):
@@ -941,9 +894,8 @@ def tavily_search(request):
             
             # Add search response to memory buffer
             try:
-                if session_id in conversation_memories:  # Use conversation_memories instead of conversation_memory
-                    memory = conversation_memories[session_id]
-                    
+                memory = conversation_memories.get(session_id)
+                if memory is not None:
                     # Add user query to memory
                     memory.chat_memory.add_user_message(query)
                     
@@ -969,40 +921,56 @@ def tavily_search(request):
     
     return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
-def generate_streaming_response(model, query, session_id, request):
-    """Generate a streaming response from the model with conversation memory"""
-    try:
-        print(f"Generating streaming response with model: {model}")
-        print(f"Query: {query}")
-        
-        # Get or create memory for this session
-        memory = get_or_create_memory(session_id)
-        
-        # Add the human message to memory
-        memory.chat_memory.add_user_message(query)
-        
-        # Get the conversation history
-        messages = memory.chat_memory.messages
-        
-        # Convert to the format expected by the Groq API
-        groq_messages = []
-        
-        # Add system message
+def build_groq_messages(memory, session_id, context=None):
+    """
+    Convert a conversation memory into Groq chat messages within the history token budget
+    
+    Args:
+        memory: The session's conversation memory
+        session_id (str): The session ID
+        context (str, optional): Extra context for this turn only (e.g. retrieved passages)
+    """
+    # Keep the recent history that fits the budget; older turns are summarized
+    summary, messages = window_history(session_id, memory.chat_memory.messages)
+    
+    # Add system message
+    groq_messages = [{
+        "role": "system",
+        "content": "You are a helpful assistant specialized in coding and study-related responses."
+    }]
+    
+    if context:
+        groq_messages.append({"role": "system", "content": context})
+    
+    if summary:
         groq_messages.append({
             "role": "system",
-            "content": "You are a helpful assistant specialized in coding and study-related responses."
+            "content": f"Summary of the earlier conversation:\n{summary}"
         })
+    
+    # Add conversation history
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            groq_messages.append({"role": "user", "content": msg.content})
+        elif isinstance(msg, AIMessage):
+            groq_messages.append({"role": "assistant", "content": msg.content})
+    
+    return groq_messages
+
+def generate_streaming_response(model, query, session_id, request, context=None):
+    """
+    Generate a streaming response from the model with conversation memory
+    
+    The optional context is sent with this turn only and is not stored in memory.
+    """
+    try:
+        print(f"Generating streaming response with model: {model}")
+        print(f"Query: {query}")
         
-        # Add conversation history
-        for msg in messages:
-            if isinstance(msg, HumanMessage):
-                groq_messages.append({"role": "user", "content": msg.content})
-            elif isinstance(msg, AIMessage):
-                groq_messages.append({"role": "assistant", "content": msg.content})
+        memory, groq_messages = prepare_turn(query, session_id, context=context)
         
-        # Initialize Groq client
-        api_key = os.getenv('GROQ_API_KEY')
-        client = Groq(api_key=api_key)
+        # Get the shared Groq client
+        client = get_groq_client()
         
         # Create the streaming completion using the direct Groq client
         stream = client.chat.completions.create(
@@ -1038,6 +1006,124 @@ def generate_streaming_response(model, query, session_id, request):
         yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
 
 
+def generate_image_streaming_response(image_data, query):
+    """Stream a vision model answer about an image as server-sent events"""
+    try:
+        yield f"data: {json.dumps({'status': 'start'})}\n\n"
+        
+        for content in stream_image_answer(image_data, query):
+            # Yield the chunk as a server-sent event
+            yield f"data: {json.dumps({'content': content})}\n\n"
+        
+        # Signal the end of the stream
+        yield f"data: {json.dumps({'status': 'done'})}\n\n"
+        
+    except Exception as e:
+        print(f"Error in generate_image_streaming_response: {str(e)}")
+        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+
+
+def generate_pdf_pages_streaming_response(file, first_page=None, last_page=None):
+    """Stream the text of a range of PDF pages as server-sent events, one per page"""
+    try:
+        yield f"data: {json.dumps({'status': 'start'})}\n\n"
+        
+        for page_number, text in iter_pdf_pages(file, first_page=first_page, last_page=last_page):
+            yield f"data: {json.dumps({'page': page_number, 'content': text})}\n\n"
+        
+        # Signal the end of the stream
+        yield f"data: {json.dumps({'status': 'done'})}\n\n"
+        
+    except Exception as e:
+        print(f"Error in generate_pdf_pages_streaming_response: {str(e)}")
+        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+
+
+def prepare_turn(query, session_id, context=None):
+    """
+    Record the user's message and build the Groq messages for this turn
+    
+    Returns:
+        tuple: (memory, groq_messages)
+    """
+    # Get or create memory for this session
+    memory = get_or_create_memory(session_id)
+    
+    # Add the human message to memory
+    memory.chat_memory.add_user_message(query)
+    
+    # Convert the conversation history to the format expected by the Groq API
+    return memory, build_groq_messages(memory, session_id, context=context)
+
+async def agenerate_streaming_response(model, query, session_id, context=None):
+    """
+    Async version of generate_streaming_response using AsyncGroq.
+    
+    Memory store and history window calls can touch disk, so they run in a
+    worker thread rather than on the event loop.
+    
+    If the client disconnects, the ASGI handler cancels this generator and the
+    upstream Groq stream is closed so generation stops as well.
+    """
+    stream = None
+    try:
+        print(f"Generating async streaming response with model: {model}")
+        print(f"Query: {query}")
+        
+        memory, groq_messages = await sync_to_async(prepare_turn)(query, session_id, context=context)
+        
+        # Get the shared async Groq client for this event loop
+        client = get_async_groq_client()
+        
+        stream = await client.chat.completions.create(
+            messages=groq_messages,
+            model=model,
+            temperature=0.5,
+            max_tokens=4000,
+            top_p=1,
+            stop=None,
+            stream=True,
+        )
+        
+        yield f"data: {json.dumps({'status': 'start'})}\n\n"
+        
+        full_response = ""
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                content = chunk.choices[0].delta.content
+                full_response += content
+                yield f"data: {json.dumps({'content': content})}\n\n"
+        
+        # Add the full response to memory
+        await sync_to_async(memory.chat_memory.add_ai_message)(full_response)
+        
+        # Signal the end of the stream
+        yield f"data: {json.dumps({'status': 'done'})}\n\n"
+    
+    except asyncio.CancelledError:
+        print(f"Client disconnected, cancelling stream for session {session_id}")
+        raise
+    except Exception as e:
+        print(f"Error in agenerate_streaming_response: {str(e)}")
+        yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+    finally:
+        # Closing the stream aborts the upstream request if it is still running
+        if stream is not None:
+            await stream.close()
+
+
+async def iterate_in_thread(iterator):
+    """Step a synchronous streaming generator in a worker thread from async code"""
+    iterator = iter(iterator)
+    sentinel = object()
+    step = sync_to_async(next, thread_sensitive=False)
+    while True:
+        chunk = await step(iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
 @csrf_exempt
 def watson_speech_to_text(request):
     """
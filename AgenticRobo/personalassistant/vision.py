@@ -0,0 +1,220 @@
+"""
+Image understanding (Groq vision and Tesseract OCR) for RoboSynthesis.
+
+Users often upload the same screenshot several times. Vision answers and OCR
+text are cached by the SHA-256 of the image bytes together with the question
+and the model, so an identical image and question is answered from memory
+without a second vision call or OCR pass. Images sent to the vision model are
+pre-processed (downscaled and re-encoded) first.
+
+Configuration (environment variables):
+- VISION_MODEL: Groq vision model (default: 'llama-3.2-11b-vision-preview')
+- VISION_CACHE_MAX_ENTRIES: Results kept in the LRU cache (default: 512)
+"""
+
+import os
+import io
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from .groq_clients import get_groq_client
+from .image_preprocessing import preprocess_image
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+VISION_MODEL = os.getenv('VISION_MODEL', 'llama-3.2-11b-vision-preview')
+VISION_CACHE_MAX_ENTRIES = int(os.getenv('VISION_CACHE_MAX_ENTRIES', 512))
+
+DEFAULT_IMAGE_QUERY = "What's in this image?"
+
+# Cache "model" name for OCR results
+OCR_ENGINE = 'tesseract'
+
+
+class ResultCache:
+    """Thread-safe LRU cache of image results keyed by (image hash, query, model)"""
+
+    def __init__(self, max_entries=VISION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / total, 3) if total else 0.0,
+                'entries': len(self._entries)
+            }
+
+
+_results = ResultCache()
+
+
+def image_hash(image_data):
+    """Content hash identifying an image"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def normalize_query(query):
+    """Use the default question for empty queries"""
+    query = (query or '').strip()
+    return query or DEFAULT_IMAGE_QUERY
+
+
+def build_vision_messages(image_data, query, mime_type='image/jpeg'):
+    """Build the Groq chat messages asking a question about an image"""
+    base64_image = base64.b64encode(image_data).decode('utf-8')
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": query},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}",
+                    },
+                },
+            ],
+        }
+    ]
+
+
+def _vision_request_messages(image_data, query):
+    # Send a downscaled, metadata-free copy rather than the raw upload
+    image = preprocess_image(image_data)
+    return build_vision_messages(image['data'], query, image['mime_type'])
+
+
+def describe_image(image_data, query=None, model=VISION_MODEL):
+    """
+    Answer a question about an image with the Groq vision model.
+
+    Args:
+        image_data (bytes): The image file's bytes
+        query (str, optional): The question (default: "What's in this image?")
+        model (str): Groq vision model
+
+    Returns:
+        str: The model's answer
+    """
+    query = normalize_query(query)
+    key = (image_hash(image_data), query, model)
+    cached = _results.get(key)
+    if cached is not None:
+        logger.info("Serving cached vision answer")
+        return cached
+
+    chat_completion = get_groq_client().chat.completions.create(
+        messages=_vision_request_messages(image_data, query),
+        model=model,
+    )
+    response = chat_completion.choices[0].message.content
+    _results.put(key, response)
+    return response
+
+
+def stream_image_answer(image_data, query=None, model=VISION_MODEL):
+    """
+    Stream the Groq vision model's answer to a question about an image.
+
+    Cached answers are yielded in one piece. A fully streamed answer is added
+    to the cache; one cut short (e.g. the client disconnected) is not, and
+    the upstream stream is closed.
+
+    Args:
+        image_data (bytes): The image file's bytes
+        query (str, optional): The question (default: "What's in this image?")
+        model (str): Groq vision model
+
+    Yields:
+        str: Pieces of the answer as they are generated
+    """
+    query = normalize_query(query)
+    key = (image_hash(image_data), query, model)
+    cached = _results.get(key)
+    if cached is not None:
+        logger.info("Serving cached vision answer")
+        yield cached
+        return
+
+    stream = get_groq_client().chat.completions.create(
+        messages=_vision_request_messages(image_data, query),
+        model=model,
+        stream=True,
+    )
+    parts = []
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                content = chunk.choices[0].delta.content
+                parts.append(content)
+                yield content
+    finally:
+        stream.close()
+    _results.put(key, "".join(parts))
+
+
+def ocr_image(image_data):
+    """
+    Extract text from an image with Tesseract OCR.
+
+    Args:
+        image_data (bytes): The image file's bytes
+
+    Returns:
+        str: The recognized text
+    """
+    key = (image_hash(image_data), '', OCR_ENGINE)
+    cached = _results.get(key)
+    if cached is not None:
+        logger.info("Serving cached OCR text")
+        return cached
+
+    # Imported here so Tesseract stays an optional dependency of the OCR path only
+    import pytesseract
+
+    with Image.open(io.BytesIO(image_data)) as img:
+        text = pytesseract.image_to_string(img)
+    _results.put(key, text)
+    return text
+
+
+def decode_base64_image(base64_data):
+    """Decode a base64 image, with or without a data URL prefix"""
+    if ',' in base64_data:
+        base64_data = base64_data.split(',')[1]
+    return base64.b64decode(base64_data)
+
+
+def get_vision_cache_stats():
+    """Get hit/miss statistics for the vision and OCR result cache"""
+    return _results.stats()
@@ -1,12 +1,6 @@
-import base64
 from flask import Flask, request, jsonify, render_template, Response, stream_with_context, session
-from groq import Groq
 import os
 from dotenv import load_dotenv
-from PIL import Image
-import pytesseract
-from docx import Document
-import tempfile
 import json
 import uuid
 from langchain.memory import ConversationBufferMemory
@@ -15,15 +9,16 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_tavily import TavilySearch
-import pandas as pd
-import io
-import fitz  # PyMuPDF for PDF processing
+from AgenticRobo.personalassistant.groq_clients import get_groq_client
+from AgenticRobo.personalassistant.memory_store import get_memory_store
+from AgenticRobo.personalassistant.extraction import extract_text, ExtractionError
+from AgenticRobo.personalassistant.vision import describe_image, ocr_image, decode_base64_image
 
 load_dotenv()
 
-# Initialize Groq client
+# Use the shared, pooled Groq client
 api_key = os.getenv('GROQ_API_KEY')
-client = Groq(api_key=api_key)
+client = get_groq_client(api_key)
 
 # Initialize Tavily Search
 tavily_api_key = os.getenv('TAVILY_API_KEY')
@@ -46,14 +41,12 @@ def get_langchain_client(model_name="llama-3.3-70b-versatile"):
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'default-secret-key-for-sessions')
 
-# Dictionary to store conversation memories
-conversation_memories = {}
+# Bounded store of conversation memories
+conversation_memories = get_memory_store()
 
 def get_or_create_memory(session_id):
     """Get or create a conversation memory for the session"""
-    if session_id not in conversation_memories:
-        conversation_memories[session_id] = ConversationBufferMemory(return_messages=True)
-    return conversation_memories[session_id]
+    return conversation_memories.get_or_create(session_id)
 
 def get_session_id():
     """Get or create a session ID"""
@@ -63,83 +56,13 @@ def get_session_id():
 
 def process_image(file):
     """Extract text from image using Groq's vision model"""
-    try:
-        # Read the image file
-        image_data = file.read()
-        
-        # Encode the image to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Initialize Groq client
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        
-        # Default query
-        query = "What's in this image?"
-        
-        # Create chat completion with the image
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": query},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                            },
-                        },
-                    ],
-                }
-            ],
-            model="llama-3.2-11b-vision-preview",
-        )
-        
-        # Extract the response
-        response = chat_completion.choices[0].message.content
-        return response
-    except Exception as e:
-        print(f"Error processing image: {str(e)}")
-        return f"Error processing image: {str(e)}"
+    return process_image_with_query(file, None)
 
 def process_image_with_query(file, query):
     """Extract text from image using Groq's vision model with a specific query"""
     try:
-        # Read the image file
-        image_data = file.read()
-        
-        # Encode the image to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Initialize Groq client
-        client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-        
-        # Use the provided query or default
-        if not query or query.strip() == "":
-            query = "What's in this image?"
-        
-        # Create chat completion with the image
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": query},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                            },
-                        },
-                    ],
-                }
-            ],
-            model="llama-3.2-11b-vision-preview",
-        )
-        
-        # Extract the response
-        response = chat_completion.choices[0].message.content
-        return response
+        # Answers are cached per (image, query, model)
+        return describe_image(file.read(), query)
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         return f"Error processing image: {str(e)}"
@@ -147,105 +70,18 @@ def process_image_with_query(file, query):
 def process_base64_image(base64_data):
     """Extract text from base64 encoded image using OCR"""
     try:
-        # Remove the data URL prefix if present
-        if ',' in base64_data:
-            base64_data = base64_data.split(',')[1]
-        
-        # Decode the base64 data
-        image_data = base64.b64decode(base64_data)
-        
-        # Create an image from the binary data
-        img = Image.open(io.BytesIO(image_data))
-        
-        # Perform OCR
-        text = pytesseract.image_to_string(img)
-        return text
+        # OCR text is cached per image
+        return ocr_image(decode_base64_image(base64_data))
     except Exception as e:
         print(f"Error processing base64 image: {str(e)}")
         return f"Error processing base64 image: {str(e)}"
 
-def process_pdf(file):
-    """Extract text from PDF"""
-    try:
-        # Create a temporary file to save the uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            file.save(temp_file.name)
-            temp_file_path = temp_file.name
-        
-        # Open the PDF with PyMuPDF
-        doc = fitz.open(temp_file_path)
-        text = ""
-        
-        # Extract text from each page
-        for page in doc:
-            text += page.get_text()
-        
-        # Close the document and remove the temporary file
-        doc.close()
-        os.unlink(temp_file_path)
-        
-        return text
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
-        return f"Error processing PDF: {str(e)}"
-
-def process_docx(file):
-    """Extract text from DOCX"""
-    try:
-        doc = Document(file)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
-    except Exception as e:
-        print(f"Error processing DOCX: {str(e)}")
-        return f"Error processing DOCX: {str(e)}"
-
-def process_txt(file):
-    """Extract text from TXT"""
-    try:
-        text = file.read().decode('utf-8')
-        return text
-    except Exception as e:
-        print(f"Error processing TXT: {str(e)}")
-        return f"Error processing TXT: {str(e)}"
-
-def process_csv(file):
-    """Extract text from CSV"""
-    try:
-        df = pd.read_csv(file)
-        return df.to_string()
-    except Exception as e:
-        print(f"Error processing CSV: {str(e)}")
-        return f"Error processing CSV: {str(e)}"
-
-def process_excel(file):
-    """Extract text from Excel"""
-    try:
-        df = pd.read_excel(file)
-        return df.to_string()
-    except Exception as e:
-        print(f"Error processing Excel: {str(e)}")
-        return f"Error processing Excel: {str(e)}"
-
 def process_file(file):
     """Process file based on its type"""
-    filename = file.filename.lower()
-    
-    if filename.endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-        # Image processing is now handled separately in the upload route
-        # This is to avoid double-processing
-        return "Image processing handled separately"
-    elif filename.endswith('.pdf'):
-        return process_pdf(file)
-    elif filename.endswith(('.doc', '.docx')):
-        return process_docx(file)
-    elif filename.endswith('.txt'):
-        return process_txt(file)
-    elif filename.endswith('.csv'):
-        return process_csv(file)
-    elif filename.endswith(('.xls', '.xlsx')):
-        return process_excel(file)
-    else:
-        return "Unsupported file type"
+    try:
+        return extract_text(file.stream, file_name=file.filename, mime_type=file.mimetype)
+    except ExtractionError as e:
+        return str(e)
 
 def process_search_query(query):
     """Process a search query using Tavily Search API"""